@@ -0,0 +1,146 @@
+"""
+Скорость и память рассылки о коллаборации.
+
+Заполняет БД --recipients клиентами с купонами компании 1 и проводит
+рассылку Broadcaster через фиктивный бот, который отвечает на
+send_message через --send-ms. Печатает время, число отправленных
+сообщений и пик памяти Python (tracemalloc) для рассылки пачками и,
+для сравнения, для загрузки всех получателей одним запросом.
+
+Лимит Telegram здесь не замеряется: основной прогон идет с --rate
+(по умолчанию без ограничения), чтобы увидеть накладные расходы
+самой рассылки. --check-rate N секунд отправляет с BROADCAST_RATE
+и показывает фактическую скорость ограничителя.
+
+    python -m bench.broadcast --recipients 100000
+"""
+import argparse
+import asyncio
+import gc
+import tracemalloc
+from datetime import date, timedelta
+
+from bench.common import Timer, bench_database, fake_redis, print_table, use_redis
+
+from sqlalchemy import insert, select, text
+
+import services.broadcast_service as broadcast_service
+from services.broadcast_service import Broadcaster
+from utils.config import config
+from utils.database.models import Coupon, CouponStatus, CouponType, User
+
+COUPON_TYPE_ID = 1
+
+
+class FakeBot:
+    """Бот, который только считает отправленные сообщения"""
+    def __init__(self, send_ms: float):
+        self.send_ms = send_ms
+        self.sent = 0
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> None:
+        await asyncio.sleep(self.send_ms / 1000)
+        self.sent += 1
+
+
+async def _seed(session_factory, recipients: int) -> None:
+    status_id = CouponStatus.get_status_id('active')
+    end_date = date.today() + timedelta(days=30)
+    async with session_factory() as session:
+        for start in range(0, recipients, 10_000):
+            ids = range(100 + start, 100 + min(start + 10_000, recipients))
+            await session.execute(insert(User), [
+                {'id': user_id, 'id_tg': 10_000_000 + user_id, 'first_name': 'Клиент', 'last_name': str(user_id),
+                 'tel_num': str(70_000_000_000 + user_id)}
+                for user_id in ids
+            ])
+            await session.execute(insert(Coupon), [
+                {'code': f"BEN-{user_id}", 'coupon_type_id': COUPON_TYPE_ID, 'client_id': user_id,
+                 'issued_by': 1, 'end_date': end_date, 'status_id': status_id}
+                for user_id in ids
+            ])
+        # MySQL сам индексирует столбец внешнего ключа, SQLite - нет: без индекса
+        # каждая пачка получателей перебирала бы все купоны
+        await session.execute(text("CREATE INDEX ix_bench_coupons_client ON COUPONS (client_id)"))
+        await session.commit()
+
+
+async def _broadcast(session_factory, args, rate: float, trace: bool, timeout: float | None = None) -> dict:
+    redis = fake_redis()
+    use_redis(redis, broadcast_service)
+    bot = FakeBot(args.send_ms)
+    broadcaster = Broadcaster(bot, chunk_size=args.chunk_size, concurrency=args.concurrency,
+                              rate=rate, lease_ttl=config.BROADCAST_LEASE_TTL)
+
+    gc.collect()
+    if trace:
+        tracemalloc.start()
+    try:
+        with Timer() as timer:
+            async with session_factory() as session:
+                broadcast_id = await broadcaster.start_collab_broadcast(session, COUPON_TYPE_ID)
+            task = broadcaster._tasks[broadcast_id]
+            try:
+                await asyncio.wait_for(asyncio.shield(task), timeout)
+            except asyncio.TimeoutError:
+                await broadcaster.stop()
+        peak = tracemalloc.get_traced_memory()[1] if trace else None
+    finally:
+        if trace:
+            tracemalloc.stop()
+
+    progress = await broadcaster.progress(broadcast_id)
+    row = {'sent': bot.sent, 'checkpointed': progress['sent'], 's': round(timer.elapsed, 2),
+           'messages_per_s': round(bot.sent / timer.elapsed)}
+    if peak is not None:
+        row['peak_mb'] = round(peak / 2 ** 20, 2)
+    return row
+
+
+async def _load_all(session_factory) -> dict:
+    """Все Telegram ID получателей одним запросом, как без постраничной выборки"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        with Timer() as timer:
+            async with session_factory() as session:
+                stmt = select(User.id_tg).join(Coupon, Coupon.client_id == User.id).join(
+                    CouponType, CouponType.id_coupon_type == Coupon.coupon_type_id
+                ).where(CouponType.company_id == 1).distinct()
+                recipients = (await session.execute(stmt)).scalars().all()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'recipients': len(recipients), 's': round(timer.elapsed, 2), 'peak_mb': round(peak / 2 ** 20, 2)}
+
+
+async def main(args) -> None:
+    async with bench_database() as (_, session_factory):
+        await _seed(session_factory, args.recipients)
+        broadcast_service.AsyncSessionLocal = session_factory
+
+        unlimited = args.rate if args.rate else 1e9
+        rows = [
+            {'run': 'пачками', **await _broadcast(session_factory, args, unlimited, trace=False)},
+            {'run': 'пачками, tracemalloc', **await _broadcast(session_factory, args, unlimited, trace=True)},
+        ]
+        print_table(f"Рассылка {args.recipients} получателям: пачки по {args.chunk_size}, "
+                    f"concurrency={args.concurrency}, отправка {args.send_ms} мс, "
+                    f"rate={'без ограничения' if not args.rate else args.rate}", rows)
+        print_table("Загрузка всех получателей одним запросом (tracemalloc)", [await _load_all(session_factory)])
+
+        if args.check_rate:
+            row = await _broadcast(session_factory, args, config.BROADCAST_RATE, trace=False,
+                                   timeout=args.check_rate)
+            print_table(f"BROADCAST_RATE={config.BROADCAST_RATE}, {args.check_rate} с", [row])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--recipients', type=int, default=100_000)
+    parser.add_argument('--chunk-size', type=int, default=config.BROADCAST_CHUNK_SIZE)
+    parser.add_argument('--concurrency', type=int, default=config.BROADCAST_CONCURRENCY)
+    parser.add_argument('--send-ms', type=float, default=30.0)
+    parser.add_argument('--rate', type=float, default=0, help="сообщений в секунду, 0 - без ограничения")
+    parser.add_argument('--check-rate', type=float, default=0, metavar='SECONDS')
+    asyncio.run(main(parser.parse_args()))
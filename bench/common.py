@@ -0,0 +1,145 @@
+"""
+Общие заготовки нагрузочных замеров.
+
+Замеры запускаются из корня репозитория: python -m bench.<имя> [--help].
+По умолчанию MySQL заменяет временная база SQLite (aiosqlite), Redis -
+fakeredis, поэтому замеры воспроизводятся без серверов; абсолютные числа
+на MySQL и Redis будут другими, сравнение вариантов - тем же.
+"""
+import os
+import statistics
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from datetime import date, timedelta
+from pathlib import Path
+from typing import AsyncIterator, Iterable, Optional
+
+# Настройки читаются при импорте utils.config, поэтому задаются до импорта модулей бота
+os.environ.setdefault('BOT_TG_TOKEN', '123456:BENCH-TOKEN')
+os.environ.setdefault('REDIS_PREFIX', 'bench')
+os.environ.setdefault('COUPON_CODE_SECRET', 'bench-secret')
+
+from sqlalchemy import BigInteger, insert
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.ext.compiler import compiles
+
+from utils.database.models import (Base, CompLocation, Company, Coupon, CouponStatus, CouponStatusHelper, CouponType,
+                                   User)
+
+
+@compiles(BigInteger, 'sqlite')
+def _sqlite_bigint(type_, compiler, **kw):
+    # Автоинкремент в SQLite есть только у INTEGER PRIMARY KEY
+    return 'INTEGER'
+
+
+def sqlite_url(path: Path) -> str:
+    return f"sqlite+aiosqlite:///{path}"
+
+
+@asynccontextmanager
+async def bench_database(url: Optional[str] = None, **engine_options) -> AsyncIterator[tuple[AsyncEngine, async_sessionmaker]]:
+    """
+    Тестовая БД с таблицами и базовыми данными: пользователи 1001/1002,
+    компании-партнер и агент с главными локациями, коллаборация между ними
+    Args:
+        url: Строка подключения (по умолчанию временный файл SQLite)
+        engine_options: Параметры create_async_engine
+    Returns:
+        AsyncIterator: (engine, sessionmaker)
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(url or sqlite_url(Path(tmp) / 'bench.db'), **engine_options)
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.drop_all)
+                await conn.run_sync(Base.metadata.create_all)
+            session_factory = async_sessionmaker(engine, expire_on_commit=False, autoflush=False)
+            async with session_factory() as session:
+                session.add_all([
+                    CouponStatus(id_status=status_id, name=name)
+                    for name, status_id in CouponStatusHelper.STATUS_MAP.items()
+                ])
+                session.add_all([
+                    User(id=1, id_tg=1001, first_name='Иван', last_name='Партнер', tel_num='70000000001'),
+                    User(id=2, id_tg=1002, first_name='Петр', last_name='Агент', tel_num='70000000002'),
+                    Company(id_comp=1, Name_comp='Партнер'),
+                    Company(id_comp=2, Name_comp='Агент'),
+                    CompLocation(id_location=1, id_comp=1, name_loc='Партнер, главная', main_loc=True),
+                    CompLocation(id_location=2, id_comp=2, name_loc='Агент, главная', main_loc=True),
+                ])
+                await session.flush()
+                session.add(CouponType(
+                    id_coupon_type=1, code_prefix='BEN', company_id=1, location_id=1, discount_percent=10,
+                    commission_percent=5, usage_limit=0, company_agent_id=2, location_agent_id=2,
+                    days_for_used=7, agent_agree=True, is_active=True,
+                    start_date=date.today(), end_date=date.today() + timedelta(days=30),
+                ))
+                await session.commit()
+            yield engine, session_factory
+        finally:
+            await engine.dispose()
+
+
+async def add_coupons(session_factory: async_sessionmaker, start: int, stop: int, batch: int = 50_000) -> None:
+    """
+    Купоны типа 1 с номерами [start, stop), выданные пользователю 2:
+    каждый пятый использован, остальные активны
+    """
+    active, used = CouponStatus.get_status_id('active'), CouponStatus.get_status_id('used')
+    end_date = date.today() + timedelta(days=30)
+    async with session_factory() as session:
+        for first in range(start, stop, batch):
+            await session.execute(insert(Coupon), [
+                {'code': f"BEN-{i}", 'coupon_type_id': 1, 'client_id': 2, 'issued_by': 1, 'end_date': end_date,
+                 'status_id': used if i % 5 == 0 else active, 'used_by': 2 if i % 5 == 0 else None}
+                for i in range(first, min(first + batch, stop))
+            ])
+            await session.commit()
+
+
+def fake_redis():
+    """Клиент fakeredis (pip install fakeredis[lua])"""
+    import fakeredis
+    return fakeredis.FakeAsyncRedis()
+
+
+def use_redis(client, *modules) -> None:
+    """Подменяет клиент Redis, импортированный модулями бота из utils.bot_obj"""
+    for module in modules:
+        module.redis = client
+
+
+class Timer:
+    """Замер длительности блока: with Timer() as t: ...; t.elapsed"""
+    def __enter__(self) -> "Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.elapsed = time.perf_counter() - self.started
+
+
+def latency_summary(samples: Iterable[float]) -> dict:
+    """p50/p95/max выборки длительностей в миллисекундах"""
+    samples = sorted(samples)
+    if not samples:
+        return {'p50_ms': 0.0, 'p95_ms': 0.0, 'max_ms': 0.0}
+    return {
+        'p50_ms': round(statistics.median(samples) * 1000, 3),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 3),
+        'max_ms': round(samples[-1] * 1000, 3),
+    }
+
+
+def print_table(title: str, rows: list[dict]) -> None:
+    """Печатает строки результатов одной таблицей"""
+    print(f"\n{title}")
+    if not rows:
+        return
+    columns = list(dict.fromkeys(column for row in rows for column in row))
+    widths = [max(len(str(column)), *(len(str(row.get(column, ''))) for row in rows)) for column in columns]
+    print('  '.join(str(column).ljust(width) for column, width in zip(columns, widths)))
+    for row in rows:
+        print('  '.join(str(row.get(column, '')).ljust(width) for column, width in zip(columns, widths)))
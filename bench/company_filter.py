@@ -0,0 +1,162 @@
+"""
+Поиск компаний по городам и категориям локаций.
+
+Заполняет БД --locations локациями (--companies компаний, --cities
+городов, --categories категорий, одна-две категории на локацию) и
+сравнивает три варианта:
+
+- прежний: названия городов отдельным запросом, соединение
+  Company-CompLocation-LocCat по строке CompLocation.city и DISTINCT,
+  без индексов фильтра;
+- нынешний запрос (IN по city_id и EXISTS по категориям) без индексов,
+  только с --with-unindexed: без индексов он перебирает все локации
+  для каждой компании и на 100 тыс. локаций идет минутами;
+- нынешний запрос с ix_comp_locations_city_comp и ix_loc_cats_category_location.
+
+Для каждого печатается EXPLAIN QUERY PLAN и задержка
+CompanyService.get_companies_filtered_by_loc, а также первой страницы
+get_companies_filtered_by_loc_page, которую показывают обработчики
+(раньше они получали весь список). Замер идет на SQLite;
+план MySQL (EXPLAIN) будет другим, но тоже опирается на эти индексы.
+
+    python -m bench.company_filter --locations 100000
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from bench.common import bench_database, latency_summary, print_table
+
+from sqlalchemy import insert, select, text
+
+from services.company_service import CompanyService
+from utils.database.models import City, Company, CompanyCategory, CompLocation, LocCat
+
+INDEXES = [
+    index
+    for table in (CompLocation.__table__, LocCat.__table__)
+    for index in table.indexes
+    if index.name in ('ix_comp_locations_city_comp', 'ix_loc_cats_category_location')
+]
+
+
+def _legacy_stmt(city_names: list[str], category: list[int]):
+    """Запрос фильтра компаний в том виде, в каком он был до city_id"""
+    # Условие соединения "A and B" в Python оставляло только первое сравнение
+    stmt = select(Company).join(
+        CompLocation, Company.id_comp == CompLocation.id_comp
+    ).join(
+        LocCat, LocCat.id_location == CompLocation.id_location
+    )
+    if city_names:
+        stmt = stmt.where(CompLocation.city.in_(city_names))
+    if category:
+        stmt = stmt.where(LocCat.id_category.in_(category))
+    return stmt.distinct()
+
+
+async def _legacy_filter(session, city: list[int], category: list[int]) -> list[Company]:
+    city_names = (await session.execute(select(City.name).where(City.id.in_(city)))).scalars().all()
+    return (await session.execute(_legacy_stmt(city_names, category))).scalars().all()
+
+
+async def _fill(session_factory, args) -> None:
+    rng = random.Random(args.seed)
+    async with session_factory() as session:
+        await session.execute(insert(City), [{'id': i, 'name': f"Город {i}"} for i in range(1, args.cities + 1)])
+        await session.execute(insert(CompanyCategory),
+                              [{'id': i, 'name': f"Категория {i}"} for i in range(1, args.categories + 1)])
+        await session.execute(insert(Company),
+                              [{'id_comp': i, 'Name_comp': f"Компания {i}"} for i in range(3, args.companies + 3)])
+        locations, loc_cats = [], []
+        for id_location in range(3, args.locations + 3):
+            id_comp = rng.randrange(3, args.companies + 3)
+            city_id = rng.randint(1, args.cities)
+            locations.append({'id_location': id_location, 'id_comp': id_comp, 'name_loc': f"Локация {id_location}",
+                              'city': f"Город {city_id}", 'city_id': city_id, 'main_loc': False})
+            for id_category in rng.sample(range(1, args.categories + 1), rng.randint(1, 2)):
+                loc_cats.append({'comp_id': id_comp, 'id_location': id_location, 'id_category': id_category})
+        await session.execute(insert(CompLocation), locations)
+        await session.execute(insert(LocCat), loc_cats)
+        await session.commit()
+        await session.execute(text("ANALYZE"))
+
+
+async def _plan(session, stmt) -> list[str]:
+    compiled = stmt.compile(session.bind, compile_kwargs={'literal_binds': True})
+    rows = (await session.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))).all()
+    return [row[-1] for row in rows]
+
+
+async def _measure(session_factory, runs: int, search) -> tuple[dict, int]:
+    latencies, found = [], 0
+    for _ in range(runs):
+        async with session_factory() as session:
+            started = time.perf_counter()
+            found = len(await search(session))
+            latencies.append(time.perf_counter() - started)
+    return latency_summary(latencies), found
+
+
+async def main(args) -> None:
+    city, category = args.city, args.category
+    async with bench_database() as (engine, session_factory):
+        await _fill(session_factory, args)
+
+        async with session_factory() as session:
+            city_names = (await session.execute(select(City.name).where(City.id.in_(city)))).scalars().all()
+        legacy_stmt = _legacy_stmt(city_names, category)
+        current_stmt = CompanyService(None)._companies_filtered_stmt(city=city, category=category)
+
+        async def legacy(session):
+            return await _legacy_filter(session, city, category)
+
+        async def current(session):
+            return await CompanyService(session).get_companies_filtered_by_loc(city=city, category=category)
+
+        async def current_page(session):
+            page = await CompanyService(session).get_companies_filtered_by_loc_page(city=city, category=category)
+            return page.items
+
+        variants = [('прежний, без индексов', legacy_stmt, legacy, False)]
+        if args.with_unindexed:
+            variants.append(('IN, без индексов', current_stmt, current, False))
+        variants.append(('IN, с индексами', current_stmt, current, True))
+        variants.append(('IN, с индексами, страница', current_stmt.order_by(Company.id_comp).limit(10),
+                         current_page, True))
+
+        rows, plans = [], []
+        for variant, stmt, search, indexed in variants:
+            async with engine.begin() as conn:
+                for index in INDEXES:
+                    if indexed:
+                        await conn.run_sync(index.create, checkfirst=True)
+                    else:
+                        await conn.run_sync(index.drop, checkfirst=True)
+            async with session_factory() as session:
+                plans.append((variant, await _plan(session, stmt)))
+            summary, found = await _measure(session_factory, args.runs, search)
+            rows.append({'variant': variant, 'companies': found, **summary})
+
+    print_table(f"{args.locations} локаций, {args.companies} компаний, города {city}, категории {category}, "
+                f"{args.runs} запусков", rows)
+    for variant, plan in plans:
+        print(f"\nEXPLAIN QUERY PLAN: {variant}")
+        for line in plan:
+            print(f"  {line}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--locations', type=int, default=100_000)
+    parser.add_argument('--companies', type=int, default=20_000)
+    parser.add_argument('--cities', type=int, default=50)
+    parser.add_argument('--categories', type=int, default=10)
+    parser.add_argument('--city', type=int, nargs='*', default=[1, 2], help="ID городов фильтра")
+    parser.add_argument('--category', type=int, nargs='*', default=[1], help="ID категорий фильтра")
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--with-unindexed', action='store_true',
+                        help="замерить и нынешний запрос без индексов")
+    asyncio.run(main(parser.parse_args()))
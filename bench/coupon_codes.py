@@ -0,0 +1,67 @@
+"""
+Скорость генерации и проверки кодов купонов.
+
+Генерирует --codes кодов одного типа через make_coupon_code и проверяет
+их уникальность, сравнивает со старым кодом из uuid4, замеряет
+локальную проверку is_valid_coupon_code и долю одиночных опечаток
+(замена одного символа тела), которые она отклоняет без обращения к БД.
+
+    python -m bench.coupon_codes --codes 1000000
+"""
+import argparse
+import random
+import uuid
+
+from bench.common import Timer, print_table
+
+from utils.coupon_codes import ALPHABET, is_valid_coupon_code, make_coupon_code, normalize_coupon_code
+
+PREFIX = 'BEN'
+
+
+def _rate(name: str, count: int, timer: Timer, **extra) -> dict:
+    return {'operation': name, 'count': count, 's': round(timer.elapsed, 3),
+            'per_s': round(count / timer.elapsed), **extra}
+
+
+def _typo(code: str, rng: random.Random) -> str:
+    prefix, _, body = code.rpartition('-')
+    position = rng.randrange(len(body) - 1)
+    replacement = rng.choice([char for char in ALPHABET if char != body[position]])
+    return f"{prefix}-{body[:position]}{replacement}{body[position + 1:]}"
+
+
+def main(args) -> None:
+    rng = random.Random(args.seed)
+
+    with Timer() as generate:
+        codes = [make_coupon_code(PREFIX, 1, seq) for seq in range(args.codes)]
+    duplicates = args.codes - len(set(codes))
+
+    with Timer() as legacy:
+        for _ in range(args.codes):
+            f"{PREFIX}-{uuid.uuid4().hex[:8].upper()}"
+
+    sample = codes[:args.checks]
+    with Timer() as validate:
+        valid = sum(is_valid_coupon_code(normalize_coupon_code(code)) for code in sample)
+
+    typos = [_typo(code, rng) for code in sample]
+    with Timer() as validate_typos:
+        rejected = sum(not is_valid_coupon_code(normalize_coupon_code(code)) for code in typos)
+
+    print_table(f"Коды купонов ({args.codes} кодов одного типа)", [
+        _rate('make_coupon_code', args.codes, generate, duplicates=duplicates),
+        _rate('uuid4 (прежний код)', args.codes, legacy),
+        _rate('проверка верных кодов', len(sample), validate, accepted=valid),
+        _rate('проверка кодов с опечаткой', len(typos), validate_typos,
+              rejected=f"{rejected / len(typos):.2%}"),
+    ])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--codes', type=int, default=1_000_000)
+    parser.add_argument('--checks', type=int, default=100_000)
+    parser.add_argument('--seed', type=int, default=1)
+    main(parser.parse_args())
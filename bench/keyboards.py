@@ -0,0 +1,87 @@
+"""
+Построение клавиатур выбора на каждый callback.
+
+Изображает работу с выбором категорий: --users пользователей делают по
+--callbacks нажатий (отметить категорию на текущей странице или
+перелистнуть) в справочнике из --categories категорий. На каждое
+нажатие клавиатура строится заново (_build_loc_categories_keyboard)
+или берется через loc_categories_keyboard из markup_cache. Отдельно
+сравниваются готовое меню коллабораций и его построение на каждый вызов.
+
+    python -m bench.keyboards --categories 200 --users 500
+"""
+import argparse
+import random
+import time
+
+from bench.common import Timer, latency_summary, print_table
+
+from services.reference_cache import RefItem, ReferenceTable
+from utils.keyboards import (_build_coupon_menu_keyboard, _build_loc_categories_keyboard, coupon_menu_keyboard,
+                             loc_categories_keyboard)
+from utils.markup_cache import markup_cache
+
+
+def _callbacks(table: ReferenceTable, args) -> list[tuple]:
+    """Последовательность (страница, отмеченные ID) всех нажатий всех пользователей"""
+    rng = random.Random(args.seed)
+    pages = table.page(0, 10).total_pages
+    sequence = []
+    for _ in range(args.users):
+        page, selected = 0, set()
+        for _ in range(args.callbacks):
+            if rng.random() < 0.3:
+                page = rng.randrange(pages)
+            else:
+                item = rng.choice(table.page(page, 10).items)
+                selected ^= {item.id}
+            sequence.append((page, frozenset(selected)))
+    return sequence
+
+
+def _measure(name: str, sequence, table: ReferenceTable, build) -> dict:
+    latencies = []
+    with Timer() as timer:
+        for page, selected in sequence:
+            started = time.perf_counter()
+            build(table.page(page, 10), selected)
+            latencies.append(time.perf_counter() - started)
+    return {'keyboard': name, **latency_summary(latencies), 'per_s': round(len(sequence) / timer.elapsed)}
+
+
+def main(args) -> None:
+    table = ReferenceTable('categories', model=None)
+    table.load([RefItem(i, f"Категория {i}") for i in range(1, args.categories + 1)], version=1)
+    sequence = _callbacks(table, args)
+
+    markup_cache.clear()
+    rows = [
+        _measure('построение на каждый callback', sequence, table,
+                 lambda page, selected: _build_loc_categories_keyboard(
+                     page, frozenset(item.id for item in page.items if item.id in selected))),
+        _measure('loc_categories_keyboard (кэш)', sequence, table, loc_categories_keyboard),
+    ]
+    stats = markup_cache.stats()
+    print_table(f"{len(sequence)} нажатий, {args.users} пользователей, {args.categories} категорий", rows)
+    print(f"markup_cache: {stats}")
+
+    calls = len(sequence)
+    with Timer() as build:
+        for _ in range(calls):
+            _build_coupon_menu_keyboard('iam_coupon')
+    with Timer() as prebuilt:
+        for _ in range(calls):
+            coupon_menu_keyboard('iam_coupon')
+    print_table(f"Меню коллабораций, {calls} вызовов", [
+        {'keyboard': 'построение на каждый вызов', 'us_per_call': round(build.elapsed / calls * 1e6, 2)},
+        {'keyboard': 'готовая разметка', 'us_per_call': round(prebuilt.elapsed / calls * 1e6, 2)},
+    ])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--categories', type=int, default=200)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--callbacks', type=int, default=40)
+    parser.add_argument('--seed', type=int, default=1)
+    main(parser.parse_args())
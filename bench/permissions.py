@@ -0,0 +1,134 @@
+"""
+Проверка разрешения: прежняя и на битовых масках.
+
+Прежняя проверка (воспроизведена здесь) на каждый вызов читала User,
+затем роли пользователя и перебирала списки PERMISSION_MAP. Нынешняя
+RoleService.has_permission берет снимок из кэша идентификации и
+проверяет одно AND с маской роли. Каждая проверка идет в своей сессии,
+как проверка в RoleMiddleware при обработке обновления. Отдельно
+сравниваются проверки пользователей экрана администратора по одному и
+пакетом (users_with_permission).
+
+    python -m bench.permissions --checks 5000 --users 200
+"""
+import argparse
+import asyncio
+import time
+from datetime import date, timedelta
+
+from bench.common import Timer, bench_database, fake_redis, latency_summary, print_table, use_redis
+
+from sqlalchemy import select
+
+import services.identity_service as identity_service
+from services.role_service import RoleService
+from utils.config import config
+from utils.database.models import User, UserRole
+
+ROLES = ('client', 'admin', 'partner', 'owner')
+
+
+async def legacy_has_permission(session, user_id: int, permission: str) -> bool:
+    """Проверка разрешения в том виде, в каком она была до масок"""
+    user = await session.get(User, user_id)
+    if not user:
+        return False
+    if config.OWNER_ID and user.id_tg == config.OWNER_ID:
+        return True
+    roles = (await session.execute(select(UserRole).where(UserRole.user_id == user_id))).scalars().all()
+    for role in roles:
+        if permission in RoleService.PERMISSION_MAP.get(role.role, []):
+            return True
+    return False
+
+
+async def _seed_users(session_factory, users: int) -> list[tuple[int, int]]:
+    """Пользователи с двумя ролями в компаниях 1 и 2; возвращает пары (User.id, id_tg)"""
+    pairs = [(100 + i, 10_000 + i) for i in range(users)]
+    async with session_factory() as session:
+        session.add_all([
+            User(id=user_id, id_tg=tg_id, first_name='Бенч', last_name=str(tg_id), tel_num=str(70_000_000_000 + tg_id))
+            for user_id, tg_id in pairs
+        ])
+        session.add_all([
+            UserRole(user_id=user_id, role=ROLES[(i + shift) % len(ROLES)], company_id=1 + shift,
+                     start_date=date.today(), end_date=date.today() + timedelta(days=365), changed_by=1)
+            for i, (user_id, _) in enumerate(pairs)
+            for shift in (0, 1)
+        ])
+        await session.commit()
+    return pairs
+
+
+async def _drop_identities() -> None:
+    identity_service.identity_cache.local.clear()
+    await identity_service.redis.flushall()
+
+
+async def _measure(name: str, checks: int, check) -> dict:
+    latencies = []
+    with Timer() as timer:
+        for i in range(checks):
+            started = time.perf_counter()
+            await check(i)
+            latencies.append(time.perf_counter() - started)
+    return {'check': name, **latency_summary(latencies), 'checks_per_s': round(checks / timer.elapsed)}
+
+
+async def main(args) -> None:
+    use_redis(fake_redis(), identity_service)
+    identity_service.identity_cache = identity_service.IdentityCache(
+        max(args.users, config.IDENTITY_CACHE_SIZE), config.IDENTITY_LOCAL_TTL, config.IDENTITY_REDIS_TTL
+    )
+
+    async with bench_database() as (_, session_factory):
+        pairs = await _seed_users(session_factory, args.users)
+
+        async def legacy(i: int) -> None:
+            async with session_factory() as session:
+                await legacy_has_permission(session, pairs[i % len(pairs)][0], 'activate_coupons')
+
+        async def masked(i: int) -> None:
+            async with session_factory() as session:
+                await RoleService(session).has_permission(pairs[i % len(pairs)][1], 'activate_coupons',
+                                                          company_id=1)
+
+        # Прогрев кэша идентификации: в работе бота снимок живет IDENTITY_LOCAL_TTL секунд
+        async with session_factory() as session:
+            await RoleService(session).users_with_permission([tg_id for _, tg_id in pairs], 'activate_coupons')
+
+        rows = [
+            await _measure('legacy', args.checks, legacy),
+            await _measure('bitmask, кэш прогрет', args.checks, masked),
+        ]
+        print_table(f"{args.checks} проверок 'activate_coupons', {args.users} пользователей", rows)
+
+        tg_ids = [tg_id for _, tg_id in pairs]
+        async with session_factory() as session:
+            service = RoleService(session)
+            with Timer() as one_by_one:
+                for tg_id in tg_ids:
+                    await service.has_permission(tg_id, 'activate_coupons', company_id=1)
+            with Timer() as batch:
+                await service.users_with_permission(tg_ids, 'activate_coupons', company_id=1)
+            await _drop_identities()
+            with Timer() as cold_one_by_one:
+                for tg_id in tg_ids:
+                    await service.has_permission(tg_id, 'activate_coupons', company_id=1)
+            await _drop_identities()
+            with Timer() as cold_batch:
+                await service.users_with_permission(tg_ids, 'activate_coupons', company_id=1)
+
+        print_table(f"Экран администратора: {args.users} пользователей", [
+            {'check': 'по одному', 'ms': round(one_by_one.elapsed * 1000, 3)},
+            {'check': 'users_with_permission', 'ms': round(batch.elapsed * 1000, 3)},
+            {'check': 'по одному, кэш пуст', 'ms': round(cold_one_by_one.elapsed * 1000, 3)},
+            {'check': 'users_with_permission, кэш пуст', 'ms': round(cold_batch.elapsed * 1000, 3)},
+        ])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--checks', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=200)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,83 @@
+"""
+Задержка event loop при генерации QR-кодов.
+
+Пока генерируются --renders разных QR-кодов (по --concurrency
+одновременно), фоновая задача каждые --tick-ms мс проверяет, насколько
+позже срока она проснулась: это время, на которое остальные
+обновления ждали бы event loop. Варианты: отрисовка прямо в event loop
+(как было), QRService с пулом потоков и с пулом процессов, и повторная
+выдача тех же кодов из кэша PNG.
+
+    python -m bench.qr_render --renders 200 --workers 2
+"""
+import argparse
+import asyncio
+import time
+
+from bench.common import Timer, latency_summary, print_table
+
+from services.qr_service import QRService
+from utils.qr_render import render_qr_png
+
+
+async def _monitor(tick_ms: float, lags: list[float], stop: asyncio.Event) -> None:
+    interval = tick_ms / 1000
+    while not stop.is_set():
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, time.perf_counter() - expected))
+
+
+async def _measure(name: str, render, args) -> dict:
+    lags: list[float] = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(_monitor(args.tick_ms, lags, stop))
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(i: int) -> None:
+        async with semaphore:
+            await render(f"https://t.me/bench_bot?start=coupon_{i}_1_1")
+
+    await asyncio.sleep(args.tick_ms / 1000)
+    with Timer() as timer:
+        await asyncio.gather(*(one(i) for i in range(args.renders)))
+    stop.set()
+    await monitor
+
+    summary = latency_summary(lags)
+    return {
+        'variant': name,
+        'renders_per_s': round(args.renders / timer.elapsed),
+        'lag_p50_ms': summary['p50_ms'],
+        'lag_p95_ms': summary['p95_ms'],
+        'lag_max_ms': summary['max_ms'],
+    }
+
+
+async def main(args) -> None:
+    async def inline(data: str) -> None:
+        # Каждое обновление - своя задача: между отрисовками event loop успевает проснуться
+        await asyncio.sleep(0)
+        render_qr_png(data)
+
+    rows = [await _measure('в event loop', inline, args)]
+    for kind in ('thread', 'process'):
+        service = QRService(kind, args.workers, cache_size=args.renders, cache_bytes=64 * 2 ** 20)
+        await service.start()
+        try:
+            rows.append(await _measure(f"пул, {kind}", service.png, args))
+            rows.append(await _measure(f"пул, {kind}, из кэша", service.png, args))
+        finally:
+            await service.stop()
+
+    print_table(f"{args.renders} QR-кодов, {args.concurrency} одновременно, {args.workers} воркера пула, "
+                f"проверка каждые {args.tick_ms} мс", rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--renders', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--tick-ms', type=float, default=5.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,86 @@
+"""
+Пиковая память и время выгрузки отчета по купонам.
+
+Таблица купонов растет до каждого из размеров --coupons. На каждом
+размере отчет выгружается ReportService.generate_coupons_report
+(серверный курсор пачками по REPORT_CHUNK_SIZE, запись во временный
+файл) и, для сравнения, прежним способом: весь результат запроса
+загружается в память (.all()), затем пишется в файл. Пик памяти Python
+считает tracemalloc; память самой библиотеки SQLite/драйвера MySQL
+он не видит.
+
+    python -m bench.report_export --coupons 100000 1000000
+"""
+import argparse
+import asyncio
+import gc
+import os
+import tempfile
+import tracemalloc
+
+from bench.common import Timer, add_coupons, bench_database, print_table
+
+from services.report_service import COUPONS_REPORT_HEADER, ReportService
+from utils.config import config
+from utils.report_export import open_report_writer
+
+
+async def _load_all(session, path: str, fmt: str, compress: bool) -> None:
+    """Выгрузка без потокового чтения: все строки в памяти до записи"""
+    rows = (await session.execute(ReportService._coupons_report_stmt())).all()
+    writer = open_report_writer(path, COUPONS_REPORT_HEADER, fmt, compress)
+    try:
+        writer.write_rows(rows)
+    finally:
+        writer.close()
+
+
+async def _measure(name: str, size: int, export) -> dict:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        with Timer() as timer:
+            file_size = await export()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'coupons': size, 'export': name, 's': round(timer.elapsed, 2),
+            'file_mb': round(file_size / 2 ** 20, 2), 'peak_mb': round(peak / 2 ** 20, 2)}
+
+
+async def main(args) -> None:
+    rows = []
+    async with bench_database() as (_, session_factory):
+        total = 0
+        for size in sorted(args.coupons):
+            await add_coupons(session_factory, total, size)
+            total = size
+
+            async def streamed() -> int:
+                async with session_factory() as session:
+                    async with ReportService(session).generate_coupons_report(args.format, args.gzip) as document:
+                        return os.path.getsize(document.path)
+
+            async def loaded() -> int:
+                fd, path = tempfile.mkstemp(prefix='coupons_report_')
+                os.close(fd)
+                try:
+                    async with session_factory() as session:
+                        await _load_all(session, path, args.format, args.gzip)
+                    return os.path.getsize(path)
+                finally:
+                    os.remove(path)
+
+            rows.append(await _measure('потоковая', size, streamed))
+            rows.append(await _measure('все строки в памяти', size, loaded))
+
+    print_table(f"Отчет по купонам: {args.format}{', gzip' if args.gzip else ''}, "
+                f"пачки по {config.REPORT_CHUNK_SIZE}", rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--coupons', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--format', choices=('csv', 'xlsx'), default=config.REPORT_FORMAT)
+    parser.add_argument('--gzip', action=argparse.BooleanOptionalAction, default=config.REPORT_GZIP)
+    asyncio.run(main(parser.parse_args()))
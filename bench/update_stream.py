@@ -0,0 +1,169 @@
+"""
+Пропускная способность потока обновлений в зависимости от числа воркеров.
+
+Кладет --updates обновлений (сообщения --users пользователей) в
+партиции UpdateStream и запускает по очереди 1, 2, 4... процесса
+UpdateStreamWorker (--workers). Обработчик каждого обновления занимает
+процессор на --cpu-ms и ждет --io-ms (изображает запросы к БД и
+Bot API). Замеряется время от старта воркеров до обработки всех
+обновлений; заодно проверяется, что обновления каждого чата
+обработаны по порядку.
+
+Нужен настоящий Redis: воркеры - отдельные процессы. TCP-сервер
+fakeredis (fakeredis.TcpFakeServer) подходит только для проверки
+самого замера: он однопоточный на Python и сам становится узким местом. Замер использует ключи с префиксом
+REDIS_PREFIX (по умолчанию bench) и удаляет их перед каждым прогоном.
+
+    python -m bench.update_stream --redis-url redis://127.0.0.1:6379/15 --workers 1 2 4
+"""
+import argparse
+import asyncio
+import multiprocessing
+import time
+
+from bench.common import print_table
+from bench.webhook_load import synthetic_update
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Message, Update
+from redis.asyncio import Redis
+
+from utils.config import config
+from utils.update_stream import UpdateStream, UpdateStreamWorker
+
+BOT_TOKEN = '123456:BENCH-TOKEN'
+
+
+def _key(name: str) -> str:
+    return f"{config.REDIS_PREFIX}:bench:{name}"
+
+
+def _spin(ms: float) -> None:
+    deadline = time.perf_counter() + ms / 1000
+    while time.perf_counter() < deadline:
+        pass
+
+
+async def _worker(redis_url: str, index: int, count: int, args: argparse.Namespace) -> None:
+    redis = Redis.from_url(redis_url)
+    dp = Dispatcher()
+    last_message: dict[int, int] = {}
+    disorder = 0
+
+    @dp.message()
+    async def handler(message: Message) -> None:
+        nonlocal disorder
+        if message.message_id < last_message.get(message.chat.id, 0):
+            disorder += 1
+        last_message[message.chat.id] = message.message_id
+        _spin(args.cpu_ms)
+        if args.io_ms:
+            await asyncio.sleep(args.io_ms / 1000)
+        await redis.incr(_key('processed'))
+
+    worker = UpdateStreamWorker(
+        bot=Bot(token=BOT_TOKEN),
+        dp=dp,
+        stream=UpdateStream(redis, args.partitions, max(config.UPDATE_STREAM_MAXLEN, args.updates)),
+        worker_index=index,
+        worker_count=count,
+        batch=config.UPDATE_STREAM_BATCH,
+        block_ms=100,
+        claim_idle_ms=config.UPDATE_STREAM_CLAIM_IDLE_MS,
+    )
+    await redis.incr(_key('ready'))
+    while not await redis.exists(_key('go')):
+        await asyncio.sleep(0.01)
+    await worker.start()
+    while not await redis.exists(_key('stop')):
+        await asyncio.sleep(0.05)
+    await worker.stop(5)
+    await redis.incrby(_key('disorder'), disorder)
+    await redis.aclose()
+
+
+def _worker_process(redis_url: str, index: int, count: int, args: argparse.Namespace) -> None:
+    asyncio.run(_worker(redis_url, index, count, args))
+
+
+async def _publish(redis: Redis, args: argparse.Namespace) -> None:
+    stream = UpdateStream(redis, args.partitions, max(config.UPDATE_STREAM_MAXLEN, args.updates))
+    bot = Bot(token=BOT_TOKEN)
+    for start in range(0, args.updates, 500):
+        updates = [
+            Update.model_validate(synthetic_update(args.first_tg_id + i % args.users), context={'bot': bot})
+            for i in range(start, min(start + 500, args.updates))
+        ]
+        await asyncio.gather(*(stream.publish(update, update.message.chat.id) for update in updates))
+    await bot.session.close()
+
+
+async def _reset(redis: Redis, partitions: int) -> None:
+    keys = [UpdateStream.stream_key(partition) for partition in range(partitions)]
+    keys += [UpdateStream.dead_letter_key()] + [_key(name) for name in ('processed', 'ready', 'go', 'stop', 'disorder')]
+    await redis.delete(*keys)
+
+
+async def _run(redis: Redis, workers: int, args: argparse.Namespace) -> dict:
+    await _reset(redis, args.partitions)
+    await _publish(redis, args)
+
+    context = multiprocessing.get_context('spawn')
+    processes = [
+        context.Process(target=_worker_process, args=(args.redis_url, index, workers, args))
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        while int(await redis.get(_key('ready')) or 0) < workers:
+            await asyncio.sleep(0.05)
+
+        started = time.perf_counter()
+        await redis.set(_key('go'), 1)
+        processed = 0
+        while processed < args.updates and time.perf_counter() - started < args.timeout:
+            await asyncio.sleep(0.01)
+            processed = int(await redis.get(_key('processed')) or 0)
+        elapsed = time.perf_counter() - started
+    finally:
+        await redis.set(_key('stop'), 1)
+        for process in processes:
+            process.join(30)
+
+    return {
+        'workers': workers,
+        'processed': processed,
+        's': round(elapsed, 3),
+        'updates_per_s': round(processed / elapsed),
+        'out_of_order': int(await redis.get(_key('disorder')) or 0),
+        'dead_lettered': await redis.xlen(UpdateStream.dead_letter_key()),
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    redis = Redis.from_url(args.redis_url)
+    try:
+        rows = [await _run(redis, workers, args) for workers in args.workers]
+    finally:
+        await _reset(redis, args.partitions)
+        await redis.aclose()
+    print_table(
+        f"{args.updates} обновлений, {args.users} чатов, {args.partitions} партиций, "
+        f"обработчик {args.cpu_ms} мс CPU + {args.io_ms} мс ожидания",
+        rows
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--redis-url', required=True)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--updates', type=int, default=20000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--first-tg-id', type=int, default=9_000_000_000)
+    parser.add_argument('--partitions', type=int, default=config.UPDATE_STREAM_PARTITIONS)
+    parser.add_argument('--cpu-ms', type=float, default=1.0)
+    parser.add_argument('--io-ms', type=float, default=0.0)
+    parser.add_argument('--timeout', type=float, default=300)
+    asyncio.run(main(parser.parse_args()))
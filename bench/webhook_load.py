@@ -0,0 +1,133 @@
+"""
+Генератор нагрузки на webhook.
+
+Отправляет --updates синтетических обновлений Telegram (текстовые
+сообщения от --users пользователей) POST-запросами с заголовком
+секрета через --connections соединений, как Telegram при
+WEBHOOK_MAX_CONNECTIONS. Печатает задержку ответа, число принятых и
+отклоненных (429) обновлений и время до окончания их обработки.
+
+Без --url поднимает WebhookServer локально с диспетчером, обработчик
+которого только ждет --handler-ms (изображает запросы к БД и Bot API).
+С --url нагружает запущенного бота (WEBHOOK_ENABLED=true); обновления
+тогда обрабатывает настоящий код, и ответы бота уходят в Telegram от
+имени тестовых ID пользователей.
+
+    python -m bench.webhook_load --updates 20000 --connections 40
+    python -m bench.webhook_load --url http://127.0.0.1:8080/webhook --secret $WEBHOOK_SECRET
+"""
+import argparse
+import asyncio
+import itertools
+import time
+
+from bench.common import Timer, latency_summary, print_table
+
+import aiohttp
+from aiogram import Bot, Dispatcher
+from aiogram.types import Message
+
+from utils.webhook import SECRET_HEADER, WebhookServer
+
+_update_ids = itertools.count(1)
+
+
+def synthetic_update(tg_id: int) -> dict:
+    """Обновление с текстовым сообщением пользователя, как его присылает Telegram"""
+    update_id = next(_update_ids)
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': tg_id, 'type': 'private'},
+            'from': {'id': tg_id, 'is_bot': False, 'first_name': 'Нагрузка'},
+            'text': 'Мои купоны',
+        },
+    }
+
+
+def _local_server(args) -> WebhookServer:
+    dp = Dispatcher()
+
+    @dp.message()
+    async def handler(message: Message) -> None:
+        await asyncio.sleep(args.handler_ms / 1000)
+
+    return WebhookServer(
+        bot=Bot(token='123456:BENCH-TOKEN'),
+        dp=dp,
+        secret=args.secret,
+        concurrency=args.concurrency,
+        max_pending=args.max_pending,
+        drain_timeout=60,
+    )
+
+
+async def _load(url: str, args) -> tuple[list[float], dict[int, int], float]:
+    latencies, statuses = [], {}
+    updates = iter(range(args.updates))
+    connector = aiohttp.TCPConnector(limit=args.connections)
+    async with aiohttp.ClientSession(connector=connector, headers={SECRET_HEADER: args.secret}) as client:
+
+        async def connection() -> None:
+            # Как Telegram: по одному запросу на соединение, следующий после ответа
+            for i in updates:
+                started = time.perf_counter()
+                async with client.post(url, json=synthetic_update(args.first_tg_id + i % args.users)) as response:
+                    await response.read()
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status] = statuses.get(response.status, 0) + 1
+
+        with Timer() as timer:
+            await asyncio.gather(*(connection() for _ in range(args.connections)))
+    return latencies, statuses, timer.elapsed
+
+
+async def main(args) -> None:
+    server = None
+    url = args.url
+    if url is None:
+        server = _local_server(args)
+        await server.start('127.0.0.1', args.port, '/webhook')
+        url = f"http://127.0.0.1:{args.port}/webhook"
+
+    try:
+        latencies, statuses, elapsed = await _load(url, args)
+        row = {
+            'updates': args.updates,
+            **latency_summary(latencies),
+            'requests_per_s': round(args.updates / elapsed),
+            **{f"http_{status}": count for status, count in sorted(statuses.items())},
+        }
+        if server is not None:
+            with Timer() as drain:
+                await server.drain()
+            row['processed_per_s'] = round(server.processed / (elapsed + drain.elapsed))
+            row['drain_s'] = round(drain.elapsed, 3)
+    finally:
+        if server is not None:
+            await server.stop()
+
+    title = f"{args.connections} соединений, {args.users} пользователей, {url}"
+    if server is not None:
+        title += (f"; обработчик {args.handler_ms} мс, concurrency={args.concurrency}, "
+                  f"max_pending={args.max_pending}")
+    print_table(title, [row])
+    if server is not None:
+        print(f"WebhookServer: {server.stats()}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--updates', type=int, default=20000)
+    parser.add_argument('--connections', type=int, default=40)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--first-tg-id', type=int, default=9_000_000_000)
+    parser.add_argument('--url', help="адрес webhook запущенного бота")
+    parser.add_argument('--secret', default='bench-secret', help="WEBHOOK_SECRET бота")
+    parser.add_argument('--port', type=int, default=8099, help="порт локального сервера")
+    parser.add_argument('--handler-ms', type=float, default=20.0)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--max-pending', type=int, default=1000)
+    asyncio.run(main(parser.parse_args()))
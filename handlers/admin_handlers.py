@@ -5,21 +5,29 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from services.category_service import CategoryService
 from services.coupon_service import CouponService
+from services.identity_service import IdentityService
+from services.role_service import RoleService
 from services.user_service import UserService
 from services.company_service import CompanyService
 from sqlalchemy.ext.asyncio import AsyncSession
 from utils.database.models import User, CompanyCategory
 from utils.keyboards import categories_keyboard
 import logging
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
 from aiogram.filters import StateFilter, Command
 from utils.states import AdminStates
-import qrcode
-from io import BytesIO
+from utils.coupon_codes import normalize_coupon_code, is_valid_coupon_code
+from services.audit_log import audit_log
+from services.qr_service import qr_service
 from utils.bot_obj import bot
 
 router = Router()
 logger = logging.getLogger(__name__)
 
+# Верхняя граница столбца COUPONS.order_amount DECIMAL(10, 2)
+MAX_ORDER_AMOUNT = Decimal('100000000')
+
+
 class CategoryStates(StatesGroup):
     waiting_for_category_name = State()
     waiting_for_category_selection = State()
@@ -85,7 +93,12 @@ async def activate_coupon(message: Message, state: FSMContext):
 @router.message(F.text, StateFilter(AdminStates.waiting_for_coupon_code))
 async def process_coupon_activation(message: Message, state: FSMContext, session: AsyncSession):
     """Активация купона"""
-    coupon_code = message.text.strip()
+    coupon_code = normalize_coupon_code(message.text)
+    if not is_valid_coupon_code(coupon_code):
+        # Опечатка в коде отсекается без обращения к БД
+        await message.answer("❌ Неверный код купона, проверьте ввод")
+        return
+
     coupon_service = CouponService(session)
     
     try:
@@ -111,25 +124,40 @@ async def process_coupon_activation(message: Message, state: FSMContext, session
 @router.message(F.text, StateFilter(AdminStates.waiting_for_order_amount))
 async def process_order_amount(message: Message, state: FSMContext, session: AsyncSession):
     """Обработка суммы заказа для активации купона"""
+    # Decimal, как и в БД: NaN, бесконечность и лишние знаки не должны попасть в order_amount
+    try:
+        amount = Decimal(message.text.strip())
+    except InvalidOperation:
+        amount = None
+    if amount is None or not amount.is_finite() or amount <= 0 or amount >= MAX_ORDER_AMOUNT:
+        await message.answer("❌ Введите корректную сумму заказа")
+        return
+    amount = amount.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
     try:
-        amount = float(message.text)
-        if amount <= 0:
-            raise ValueError("Недопустимая сумма")
-        
         data = await state.get_data()
         coupon_code = data['coupon_code']
-        
+
+        # used_by ссылается на внутренний ID пользователя
+        admin = await IdentityService(session).resolve(message.from_user.id)
+        if not admin:
+            await message.answer("❌ Администратор не найден")
+            await state.clear()
+            return
+
         coupon_service = CouponService(session)
         await coupon_service.redeem_coupon(
             coupon_code=coupon_code,
-            redeemed_by=message.from_user.id,
+            redeemed_by=admin.id,
             amount=amount
         )
+        await audit_log.log(admin.id, 'coupon_redeem')
         
         await message.answer("✅ Купон успешно активирован!")
         await state.clear()
-    except ValueError:
-        await message.answer("❌ Введите корректную сумму заказа")
+    except ValueError as e:
+        await message.answer(f"❌ {e}")
+        await state.clear()
     except Exception as e:
         logger.error(f"Ошибка активации купона: {e}")
         await message.answer("❌ Не удалось активировать купон")
@@ -169,21 +197,59 @@ async def handle_get_coupon_qr(message: Message, session: AsyncSession):
         return
 
     # Генерация deep-ссылки
-    bot_username = (await bot.get_me()).username
+    bot_username = (await bot.me()).username
     deep_link = f"https://t.me/{bot_username}?start=coupon_{collaboration_id}_{message.from_user.id}_{location_id}"
-    
-    # Создание QR-кода
-    qr = qrcode.make(deep_link)
-    img_bytes = BytesIO()
-    qr.save(img_bytes, format='PNG')
-    img_bytes.seek(0)
-
-    # Отправка результата
-    await message.answer_photo(
-        photo=img_bytes,
+
+    # QR рисуется вне event loop; повторно отправляется сохраненный file_id
+    await qr_service.answer_qr(
+        message,
+        deep_link,
         caption=f"✅ QR для выдачи купона:\n"
                 f"• Купон: `{collaboration_id}`\n"
                 f"• Локация: `{location_id}`\n"
                 f"Ссылка: `{deep_link}`",
         parse_mode="Markdown"
+    )
+
+
+@router.message(Command("get_location_qr"))
+async def handle_get_location_qr(message: Message, session: AsyncSession):
+    """Печатные листы QR-кодов всех действующих коллабораций локации"""
+    args = message.text.split()
+    if len(args) != 2 or not args[1].isdigit():
+        await message.answer("❗ Использование:\n`/get_location_qr <ID_локации>`", parse_mode="Markdown")
+        return
+    location_id = int(args[1])
+
+    location = await CompanyService(session).get_location_by_id(location_id)
+    if not location:
+        await message.answer(f"❌ Локация {location_id} не существует")
+        return
+
+    # Листы выдают купоны от имени администратора именно этой локации
+    if not await RoleService(session).has_permission(
+            message.from_user.id, "activate_coupons", company_id=location.id_comp, location_id=location_id
+    ):
+        await message.answer("❌ Только для администраторов этой локации")
+        return
+
+    collaboration_ids = await CouponService(session).location_collaboration_ids(location_id)
+    if not collaboration_ids:
+        await message.answer(f"📭 В локации {location_id} нет действующих коллабораций")
+        return
+
+    bot_username = (await bot.me()).username
+    entries = [
+        (
+            f"https://t.me/{bot_username}?start=coupon_{collaboration_id}_{message.from_user.id}_{location_id}",
+            f"#{collaboration_id}"
+        )
+        for collaboration_id in collaboration_ids
+    ]
+    await qr_service.answer_sheets(
+        message,
+        entries,
+        caption=f"✅ QR для выдачи купонов в локации `{location_id}`\n"
+                f"Коллаборации: {', '.join(f'`{cid}`' for cid in collaboration_ids)}",
+        parse_mode="Markdown"
     )
\ No newline at end of file
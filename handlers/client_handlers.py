@@ -1,56 +1,53 @@
 from aiogram import Router, F
 from aiogram.types import Message
-from utils.database.models import User
 from services.coupon_service import CouponService
+from services.identity_service import UserIdentity
 from sqlalchemy.ext.asyncio import AsyncSession
-import qrcode
-from io import BytesIO
+from typing import Optional
+from services.qr_service import qr_service
+from utils.qr_render import ERROR_CORRECT_L
 
 router = Router()
 
 @router.message(F.text == "Получить купон")
-async def get_coupon(message: Message, session: AsyncSession):
+async def get_coupon(message: Message, session: AsyncSession, identity: Optional[UserIdentity] = None):
     """Генерация нового купона для клиента"""
+    if identity is None:
+        await message.answer("Вы еще не зарегистрированы. Отправьте /start")
+        return
+
     coupon_service = CouponService(session)
     
     try:
         coupon = await coupon_service.generate_coupon(
             issuer_id=1,  # Системный пользователь
-            client_id=message.from_user.id,
+            client_id=identity.id,
+            client_tg_id=identity.id_tg,
             coupon_type_id=1  # Базовый тип купона
         )
         
-        # Генерация QR-кода
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(coupon.code)
-        qr.make(fit=True)
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        # Отправка изображения
-        bio = BytesIO()
-        bio.name = f'coupon_{coupon.code}.png'
-        img.save(bio, 'PNG')
-        bio.seek(0)
-        
-        await message.answer_photo(
-            photo=bio,
+        # QR-код рисуется вне event loop; код купона одноразовый, file_id не сохраняем
+        await qr_service.answer_qr(
+            message,
+            coupon.code,
             caption=f"🎫 Ваш купон: {coupon.code}\n"
                     f"🔢 Код: {coupon.code}\n"
-                    f"📅 Срок действия: до {coupon.end_date}"
+                    f"📅 Срок действия: до {coupon.end_date}",
+            error_correction=ERROR_CORRECT_L,
+            reuse=False
         )
     except Exception as e:
         await message.answer("❌ Не удалось создать купон. Попробуйте позже.")
 
 @router.message(F.text == "Мои купоны")
-async def my_coupons(message: Message, session: AsyncSession):
+async def my_coupons(message: Message, session: AsyncSession, identity: Optional[UserIdentity] = None):
     """Просмотр активных купонов пользователя"""
+    if identity is None:
+        await message.answer("📭 У вас пока нет активных купонов")
+        return
+
     coupon_service = CouponService(session)
-    coupons = await coupon_service.get_user_coupons(message.from_user.id)
+    coupons = await coupon_service.get_user_coupons(identity.id)
     
     if not coupons:
         await message.answer("📭 У вас пока нет активных купонов")
@@ -3,10 +3,10 @@ from aiogram.fsm.context import FSMContext
 from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Message
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from handlers.common_handlers import logger
+from services.collab_inbox import collab_inbox
 from services.company_service import CompanyService
 from services.coupon_service import CouponService
-from utils.bot_obj import bot
+from utils.outbox import outbox
 from utils.keyboards import main_menu
 from utils.states import CreateCouponTypeStates, CollaborationStates
 from datetime import datetime
@@ -155,6 +155,7 @@ async def confirm_coupon_type(cb: CallbackQuery, state: FSMContext, session: Asy
         location_agent_id=data["agent_location_id"],
         days_for_used=data["days_for_used"],
     )
+    await collab_inbox.add(coupon.company_agent_id, coupon.id_coupon_type)
 
     await cb.message.answer("🎉 Купон успешно создан!")
     await cb.message.delete()
@@ -209,15 +210,13 @@ async def confirm_coupon_type(cb: CallbackQuery, state: FSMContext, session: Asy
         ]
     ])
 
-    try:
-        await bot.send_message(
-            chat_id=agent_user_id,
-            text=notify_text,
-            reply_markup=keyboard,
-            parse_mode="HTML"
-        )
-    except Exception as e:
-        logger.error(f"Ошибка отправки уведомления агенту: {e}")
+    # Уведомление уходит через очередь: повторы при RetryAfter и сохранение в Redis
+    await outbox.send_message(
+        chat_id=agent_user_id,
+        text=notify_text,
+        reply_markup=keyboard,
+        parse_mode="HTML"
+    )
 
 
 @router.callback_query(CreateCouponTypeStates.confirm, F.data == "cancel_coupon_type")
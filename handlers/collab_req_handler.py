@@ -2,8 +2,12 @@ from aiogram import Router, F
 from aiogram.types import CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from services.audit_log import audit_log
+from services.broadcast_service import broadcaster
+from services.collab_inbox import collab_inbox
 from services.coupon_service import CouponService
-from utils.bot_obj import bot
+from services.identity_service import IdentityService
+from utils.outbox import outbox
 
 router = Router()
 
@@ -14,7 +18,15 @@ async def req_collab(cb: CallbackQuery, session: AsyncSession):
     status = True if status_txt == 'confirm' else False
 
     coupon_service = CouponService(session=session)
-    await coupon_service.set_collab_status(coupon_type_id=int(coupon_id), status=status)
+    coupon_type = await coupon_service.set_collab_status(coupon_type_id=int(coupon_id), status=status)
+    if coupon_type:
+        await collab_inbox.remove(coupon_type.company_agent_id, int(coupon_id))
+    identity = await IdentityService(session).resolve(cb.from_user.id)
+    await audit_log.log(
+        identity.id if identity else None,
+        'collab_confirm' if status else 'collab_reject',
+        int(coupon_id)
+    )
     await coupon_service.set_collab_active_status(coupon_type_id=int(coupon_id), status=status)
 
     text = '✅ Коллаборация подтверждена' if status else '❌ Коллаборация Отклонена'
@@ -26,12 +38,16 @@ async def req_collab(cb: CallbackQuery, session: AsyncSession):
         [InlineKeyboardButton(text="👌 OK", callback_data="ok")]
     ])
 
-    await bot.send_message(
-        chat_id=owner_id,
+    await outbox.send_message(
+        chat_id=int(owner_id),
         text=text,
         reply_markup=keyboard
     )
 
+    if status:
+        # Сообщаем клиентам компании о новой коллаборации
+        await broadcaster.start_collab_broadcast(session, int(coupon_id))
+
 @router.callback_query(F.data.startswith('ok'))
 async def req_collab(cb: CallbackQuery, session: AsyncSession):
     await cb.message.delete()
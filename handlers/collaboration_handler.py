@@ -8,6 +8,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from services.action_logger import CityLogger
 from services.category_service import CategoryService
+from services.collab_inbox import collab_inbox
 from services.company_service import CompanyService
 from services.coupon_service import CouponService
 from services.role_service import RoleService
@@ -59,7 +60,8 @@ async def select_collab_menu(cb: CallbackQuery, state: FSMContext, session: Asyn
         await state.update_data(filter_selected_city=[], filter_selected_category=[])
 
     elif cb.data == 'iam_agent':
-        keyboard = coupon_menu_keyboard(cb_data=str(cb.data))
+        requests_count = await collab_inbox.unread(session, data['company_id'])
+        keyboard = coupon_menu_keyboard(cb_data=str(cb.data), requests_count=requests_count)
         await cb.message.edit_text(
             text='🕓 Выберите действие',
             reply_markup=keyboard
@@ -132,14 +134,14 @@ async def iam_coupon_search(cb: CallbackQuery, state: FSMContext, session: Async
 
     current_page = data.get('current_page', 0)
 
-    comp_list = await comp_service.get_companies_filtered_by_loc(
+    comp_page = await comp_service.get_companies_filtered_by_loc_page(
         city=selected_cities,
-        category=selected_categories
+        category=selected_categories,
+        page=current_page
     )
 
     keyboard = loc_comp_keyboard(
-        companies=comp_list,
-        page=current_page,
+        companies=comp_page,
         selected_companies=data.get('selected_companies', [])
     )
 
@@ -330,9 +332,9 @@ async def handle_company_pagination(cb: CallbackQuery, state: FSMContext, sessio
     elif cb.data == 'filter_clear':
         await state.update_data(filter_selected_city=[], filter_selected_category=[], current_page=0)
         comp_service = CompanyService(session)
-        comp_list = await comp_service.get_companies_filtered_by_loc(city=[], category=[])
+        comp_page = await comp_service.get_companies_filtered_by_loc_page(city=[], category=[], page=0)
 
-        keyboard = loc_comp_keyboard(companies=comp_list, page=0, selected_companies=[])
+        keyboard = loc_comp_keyboard(companies=comp_page, selected_companies=[])
 
         await cb.message.edit_reply_markup(reply_markup=keyboard)
         await handle_pagination(cb, state, session)
@@ -367,8 +369,8 @@ async def process_city_selection(cb: CallbackQuery, state: FSMContext, session:
         await state.update_data(filter_selected_city=selected_cities)
 
         city_service = CityLogger(session)
-        cities = await city_service.get_all_cities()
-        keyboard = loc_city_keyboard(cities, selected_cities, current_page)
+        cities = await city_service.get_cities_page(current_page)
+        keyboard = loc_city_keyboard(cities, selected_cities)
 
         await cb.message.edit_reply_markup(reply_markup=keyboard)
 
@@ -377,8 +379,8 @@ async def process_city_selection(cb: CallbackQuery, state: FSMContext, session:
         await state.update_data(current_page=new_page)
 
         city_service = CityLogger(session)
-        cities = await city_service.get_all_cities()
-        keyboard = loc_city_keyboard(cities, selected_cities, new_page)
+        cities = await city_service.get_cities_page(new_page)
+        keyboard = loc_city_keyboard(cities, selected_cities)
 
         await cb.message.edit_reply_markup(reply_markup=keyboard)
 
@@ -411,8 +413,8 @@ async def process_category_selection(cb: CallbackQuery, state: FSMContext, sessi
         await state.update_data(filter_selected_category=selected_categories)
 
         category_service = CategoryService(session)
-        categories = await category_service.get_all_categories()
-        keyboard = loc_categories_keyboard(categories, selected_categories, current_page)
+        categories = await category_service.get_categories_page(current_page)
+        keyboard = loc_categories_keyboard(categories, selected_categories)
 
         await cb.message.edit_reply_markup(reply_markup=keyboard)
 
@@ -421,8 +423,8 @@ async def process_category_selection(cb: CallbackQuery, state: FSMContext, sessi
         await state.update_data(current_page=new_page)
 
         category_service = CategoryService(session)
-        categories = await category_service.get_all_categories()
-        keyboard = loc_categories_keyboard(categories, selected_categories, new_page)
+        categories = await category_service.get_categories_page(new_page)
+        keyboard = loc_categories_keyboard(categories, selected_categories)
 
         await cb.message.edit_reply_markup(reply_markup=keyboard)
 
@@ -463,7 +465,9 @@ async def _handle_collab_confirm(
         company_id: int
 ):
     coupon_service = CouponService(session)
-    await coupon_service.set_collab_status(coupon_id, True)
+    coupon_type = await coupon_service.set_collab_status(coupon_id, True)
+    if coupon_type:
+        await collab_inbox.remove(coupon_type.company_agent_id, coupon_id)
     text, keyboard = await collab_info(session=session, coupon_id=coupon_id, company_id=company_id)
     await _edit_message(cb, text, keyboard)
 
@@ -474,7 +478,9 @@ async def _handle_collab_stop(
         coupon_id: int
 ):
     coupon_service = CouponService(session)
-    await coupon_service.set_collab_status(coupon_id, False)
+    coupon_type = await coupon_service.set_collab_status(coupon_id, False)
+    if coupon_type:
+        await collab_inbox.remove(coupon_type.company_agent_id, coupon_id)
     await coupon_service.set_collab_active_status(coupon_id, False)
     text, keyboard = await collab_info(coupon_id=coupon_id, session=session)
     await _edit_message(cb, text, keyboard)
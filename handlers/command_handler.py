@@ -10,7 +10,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from handlers.common_handlers import partner_selected
 from services.auth_service import AuthService
-from services.role_service import RoleService
+from services.identity_service import IdentityService
 from services.coupon_service import CouponService
 from utils.keyboards import main_menu
 from utils.states import RegistrationStates
@@ -31,6 +31,14 @@ async def start(message: Message, session: AsyncSession, state: FSMContext):
             admin_tg_id = int(params[2])
             location_id = int(params[3])
 
+            # Клиент мог впервые открыть бота по QR-коду - регистрируем его
+            await AuthService(session).get_or_create_user(
+                tg_id=message.from_user.id,
+                first_name=message.from_user.first_name,
+                last_name=message.from_user.last_name or "",
+                username=message.from_user.username or ""
+            )
+
             # Вызов функции выдачи купона
             coupon_service = CouponService(session)
             result = await coupon_service.issue_coupon_to_client(
@@ -53,10 +61,9 @@ async def start(message: Message, session: AsyncSession, state: FSMContext):
         username=message.from_user.username or ""
     )
     await state.clear()
-    role_service = RoleService(session)
-    user_roles = await role_service.get_user_roles(message.from_user.id)
+    identity = await IdentityService(session).resolve(message.from_user.id)
 
-    if user_roles or exists:
+    if (identity and identity.roles) or exists:
         await message.answer(
             "👋 Добро пожаловать в ReferralBot!",
             reply_markup=await main_menu(session, message.from_user.id)
@@ -2,11 +2,13 @@
 from aiogram import Router, F
 from aiogram.types import Message, ReplyKeyboardRemove, CallbackQuery
 from aiogram.fsm.context import FSMContext
-from utils.database.models import User
+from services.identity_service import UserIdentity
 from services.role_service import RoleService
+from services.user_service import UserService
 from services.company_service import CompanyService
 from services.category_service import CategoryService
 from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
 import logging
 
 from utils.keyboards import main_menu, loc_categories_keyboard
@@ -41,7 +43,7 @@ async def partner_selected(message: Message, state: FSMContext):
 async def start_create_new_location(message: Message, state: FSMContext, session: AsyncSession):
     await state.update_data(company_name=message.text)
     category_service = CategoryService(session)
-    categories = await category_service.get_all_categories()
+    categories = await category_service.get_categories_page()
     keyboard = loc_categories_keyboard(categories, selected_category=[])
     await message.answer(
         text=f"✍️ Введите Категории",
@@ -68,8 +70,8 @@ async def process_company_name(cb: CallbackQuery, state: FSMContext, session: As
         await state.update_data(selected_category=selected_category)
 
         category_service = CategoryService(session)
-        categories = await category_service.get_all_categories()
-        keyboard = loc_categories_keyboard(categories, selected_category, current_page)
+        categories = await category_service.get_categories_page(current_page)
+        keyboard = loc_categories_keyboard(categories, selected_category)
 
         await cb.message.edit_reply_markup(reply_markup=keyboard)
 
@@ -78,8 +80,8 @@ async def process_company_name(cb: CallbackQuery, state: FSMContext, session: As
         await state.update_data(current_page=new_page)
 
         category_service = CategoryService(session)
-        categories = await category_service.get_all_categories()
-        keyboard = loc_categories_keyboard(categories, selected_category, new_page)
+        categories = await category_service.get_categories_page(new_page)
+        keyboard = loc_categories_keyboard(categories, selected_category)
 
         await cb.message.edit_reply_markup(reply_markup=keyboard)
 
@@ -158,15 +160,19 @@ async def process_company_address(message: Message, state: FSMContext, session:
 
 
 @router.message(F.text == "Мой профиль")
-async def my_profile(message: Message, session: AsyncSession, user: User):
+async def my_profile(message: Message, session: AsyncSession, identity: Optional[UserIdentity] = None):
     """Отображение профиля пользователя"""
-    role_service = RoleService(session)
-    user_roles = await role_service.get_user_roles(user.id)
+    if identity is None:
+        await message.answer("Вы еще не зарегистрированы. Отправьте /start")
+        return
 
+    user = await UserService(session).get_user_by_id(identity.id)
+
+    # Роли берутся из снимка: в нем есть и роли, записанные по Telegram ID
     roles_info = "\n".join([
-        f"- {role.role} в компании ID {role.company_id}"
-        for role in user_roles
-    ]) if user_roles else "Нет назначенных ролей"
+        f"- {role} в компании ID {company_id}"
+        for role, company_id, _ in sorted(identity.roles, key=lambda r: (r[1] or 0, r[0]))
+    ]) if identity.roles else "Нет назначенных ролей"
 
     profile_text = (
         f"👤 <b>Ваш профиль</b>\n"
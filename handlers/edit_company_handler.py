@@ -111,7 +111,7 @@ async def edit_comp_btn(message: Message, state: FSMContext, session: AsyncSessi
 
     elif action == 'category':
         category_service = CategoryService(session)
-        categories = await category_service.get_all_categories()
+        categories = await category_service.get_categories_page()
         selected_category = await comp_service.get_loc_categories_id(
             comp_id=int(data['company_id']),
             id_location=int(data['location_id']),
@@ -147,15 +147,15 @@ async def process_edit_categories(cb: CallbackQuery, state: FSMContext, session:
             selected_category.append(category_id)
 
         await state.update_data(selected_category=selected_category)
-        categories = await category_service.get_all_categories()
-        keyboard = loc_categories_keyboard(categories, selected_category, current_page)
+        categories = await category_service.get_categories_page(current_page)
+        keyboard = loc_categories_keyboard(categories, selected_category)
         await cb.message.edit_reply_markup(reply_markup=keyboard)
 
     elif cb.data.startswith('page_'):
         new_page = int(cb.data.split('_')[1])
         await state.update_data(current_page=new_page)
-        categories = await category_service.get_all_categories()
-        keyboard = loc_categories_keyboard(categories, selected_category, new_page)
+        categories = await category_service.get_categories_page(new_page)
+        keyboard = loc_categories_keyboard(categories, selected_category)
         await cb.message.edit_reply_markup(reply_markup=keyboard)
 
     elif cb.data == 'add_category':
@@ -26,8 +26,8 @@ async def process_company_name(cb: CallbackQuery, state: FSMContext, session: As
         await state.update_data(selected_category=selected_category)
 
         category_service = CategoryService(session)
-        categories = await category_service.get_all_categories()
-        keyboard = loc_categories_keyboard(categories, selected_category, current_page)
+        categories = await category_service.get_categories_page(current_page)
+        keyboard = loc_categories_keyboard(categories, selected_category)
 
         await cb.message.edit_reply_markup(reply_markup=keyboard)
 
@@ -36,8 +36,8 @@ async def process_company_name(cb: CallbackQuery, state: FSMContext, session: As
         await state.update_data(current_page=new_page)
 
         category_service = CategoryService(session)
-        categories = await category_service.get_all_categories()
-        keyboard = loc_categories_keyboard(categories, selected_category, new_page)
+        categories = await category_service.get_categories_page(new_page)
+        keyboard = loc_categories_keyboard(categories, selected_category)
 
         await cb.message.edit_reply_markup(reply_markup=keyboard)
 
@@ -31,8 +31,8 @@ async def start_create_new_location(message: Message, state: FSMContext, session
 async def start_create_new_location(message: Message, state: FSMContext, session: AsyncSession):
     await state.update_data(new_loc_name=message.text)
     city_service = CityLogger(session)
-    categories = await city_service.get_all_cities()
-    keyboard = loc_city_keyboard(categories, selected_cities=None)
+    cities = await city_service.get_cities_page()
+    keyboard = loc_city_keyboard(cities, selected_cities=None)
     await message.answer(
         text=f"✍️ Введите Категории",
         reply_markup=keyboard
@@ -53,8 +53,8 @@ async def start_create_new_location(cb: CallbackQuery, state: FSMContext, sessio
         await state.update_data(selected_city=city_id)
 
         city_service = CityLogger(session)
-        cities = await city_service.get_all_cities()
-        keyboard = loc_city_keyboard(cities, selected_city, current_page)
+        cities = await city_service.get_cities_page(current_page)
+        keyboard = loc_city_keyboard(cities, selected_city)
 
         await cb.message.edit_reply_markup(reply_markup=keyboard)
 
@@ -63,8 +63,8 @@ async def start_create_new_location(cb: CallbackQuery, state: FSMContext, sessio
         await state.update_data(current_page=new_page)
 
         city_service = CityLogger(session)
-        cities = await city_service.get_all_cities()
-        keyboard = loc_city_keyboard(cities, selected_city, new_page)
+        cities = await city_service.get_cities_page(new_page)
+        keyboard = loc_city_keyboard(cities, selected_city)
 
         await cb.message.edit_reply_markup(reply_markup=keyboard)
 
@@ -95,7 +95,7 @@ async def start_create_new_location(message: Message, state: FSMContext, session
 async def start_create_new_location(message: Message, state: FSMContext, session: AsyncSession):
     await state.update_data(new_loc_address_url=message.text)
     category_service = CategoryService(session)
-    categories = await category_service.get_all_categories()
+    categories = await category_service.get_categories_page()
     keyboard = loc_categories_keyboard(categories, selected_category=[])
     await message.answer(
         text=f"✍️ Введите Категории",
@@ -122,8 +122,8 @@ async def process_company_name(cb: CallbackQuery, state: FSMContext, session: As
         await state.update_data(selected_category=selected_category)
 
         category_service = CategoryService(session)
-        categories = await category_service.get_all_categories()
-        keyboard = loc_categories_keyboard(categories, selected_category, current_page)
+        categories = await category_service.get_categories_page(current_page)
+        keyboard = loc_categories_keyboard(categories, selected_category)
 
         await cb.message.edit_reply_markup(reply_markup=keyboard)
 
@@ -132,8 +132,8 @@ async def process_company_name(cb: CallbackQuery, state: FSMContext, session: As
         await state.update_data(current_page=new_page)
 
         category_service = CategoryService(session)
-        categories = await category_service.get_all_categories()
-        keyboard = loc_categories_keyboard(categories, selected_category, new_page)
+        categories = await category_service.get_categories_page(new_page)
+        keyboard = loc_categories_keyboard(categories, selected_category)
 
         await cb.message.edit_reply_markup(reply_markup=keyboard)
 
@@ -148,9 +148,11 @@ async def process_company_name(cb: CallbackQuery, state: FSMContext, session: As
         comp_service = CompanyService(session=session)
 
         #   Создаем новую локацию
+        city_names = await CityLogger(session).get_cities_name_by_id([data['selected_city']])
         location = await comp_service.create_location(
             company_id=data['company_id'],
-            city=data['selected_city'],
+            city=city_names[0] if city_names else None,
+            city_id=data['selected_city'],
             name_loc=data['new_loc_name'],
             map_url=data['new_loc_address_url'],
             address=data['new_loc_address']
@@ -2,10 +2,11 @@ from aiogram import Router, F
 from aiogram.types import Message
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
+from services.identity_service import UserIdentity
+from services.report_service import ReportService
 from services.role_service import RoleService
 from services.user_service import UserService
 from sqlalchemy.ext.asyncio import AsyncSession
-from utils.database.models import User
 from typing import Optional
 
 router = Router()
@@ -77,11 +78,11 @@ async def process_location_id(message: Message, state: FSMContext, session: Asyn
         await state.clear()
 
 @router.message(F.text == "Статистика")
-async def view_stats(message: Message, session: AsyncSession, user: User):
+async def view_stats(message: Message, session: AsyncSession, identity: Optional[UserIdentity] = None):
     """Просмотр системной статистики"""
     role_service = RoleService(session)
     
-    if not await role_service.has_permission(user, "view_stats"):
+    if identity is None or not await role_service.has_permission(identity.id_tg, "view_stats"):
         await message.answer("⛔ У вас нет прав для просмотра статистики")
         return
     
@@ -95,7 +96,7 @@ async def view_stats(message: Message, session: AsyncSession, user: User):
             f"🏢 Компаний: {stats['total_companies']}\n"
             f"🎫 Купонов: {stats['total_coupons']}\n"
             f"✅ Активировано: {stats['used_coupons']}\n"
-            f"📅 Активных подписок: {stats['active_subscriptions']}"
+            f"🤝 Активных коллабораций: {stats['active_collaborations']}"
         )
         
         await message.answer(response)
@@ -103,14 +104,20 @@ async def view_stats(message: Message, session: AsyncSession, user: User):
         await message.answer(f"❌ Ошибка при получении статистики: {str(e)}")
 
 @router.message(F.text == "Отчет по купонам")
-async def coupons_report(message: Message, session: AsyncSession):
+async def coupons_report(message: Message, session: AsyncSession, identity: Optional[UserIdentity] = None):
     """Генерация отчета по купонам"""
+    role_service = RoleService(session)
+
+    if identity is None or not await role_service.has_permission(identity.id_tg, "view_stats"):
+        await message.answer("⛔ У вас нет прав для просмотра статистики")
+        return
+
     report_service = ReportService(session)
     try:
-        report = await report_service.generate_coupons_report()
-        await message.answer_document(
-            document=report,
-            caption="📊 Отчет по купонам"
-        )
+        async with report_service.generate_coupons_report() as report:
+            await message.answer_document(
+                document=report,
+                caption="📊 Отчет по купонам"
+            )
     except Exception as e:
         await message.answer(f"❌ Ошибка генерации отчета: {str(e)}")
\ No newline at end of file
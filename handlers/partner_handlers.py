@@ -73,9 +73,10 @@ async def select_company(callback: CallbackQuery, state: FSMContext, session: As
         my_company_id=company_id, my_company_name=company.Name_comp,
         location_id=main_location.id_location)
 
+    locations_count = await service.count_locations(company_id)
     company_info = (
         f"🏢 Компания: {company.Name_comp}\n"
-        f"📍 Локаций: {len(company.locations) - 1}"
+        f"📍 Локаций: {locations_count - 1}"
     )
 
     builder = ReplyKeyboardBuilder()
@@ -149,9 +150,10 @@ async def select_location(callback: CallbackQuery, state: FSMContext, session: A
 
         await state.update_data(dict(company_id=company_id, company_name=company.Name_comp,
                                      my_company_id=company_id, my_company_name=company.Name_comp))
+        locations_count = await service.count_locations(company_id)
         company_info = (
             f"🏢 Компания: {company.Name_comp}\n"
-            f"📍 Локаций: {len(company.locations) - 1}"
+            f"📍 Локаций: {locations_count - 1}"
         )
 
         builder = ReplyKeyboardBuilder()
@@ -296,7 +298,7 @@ async def process_field_selection(message: Message, state: FSMContext, session:
 
     elif action == 'category':
         category_service = CategoryService(session)
-        categories = await category_service.get_all_categories()
+        categories = await category_service.get_categories_page()
         selected_category = await comp_service.get_loc_categories_id(
             comp_id=int(data['company_id']),
             id_location=int(data['location_id']),
@@ -332,15 +334,15 @@ async def process_edit_categories(cb: CallbackQuery, state: FSMContext, session:
             selected_category.append(category_id)
 
         await state.update_data(selected_category=selected_category)
-        categories = await category_service.get_all_categories()
-        keyboard = loc_categories_keyboard(categories, selected_category, current_page)
+        categories = await category_service.get_categories_page(current_page)
+        keyboard = loc_categories_keyboard(categories, selected_category)
         await cb.message.edit_reply_markup(reply_markup=keyboard)
 
     elif cb.data.startswith('page_'):
         new_page = int(cb.data.split('_')[1])
         await state.update_data(current_page=new_page)
-        categories = await category_service.get_all_categories()
-        keyboard = loc_categories_keyboard(categories, selected_category, new_page)
+        categories = await category_service.get_categories_page(new_page)
+        keyboard = loc_categories_keyboard(categories, selected_category)
         await cb.message.edit_reply_markup(reply_markup=keyboard)
 
     elif cb.data == 'add_category':
@@ -379,7 +381,7 @@ async def process_edit_categories(cb: CallbackQuery, state: FSMContext, session:
 async def admin_menu_location(message: Message, state: FSMContext, session: AsyncSession):
     data = await state.get_data()
     role_service = RoleService(session)
-    roles_users = await role_service.get_roles_in_loc(
+    roles_users = await role_service.get_roles_in_loc_page(
         location_id=int(data['location_id']),
         role_name='admin',
         company_id=data['company_id'])
@@ -454,14 +456,14 @@ async def process_edit_categories(cb: CallbackQuery, state: FSMContext, session:
             admin_user_id = None
         await state.update_data(admin_user_id=admin_user_id)
 
-        roles_users = await role_service.get_roles_in_loc(
+        roles_users = await role_service.get_roles_in_loc_page(
             location_id=int(data['location_id']),
             role_name='admin',
-            company_id=data['company_id'])
+            company_id=data['company_id'],
+            page=current_page)
 
         keyboard = loc_admin_keyboard(
             roles_users=roles_users,
-            page=current_page,
             admin_user_id=admin_user_id
         )
 
@@ -469,12 +471,13 @@ async def process_edit_categories(cb: CallbackQuery, state: FSMContext, session:
 
     elif cb.data.startswith('page_'):
         new_page = int(cb.data.split('_')[1])
-        roles_users = await role_service.get_roles_in_loc(
+        roles_users = await role_service.get_roles_in_loc_page(
             location_id=int(data['location_id']),
             role_name='admin',
-            company_id=data['company_id'])
-        keyboard = loc_admin_keyboard(roles_users=roles_users, page=new_page)
-        await state.update_data(current_page=new_page)
+            company_id=data['company_id'],
+            page=new_page)
+        keyboard = loc_admin_keyboard(roles_users=roles_users)
+        await state.update_data(current_page=roles_users.page)
         await cb.message.edit_reply_markup(reply_markup=keyboard)
 
 
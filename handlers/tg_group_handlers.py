@@ -48,13 +48,8 @@ async def manage_tg_groups(message: Message, session: AsyncSession, state: FSMCo
         await state.update_data(company_id=company_id, groups=[], page=0)
         return
 
-    # Сохраняем группы и company_id в состояние
-    groups_data = [{
-        'id_tg_group': g.id_tg_group,
-        'group_id': g.group_id,
-        'name': g.name,
-        'is_active': g.is_active
-    } for g in groups]
+    # Сохраняем группы и company_id в состояние: для списка нужны только ID и название
+    groups_data = [[g.id_tg_group, g.name] for g in groups]
 
     await state.update_data(company_id=company_id, groups=groups_data, page=0)
     await show_groups_page(message, state)
@@ -72,10 +67,10 @@ async def show_groups_page(message: Message, state: FSMContext):
 
     # Создаем клавиатуру
     builder = InlineKeyboardBuilder()
-    for group in page_groups:
+    for id_tg_group, name in page_groups:
         builder.button(
-            text=group['name'],
-            callback_data=f"group_{group['id_tg_group']}"
+            text=name,
+            callback_data=f"group_{id_tg_group}"
         )
 
     # Кнопки пагинации
@@ -255,9 +250,10 @@ async def back_to_main(callback: CallbackQuery, state: FSMContext, session: Asyn
         return
 
     # Формируем сообщение с меню компании
+    locations_count = await comp_service.count_locations(company_id)
     company_info = (
         f"🏢 Компания: {company.Name_comp}\n"
-        f"📍 Локаций: {len(company.locations) - 1}"
+        f"📍 Локаций: {locations_count - 1}"
     )
 
     builder = ReplyKeyboardBuilder()
@@ -1,25 +1,61 @@
 import asyncio
-from utils.bot_obj import bot, dp
-from handlers import (common_handlers, owner_handlers, partner_handlers,
-                      admin_handlers, client_handlers, command_handler, edit_company_handler,
-                      new_location_handler, collaboration_handler, collab_coupon_handler, tg_group_handlers,
-                      my_collabs_handler, collab_req_handler)
-from middlewares import DatabaseMiddleware
-from utils.logger import setup_logger
+
 
 async def main():
     """
     Главная функция запуска бота
     """
+    # Приложение импортируется только при запуске: дочерние процессы пула QR
+    # (spawn) заново импортируют main.py как __mp_main__ и должны получить
+    # лишь этот модуль, а не бота, пул БД и все обработчики
+    from aiogram.filters import ExceptionTypeFilter
+
+    from utils.bot_obj import bot, dp, redis, storage
+    from handlers import (common_handlers, owner_handlers, partner_handlers,
+                          admin_handlers, client_handlers, command_handler, edit_company_handler,
+                          new_location_handler, collaboration_handler, collab_coupon_handler, tg_group_handlers,
+                          my_collabs_handler, collab_req_handler)
+    from middlewares import DatabaseMiddleware, FSMStatsMiddleware, RoleMiddleware, UpdateStreamMiddleware
+    from services.action_log_retention import action_log_retention
+    from services.audit_log import audit_log
+    from services.broadcast_service import broadcaster
+    from services.company_service import backfill_location_cities
+    from services.coupon_pool_service import coupon_pool_refiller
+    from services.coupon_service import backfill_coupon_clients
+    from services.qr_service import qr_service
+    from services.reference_cache import reference_cache
+    from services.report_service import stats_reconciler
+    from utils.database import close_db
+    from utils.fsm_storage import drop_on_queue_full
+    from utils.keyed_lock import QueueFull
+    from utils.config import config
+    from utils.coupon_codes import check_secret
+    from utils.logger import setup_logger
+    from utils.outbox import outbox
+    from utils.update_stream import run_stream_worker, update_stream_from_config
+    from utils.webhook import run_webhook
+
     # 1. Настройка системы логирования
     logger = setup_logger()
     logger.info("Starting bot")
+    if config.PROCESS_ROLE != 'ingress':
+        check_secret()  # Без ключа кодов купонов воркер не запускается
     
     # 2. Инициализация базы данных
     logger.info("Database initialized")
     
     # 3. Регистрация middleware
     dp.update.middleware(DatabaseMiddleware())  # Обеспечивает сессию БД
+    if config.PROCESS_ROLE == 'ingress':
+        # Приемник только раскладывает обновления по партициям для воркеров
+        dp.update.outer_middleware(UpdateStreamMiddleware(update_stream_from_config(redis)))
+    else:
+        dp.update.outer_middleware(FSMStatsMiddleware(storage))  # Статистика буфера FSM
+        # Идентификация пользователя из кэша и проверка прав обработчика
+        dp.message.middleware(RoleMiddleware())
+        dp.callback_query.middleware(RoleMiddleware())
+    # Обновления сверх очереди пользователя отбрасываются без трассировки
+    dp.errors.register(drop_on_queue_full, ExceptionTypeFilter(QueueFull))
 
     logger.info("Middlewares registered")
     
@@ -39,11 +75,42 @@ async def main():
     dp.include_router(tg_group_handlers.router)
     
     logger.info("Routers registered")
+
+    # 5. Фоновые задачи (приемнику не нужны: он не обрабатывает обновления)
+    if config.PROCESS_ROLE != 'ingress':
+        dp.startup.register(reference_cache.load_all)  # Справочники категорий и городов
+        dp.startup.register(backfill_location_cities)  # city_id локаций, созданных до справочника
+        dp.startup.register(backfill_coupon_clients)  # client_id купонов, выданных по Telegram ID
+        dp.startup.register(coupon_pool_refiller.start)  # Пополнение пула купонов
+        dp.shutdown.register(coupon_pool_refiller.stop)
+        dp.startup.register(outbox.start)  # Очередь исходящих сообщений
+        dp.shutdown.register(outbox.stop)
+        dp.startup.register(broadcaster.start)  # Продолжение прерванных рассылок
+        dp.shutdown.register(broadcaster.stop)
+        dp.startup.register(audit_log.start)  # Запись журнала действий пачками
+        dp.shutdown.register(audit_log.stop)
+        dp.startup.register(action_log_retention.start)  # Удаление старых записей журнала порциями
+        dp.shutdown.register(action_log_retention.stop)
+        dp.startup.register(stats_reconciler.start)  # Сверка счетчиков статистики
+        dp.shutdown.register(stats_reconciler.stop)
+        dp.startup.register(qr_service.start)  # Пул генерации QR-кодов
+        dp.shutdown.register(qr_service.stop)
     
-    # 5. Запуск бота
-    await bot.delete_webhook(drop_pending_updates=True)  # Очистка очереди обновлений
-    logger.info("Bot is ready to start polling")
-    await dp.start_polling(bot)  # Основной цикл обработки сообщений
+    # 6. Запуск бота
+    try:
+        if config.PROCESS_ROLE == 'worker':
+            logger.info("Bot is ready to consume the update stream")
+            await run_stream_worker(bot, dp, redis)  # Обработка своих партиций
+        elif config.WEBHOOK_ENABLED:
+            logger.info("Bot is ready to receive webhooks")
+            await run_webhook(bot, dp)  # Прием обновлений через aiohttp-сервер
+        else:
+            # Очистка очереди обновлений
+            await bot.delete_webhook(drop_pending_updates=config.DROP_PENDING_UPDATES)
+            logger.info("Bot is ready to start polling")
+            await dp.start_polling(bot)  # Основной цикл обработки сообщений
+    finally:
+        await close_db()  # Закрытие соединений пула
 
 if __name__ == '__main__':
     # Запуск асинхронного event loop
@@ -1,6 +1,8 @@
 # middlewares/__init__.py
 from .database_middleware import DatabaseMiddleware
+from .fsm_stats_middleware import FSMStatsMiddleware
 from .role_middleware import RoleMiddleware
 from .subscription_middleware import SubscriptionMiddleware
+from .update_stream_middleware import UpdateStreamMiddleware
 
-__all__ = ['DatabaseMiddleware', 'RoleMiddleware', 'SubscriptionMiddleware']
\ No newline at end of file
+__all__ = ['DatabaseMiddleware', 'FSMStatsMiddleware', 'RoleMiddleware', 'SubscriptionMiddleware', 'UpdateStreamMiddleware']
\ No newline at end of file
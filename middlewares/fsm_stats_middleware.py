@@ -0,0 +1,25 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+from utils.fsm_storage import BufferedRedisStorage
+
+
+class FSMStatsMiddleware(BaseMiddleware):
+    """
+    Middleware, помечающее буфер FSM типом обновления, чтобы
+    хранилище считало экономию запросов и байтов по типам обновлений.
+    Регистрируется как outer middleware на dp.update
+    """
+    def __init__(self, storage: BufferedRedisStorage):
+        self.storage = storage
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        self.storage.label_current(event.event_type)
+        return await handler(event, data)
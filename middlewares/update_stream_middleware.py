@@ -0,0 +1,34 @@
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.middlewares.user_context import EVENT_CONTEXT_KEY
+from aiogram.types import Update
+
+from utils.update_stream import UpdateStream
+
+
+class UpdateStreamMiddleware(BaseMiddleware):
+    """
+    Middleware процесса-приемника: вместо обработки кладет обновление
+    в партицию Redis Streams по chat_id (или ID пользователя).
+    Регистрируется как outer middleware на dp.update
+    """
+    def __init__(self, stream: UpdateStream):
+        self.stream = stream
+
+    async def __call__(
+        self,
+        handler: Callable[[Update, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        context = data.get(EVENT_CONTEXT_KEY)
+        key = 0
+        if context is not None and context.chat is not None:
+            key = context.chat.id
+        elif context is not None and context.user is not None:
+            key = context.user.id
+
+        await self.stream.publish(event, key)
+        # Обработчики не вызываются: обновление обработает воркер
+        return None
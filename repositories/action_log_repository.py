@@ -1,8 +1,22 @@
+from collections import Counter
+from typing import Optional
+
+from sqlalchemy.dialects.mysql import insert as mysql_insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from utils.database.models import ActionLog
+from sqlalchemy import select, func, insert, delete
+from utils.config import config
+from utils.database.models import ActionLog, ActionLogRollup
 from datetime import datetime, timedelta
 
+
+def _hour_start(moment: datetime) -> datetime:
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def _day_start(moment: datetime) -> datetime:
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
 class ActionLogRepository:
     """Репозиторий для работы с логами действий"""
     def __init__(self, session: AsyncSession):
@@ -17,10 +31,46 @@ class ActionLogRepository:
             ActionLog: Созданная запись лога
         """
         log = ActionLog(**log_data)
+        if log.timestamp is None:
+            log.timestamp = datetime.now()
         self.session.add(log)
+        await self._add_to_rollups([log_data | {'timestamp': log.timestamp}])
         await self.session.commit()
         return log
     
+    async def create_action_logs(self, rows: list[dict]) -> None:
+        """
+        Записывает пачку записей лога одним многострочным INSERT
+        и обновляет сводки в той же транзакции
+        Args:
+            rows: Данные записей (user_id, action_type, entity_id, timestamp)
+        """
+        await self.session.execute(insert(ActionLog), rows)
+        await self._add_to_rollups(rows)
+        await self.session.commit()
+
+    async def _add_to_rollups(self, rows: list[dict]) -> None:
+        """
+        Прибавляет записи к часовым и дневным сводкам. Пачка сначала
+        сворачивается в памяти, поэтому на сводки приходится не больше
+        двух строк на тип действия и интервал; счетчик увеличивается
+        атомарно (ON DUPLICATE KEY UPDATE), без чтения текущего значения
+        """
+        buckets = Counter()
+        for row in rows:
+            moment = row.get('timestamp') or datetime.now()
+            buckets[(row['action_type'], 'hour', _hour_start(moment))] += 1
+            buckets[(row['action_type'], 'day', _day_start(moment))] += 1
+
+        # Один порядок ключей во всех процессах, чтобы пачки не блокировали друг друга
+        values = [
+            {'action_type': action_type, 'period': period, 'bucket_start': bucket_start, 'count': count}
+            for (action_type, period, bucket_start), count in sorted(buckets.items())
+        ]
+        stmt = mysql_insert(ActionLogRollup).values(values)
+        stmt = stmt.on_duplicate_key_update(count=ActionLogRollup.count + stmt.inserted.count)
+        await self.session.execute(stmt)
+    
     async def get_logs_by_user(self, user_id: int, days: int = 30) -> list[ActionLog]:
         """
         Получает логи действий пользователя
@@ -50,14 +100,86 @@ class ActionLogRepository:
         result = await self.session.execute(stmt)
         return result.scalars().all()
     
-    async def get_action_count(self, action_type: str) -> int:
+    async def get_action_count(self, action_type: str, since: Optional[datetime] = None) -> int:
         """
-        Получает количество действий определенного типа
+        Получает количество действий определенного типа из сводок,
+        без подсчета по журналу. Полные дни берутся из дневных сводок,
+        неполный первый день - из часовых, точность - до часа. Часовые
+        сводки хранятся ACTION_LOG_HOURLY_ROLLUP_DAYS дней, поэтому более
+        ранний since округляется вниз до начала дня и первый день
+        считается целиком по дневной сводке
         Args:
             action_type: Тип действия
+            since: Считать действия начиная с этого момента (по умолчанию - за все время)
         Returns:
             int: Количество действий
         """
-        stmt = select(func.count()).where(ActionLog.action_type == action_type)
-        result = await self.session.scalar(stmt)
-        return result or 0
\ No newline at end of file
+        if since is None:
+            stmt = select(func.sum(ActionLogRollup.count)).where(
+                (ActionLogRollup.action_type == action_type) &
+                (ActionLogRollup.period == 'day')
+            )
+            return int(await self.session.scalar(stmt) or 0)
+
+        hourly_horizon = datetime.now() - timedelta(days=config.ACTION_LOG_HOURLY_ROLLUP_DAYS)
+        if _hour_start(since) < hourly_horizon:
+            stmt = select(func.sum(ActionLogRollup.count)).where(
+                (ActionLogRollup.action_type == action_type) &
+                (ActionLogRollup.period == 'day') &
+                (ActionLogRollup.bucket_start >= _day_start(since))
+            )
+            return int(await self.session.scalar(stmt) or 0)
+
+        next_day = _day_start(since) + timedelta(days=1)
+        days = select(func.sum(ActionLogRollup.count)).where(
+            (ActionLogRollup.action_type == action_type) &
+            (ActionLogRollup.period == 'day') &
+            (ActionLogRollup.bucket_start >= next_day)
+        )
+        hours = select(func.sum(ActionLogRollup.count)).where(
+            (ActionLogRollup.action_type == action_type) &
+            (ActionLogRollup.period == 'hour') &
+            (ActionLogRollup.bucket_start >= _hour_start(since)) &
+            (ActionLogRollup.bucket_start < next_day)
+        )
+        return int(await self.session.scalar(days) or 0) + int(await self.session.scalar(hours) or 0)
+
+    async def delete_logs_before(self, cutoff: datetime, limit: int) -> int:
+        """
+        Удаляет одну порцию записей журнала старше cutoff и сразу фиксирует
+        транзакцию, чтобы блокировки держались только на время порции.
+        Сводки не затрагиваются
+        Args:
+            cutoff: Граница срока хранения
+            limit: Размер порции
+        Returns:
+            int: Число удаленных записей
+        """
+        ids = (await self.session.scalars(
+            select(ActionLog.id)
+            .where(ActionLog.timestamp < cutoff)
+            .order_by(ActionLog.timestamp)
+            .limit(limit)
+        )).all()
+        if not ids:
+            return 0
+        await self.session.execute(delete(ActionLog).where(ActionLog.id.in_(ids)))
+        await self.session.commit()
+        return len(ids)
+
+    async def delete_hourly_rollups_before(self, cutoff: datetime) -> int:
+        """
+        Удаляет часовые сводки старше cutoff; дневные сводки хранятся всегда
+        Args:
+            cutoff: Граница срока хранения часовых сводок
+        Returns:
+            int: Число удаленных сводок
+        """
+        result = await self.session.execute(
+            delete(ActionLogRollup).where(
+                (ActionLogRollup.period == 'hour') &
+                (ActionLogRollup.bucket_start < cutoff)
+            )
+        )
+        await self.session.commit()
+        return result.rowcount
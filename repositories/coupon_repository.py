@@ -1,7 +1,10 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete
-from utils.database.models import Coupon
-from datetime import date
+from sqlalchemy import select, update, delete, insert, func
+from sqlalchemy.orm.interfaces import ORMOption
+from utils.database.models import Coupon, CouponType
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Optional, Sequence
 
 class CouponRepository:
     """Репозиторий для работы с купонами"""
@@ -32,15 +35,16 @@ class CouponRepository:
         """
         return await self.session.get(Coupon, coupon_id)
     
-    async def get_coupon_by_code(self, code: str) -> Coupon:
+    async def get_coupon_by_code(self, code: str, options: Sequence[ORMOption] = ()) -> Coupon:
         """
         Получает купон по коду
         Args:
             code: Код купона
+            options: Опции загрузки связей (joinedload и т.п.)
         Returns:
             Coupon: Объект купона
         """
-        stmt = select(Coupon).where(Coupon.code == code)
+        stmt = select(Coupon).options(*options).where(Coupon.code == code)
         result = await self.session.execute(stmt)
         return result.scalar_one_or_none()
     
@@ -90,6 +94,183 @@ class CouponRepository:
         await self.session.commit()
         return result.scalar_one()
     
+    async def redeem_coupon(
+            self,
+            code: str,
+            redeemed_by: int,
+            amount: Decimal,
+            active_status_id: int,
+            used_status_id: int
+    ) -> bool:
+        """
+        Атомарно погашает купон условным UPDATE и учитывает использование
+        в лимите типа купона. Оба изменения выполняются в одной транзакции:
+        при исчерпанном лимите погашение откатывается.
+        Args:
+            code: Код купона
+            redeemed_by: ID пользователя, погасившего купон
+            amount: Сумма заказа
+            active_status_id: ID статуса "активен"
+            used_status_id: ID статуса "использован"
+        Returns:
+            bool: True если купон погашен этим вызовом
+        """
+        today = date.today()
+        coupon_stmt = (
+            update(Coupon)
+            .where(
+                (Coupon.code == code) &
+                (Coupon.status_id == active_status_id) &
+                (Coupon.end_date >= today)
+            )
+            .values(
+                used_by=redeemed_by,
+                used_at=datetime.now(),
+                order_amount=amount,
+                status_id=used_status_id
+            )
+            .execution_options(synchronize_session=False)
+        )
+        result = await self.session.execute(coupon_stmt)
+        if result.rowcount != 1:
+            await self.session.rollback()
+            return False
+
+        type_id = select(Coupon.coupon_type_id).where(Coupon.code == code).scalar_subquery()
+        limit_stmt = (
+            update(CouponType)
+            .where(
+                (CouponType.id_coupon_type == type_id) &
+                (
+                    (CouponType.usage_limit.is_(None)) |
+                    (CouponType.usage_limit == 0) |
+                    (CouponType.used_count < CouponType.usage_limit)
+                )
+            )
+            .values(used_count=CouponType.used_count + 1)
+            .execution_options(synchronize_session=False)
+        )
+        result = await self.session.execute(limit_stmt)
+        if result.rowcount != 1:
+            await self.session.rollback()
+            raise ValueError("Лимит использования купонов исчерпан")
+
+        await self.session.commit()
+        return True
+
+    async def expire_coupon(self, code: str, active_status_id: int, expired_status_id: int) -> None:
+        """
+        Помечает просроченный активный купон как истекший
+        Args:
+            code: Код купона
+            active_status_id: ID статуса "активен"
+            expired_status_id: ID статуса "истек"
+        """
+        stmt = (
+            update(Coupon)
+            .where(
+                (Coupon.code == code) &
+                (Coupon.status_id == active_status_id) &
+                (Coupon.end_date < date.today())
+            )
+            .values(status_id=expired_status_id)
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.execute(stmt)
+        await self.session.commit()
+
+    async def insert_pool_batch(self, rows: list[dict]) -> int:
+        """
+        Вставляет пачку заранее сгенерированных купонов одним многострочным INSERT
+        Args:
+            rows: Данные купонов
+        Returns:
+            int: Количество вставленных купонов
+        """
+        if not rows:
+            return 0
+        stmt = insert(Coupon).values(rows)
+        result = await self.session.execute(stmt)
+        await self.session.commit()
+        return result.rowcount
+
+    async def claim_pooled_coupon(
+            self,
+            coupon_type_id: int,
+            client_id: int,
+            issuer_id: int,
+            days_for_used: int,
+            reserved_status_id: int,
+            active_status_id: int
+    ) -> Optional[Coupon]:
+        """
+        Закрепляет за клиентом один купон из пула. Купон выбирается
+        SELECT ... FOR UPDATE SKIP LOCKED (параллельные выдачи берут разные
+        купоны и не ждут друг друга) и обновляется по ID
+        Args:
+            coupon_type_id: ID типа купона
+            client_id: ID клиента
+            issuer_id: ID выдавшего купон
+            days_for_used: Срок действия купона в днях
+            reserved_status_id: ID статуса "в пуле"
+            active_status_id: ID статуса "активен"
+        Returns:
+            Optional[Coupon]: Выданный купон или None, если пул пуст
+        """
+        today = date.today()
+        coupon_id = await self.session.scalar(
+            select(Coupon.id_coupon)
+            .where(
+                (Coupon.coupon_type_id == coupon_type_id) &
+                (Coupon.status_id == reserved_status_id)
+            )
+            .order_by(Coupon.id_coupon)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        if coupon_id is None:
+            await self.session.rollback()
+            return None
+
+        stmt = (
+            update(Coupon)
+            .where(
+                (Coupon.id_coupon == coupon_id) &
+                (Coupon.status_id == reserved_status_id)
+            )
+            .values(
+                client_id=client_id,
+                issued_by=issuer_id,
+                start_date=today,
+                end_date=today + timedelta(days=days_for_used),
+                status_id=active_status_id
+            )
+            .execution_options(synchronize_session=False)
+        )
+        result = await self.session.execute(stmt)
+        if result.rowcount != 1:
+            await self.session.rollback()
+            return None
+        await self.session.commit()
+
+        return await self.session.scalar(select(Coupon).where(Coupon.id_coupon == coupon_id))
+
+    async def count_pooled_by_type(self, reserved_status_id: int) -> dict[int, int]:
+        """
+        Считает купоны в пуле по типам одним запросом
+        Args:
+            reserved_status_id: ID статуса "в пуле"
+        Returns:
+            dict[int, int]: ID типа купона -> количество купонов в пуле
+        """
+        stmt = (
+            select(Coupon.coupon_type_id, func.count())
+            .where(Coupon.status_id == reserved_status_id)
+            .group_by(Coupon.coupon_type_id)
+        )
+        result = await self.session.execute(stmt)
+        return dict(result.all())
+
     async def delete_coupon(self, coupon_id: int) -> bool:
         """
         Удаляет купон
@@ -85,4 +85,28 @@ class CouponTypeRepository:
         stmt = delete(CouponType).where(CouponType.id_coupon_type == type_id)
         result = await self.session.execute(stmt)
         await self.session.commit()
-        return result.rowcount > 0
\ No newline at end of file
+        return result.rowcount > 0
+
+    async def allocate_code_range(self, type_id: int, count: int) -> range:
+        """
+        Резервирует диапазон порядковых номеров кодов купонов типа.
+        Атомарный UPDATE блокирует строку типа до конца транзакции,
+        поэтому параллельные вызовы получают непересекающиеся диапазоны
+        Args:
+            type_id: ID типа купона
+            count: Количество номеров
+        Returns:
+            range: Зарезервированные номера
+        """
+        stmt = (
+            update(CouponType)
+            .where(CouponType.id_coupon_type == type_id)
+            .values(code_seq=CouponType.code_seq + count)
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.execute(stmt)
+        end = await self.session.scalar(
+            select(CouponType.code_seq).where(CouponType.id_coupon_type == type_id)
+        )
+        await self.session.commit()
+        return range(end - count, end)
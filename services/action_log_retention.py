@@ -0,0 +1,101 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from repositories.action_log_repository import ActionLogRepository
+from utils.bot_obj import redis
+from utils.config import config
+from utils.database.db_session import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class ActionLogRetention:
+    """
+    Фоновое удаление записей журнала действий старше срока хранения.
+
+    Записи удаляются порциями по ACTION_LOG_RETENTION_CHUNK с отдельным
+    commit и паузой между порциями, поэтому удаление не держит долгих
+    блокировок и не мешает записи журнала. Счетчики действий хранятся
+    в сводках и после удаления записей не меняются.
+    В каждом интервале удаление выполняет только один процесс
+    """
+    def __init__(
+            self,
+            interval: float,
+            retention_days: int,
+            hourly_rollup_days: int,
+            chunk_size: int,
+            chunk_pause: float
+    ):
+        self.interval = interval
+        self.retention_days = retention_days
+        self.hourly_rollup_days = hourly_rollup_days
+        self.chunk_size = chunk_size
+        self.chunk_pause = chunk_pause
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _lock_key() -> str:
+        return f"{config.REDIS_PREFIX}:action_log:retention_lock"
+
+    async def purge(self) -> int:
+        """
+        Удаляет устаревшие записи журнала и часовые сводки
+        Returns:
+            int: Число удаленных записей журнала
+        """
+        now = datetime.now()
+        cutoff = now - timedelta(days=self.retention_days)
+        deleted = 0
+        async with AsyncSessionLocal() as session:
+            repo = ActionLogRepository(session)
+            while True:
+                chunk = await repo.delete_logs_before(cutoff, self.chunk_size)
+                deleted += chunk
+                if chunk < self.chunk_size:
+                    break
+                await asyncio.sleep(self.chunk_pause)
+            rollups = await repo.delete_hourly_rollups_before(now - timedelta(days=self.hourly_rollup_days))
+
+        if deleted or rollups:
+            logger.info(f"Журнал действий: удалено {deleted} записей старше {self.retention_days} дн., "
+                        f"{rollups} часовых сводок")
+        return deleted
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run(), name="action-log-retention")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if await redis.set(self._lock_key(), 1, nx=True, ex=max(1, int(self.interval * 0.9))):
+                    await self.purge()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка удаления устаревших записей журнала действий: {e}")
+
+            await asyncio.sleep(self.interval)
+
+
+action_log_retention = ActionLogRetention(
+    interval=config.ACTION_LOG_RETENTION_INTERVAL,
+    retention_days=config.ACTION_LOG_RETENTION_DAYS,
+    hourly_rollup_days=config.ACTION_LOG_HOURLY_ROLLUP_DAYS,
+    chunk_size=config.ACTION_LOG_RETENTION_CHUNK,
+    chunk_pause=config.ACTION_LOG_RETENTION_PAUSE,
+)
@@ -1,8 +1,9 @@
 from typing import List
 
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from utils.database.models import City
+from services.reference_cache import reference_cache, RefItem
+from utils.pagination import Page
 import logging
 
 logger = logging.getLogger(__name__)
@@ -26,26 +27,31 @@ class CityLogger:
 
             self.session.add(log)
             await self.session.commit()
+            await reference_cache.bump('cities')
             return log
         except Exception as e:
             logger.error(f"Ошибка записи действия: {e}")
             await self.session.rollback()
             return None
 
-    async def get_all_cities(self) -> List[City] | None:
+    async def get_all_cities(self) -> tuple[RefItem, ...]:
         """
-        Логирует действие пользователя
+        Получает все города из кэша справочников
         Returns:
-            City: Созданная запись лога
+            tuple[RefItem, ...]: Города, отсортированные по названию
         """
-        try:
-            stmt = select(City)
-            result = await self.session.execute(stmt)
-            return result.scalars().all()
+        return await reference_cache.items('cities')
 
-        except Exception as e:
-            logger.error(f"Ошибка записи действия: {e}")
-            return None
+    async def get_cities_page(self, page: int = 0, per_page: int = 10) -> Page[RefItem]:
+        """
+        Получает одну страницу городов из кэша справочников
+        Args:
+            page: Номер страницы
+            per_page: Городов на странице
+        Returns:
+            Page[RefItem]: Страница городов
+        """
+        return await reference_cache.page('cities', page, per_page)
 
     async def get_cities_name_by_id(self, city_ids: List[int]) -> List[str]:
         """
@@ -57,11 +63,5 @@ class CityLogger:
         Returns:
             List[str]: Список названий городов
         """
-        try:
-            stmt = select(City).where(City.id.in_(city_ids))
-            result = await self.session.execute(stmt)
-            return [city.name for city in result.scalars().all()]
-        except Exception as e:
-            logger.error(f"Ошибка получения названий городов: {e}")
-            return []
-
+        names = await reference_cache.names_by_id('cities')
+        return [names[city_id] for city_id in city_ids if city_id in names]
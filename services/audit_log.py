@@ -0,0 +1,165 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime
+from typing import Optional
+
+from repositories.action_log_repository import ActionLogRepository
+from utils.config import config
+from utils.database.db_session import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+class AuditLog:
+    """
+    Асинхронная запись журнала действий (ACTION_LOGS).
+
+    Обработчик только ставит запись в очередь в памяти и не ждет БД.
+    Фоновая задача пишет записи пачками одним INSERT: как только набралось
+    AUDIT_LOG_BATCH_SIZE записей или прошло AUDIT_LOG_FLUSH_INTERVAL секунд
+    с первой записи пачки. Когда очередь заполнена, log() ждет свободного
+    места не дольше AUDIT_LOG_PUT_TIMEOUT и затем отбрасывает запись.
+    При остановке бота очередь дописывается в БД
+    """
+    def __init__(
+            self,
+            max_queue: int,
+            batch_size: int,
+            flush_interval: float,
+            put_timeout: float,
+            max_attempts: int = 3
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.max_attempts = max_attempts
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+        self._batch: list[dict] = []
+        self._writing: Optional[asyncio.Future] = None
+        self._flush_latencies: deque[float] = deque(maxlen=1000)
+        self.written = 0
+        self.dropped = 0
+        self.lost = 0
+        self.batches = 0
+
+    async def log(self, user_id: Optional[int], action_type: str, entity_id: Optional[int] = None) -> None:
+        """
+        Ставит запись журнала в очередь
+        Args:
+            user_id: ID пользователя
+            action_type: Тип действия
+            entity_id: ID сущности действия
+        """
+        record = {
+            'user_id': user_id,
+            'action_type': action_type,
+            'entity_id': entity_id,
+            'timestamp': datetime.now(),
+        }
+        try:
+            self._queue.put_nowait(record)
+            return
+        except asyncio.QueueFull:
+            pass
+        # Очередь заполнена: притормаживаем обработчик, пока пачка не записана
+        try:
+            await asyncio.wait_for(self._queue.put(record), timeout=self.put_timeout)
+        except asyncio.TimeoutError:
+            self.dropped += 1
+            logger.warning(f"Очередь журнала действий переполнена, запись {action_type} отброшена")
+
+    async def _collect(self) -> None:
+        # Записи складываются в self._batch сразу, чтобы при остановке
+        # не потерять уже извлеченные из очереди
+        self._batch.append(await self._queue.get())
+        deadline = time.monotonic() + self.flush_interval
+        while len(self._batch) < self.batch_size:
+            if not self._queue.empty():
+                self._batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                self._batch.append(await asyncio.wait_for(self._queue.get(), timeout=timeout))
+            except asyncio.TimeoutError:
+                break
+
+    async def _write(self, batch: list[dict]) -> None:
+        started = time.monotonic()
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                async with AsyncSessionLocal() as session:
+                    await ActionLogRepository(session).create_action_logs(batch)
+                break
+            except Exception as e:
+                if attempt == self.max_attempts:
+                    self.lost += len(batch)
+                    logger.error(f"Не удалось записать {len(batch)} записей журнала действий: {e}")
+                    return
+                await asyncio.sleep(min(2 ** attempt, 10))
+
+        self.written += len(batch)
+        self.batches += 1
+        self._flush_latencies.append(time.monotonic() - started)
+
+    async def _run(self) -> None:
+        while True:
+            await self._collect()
+            batch, self._batch = self._batch, []
+            # Остановка не прерывает начатую запись пачки: stop() дождется ее
+            self._writing = asyncio.ensure_future(self._write(batch))
+            await asyncio.shield(self._writing)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="audit-log")
+
+    async def stop(self) -> None:
+        """Останавливает фоновую запись и дописывает очередь в БД"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._writing is not None:
+            await self._writing
+            self._writing = None
+
+        while self._batch or not self._queue.empty():
+            while len(self._batch) < self.batch_size and not self._queue.empty():
+                self._batch.append(self._queue.get_nowait())
+            batch, self._batch = self._batch, []
+            await self._write(batch)
+        logger.info(f"Audit log stats: {self.stats()}")
+
+    def stats(self) -> dict:
+        """Глубина очереди, счетчики записи и время записи пачки, сек"""
+        latencies = sorted(self._flush_latencies)
+
+        def percentile(p: float) -> float:
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 4) if latencies else 0.0
+
+        return {
+            'queue_depth': self._queue.qsize(),
+            'written': self.written,
+            'batches': self.batches,
+            'dropped': self.dropped,
+            'lost': self.lost,
+            'flush_p50': percentile(0.5),
+            'flush_p95': percentile(0.95),
+            'flush_max': round(latencies[-1], 4) if latencies else 0.0,
+        }
+
+
+audit_log = AuditLog(
+    max_queue=config.AUDIT_LOG_MAX_QUEUE,
+    batch_size=config.AUDIT_LOG_BATCH_SIZE,
+    flush_interval=config.AUDIT_LOG_FLUSH_INTERVAL,
+    put_timeout=config.AUDIT_LOG_PUT_TIMEOUT,
+)
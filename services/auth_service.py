@@ -1,7 +1,9 @@
 from typing import Tuple
 
 from repositories.user_repository import UserRepository
+from services.identity_service import IdentityService
 from utils.database.models import User
+from utils.stats_counters import USERS, stats_counters
 from datetime import datetime
 
 class AuthService:
@@ -30,6 +32,9 @@ class AuthService:
                 'user_name': username,
                 'role': 'client'
             })
+            # Сбрасываем закэшированное "пользователь не найден"
+            await IdentityService.invalidate(tg_id)
+            await stats_counters.incr(USERS)
         return user, bool(user)
     
     async def update_user_profile(self, user_id: int, update_data: dict) -> User:
@@ -0,0 +1,272 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from redis.exceptions import WatchError
+from sqlalchemy import exists, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from utils.bot_obj import bot, redis
+from utils.config import config
+from utils.database.db_session import AsyncSessionLocal
+from utils.database.models import Company, Coupon, CouponType, User
+from utils.rate_limiter import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastService:
+    """Сервис выборки получателей рассылок"""
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def company_clients_chunk(
+            self,
+            company_id: int,
+            after_user_id: int,
+            limit: int
+    ) -> list[tuple[int, int]]:
+        """
+        Очередная пачка клиентов, у которых есть купоны компании.
+        Keyset-пагинация по USERS.id: каждая пачка - короткий запрос по индексу.
+        Coupon.client_id хранит внутренний ID; купоны, выданные раньше по
+        Telegram ID, переводит backfill_coupon_clients, который запускается
+        при старте раньше возобновления рассылок
+        Args:
+            company_id: ID компании
+            after_user_id: ID пользователя, после которого начинать
+            limit: Размер пачки
+        Returns:
+            list[tuple[int, int]]: Пары (ID пользователя, Telegram ID) по возрастанию ID
+        """
+        has_coupon = exists().where(
+            (Coupon.client_id == User.id) &
+            (Coupon.coupon_type_id == CouponType.id_coupon_type) &
+            (CouponType.company_id == company_id)
+        )
+        stmt = (
+            select(User.id, User.id_tg)
+            .where((User.id > after_user_id) & has_coupon)
+            .order_by(User.id)
+            .limit(limit)
+        )
+        return [tuple(row) for row in (await self.session.execute(stmt)).all()]
+
+    async def collab_announcement(self, coupon_type_id: int) -> Optional[tuple[int, str]]:
+        """
+        Текст объявления о новой коллаборации
+        Args:
+            coupon_type_id: ID подтвержденного типа купона
+        Returns:
+            Optional[tuple[int, str]]: ID компании и текст, или None если тип не найден
+        """
+        coupon_type = await self.session.get(CouponType, coupon_type_id)
+        if coupon_type is None:
+            return None
+        company = await self.session.get(Company, coupon_type.company_id)
+        agent = await self.session.get(Company, coupon_type.company_agent_id)
+        text = (
+            f"🤝 <b>Новая коллаборация!</b>\n\n"
+            f"🏢 <b>{company.Name_comp}</b> теперь выдает купоны вместе с "
+            f"<b>{agent.Name_comp if agent else '—'}</b>\n"
+            f"💸 <b>Скидка:</b> {coupon_type.discount_percent}%\n"
+            f"📅 <b>До:</b> {coupon_type.end_date.strftime('%d.%m.%Y')}"
+        )
+        return coupon_type.company_id, text
+
+
+class Broadcaster:
+    """
+    Рассылка сообщений клиентам компании.
+
+    Получатели читаются пачками по BROADCAST_CHUNK_SIZE (keyset по USERS.id),
+    в памяти одновременно только одна пачка. Отправка идет не более чем
+    BROADCAST_CONCURRENCY сообщениями параллельно со своим ограничителем
+    BROADCAST_RATE (ниже общего лимита бота, чтобы оставить запас для
+    ответов пользователям). После каждой пачки прогресс сохраняется
+    в Redis; рассылка, прерванная падением процесса, продолжается при
+    следующем запуске с последней сохраненной пачки. Каждую рассылку
+    ведет один процесс, пока продлевает аренду в Redis.
+    """
+    def __init__(self, bot: Bot, chunk_size: int, concurrency: int, rate: float, lease_ttl: int):
+        self.bot = bot
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self.limiter = TokenBucket(rate, max(1.0, rate))
+        self.lease_ttl = lease_ttl
+        self.owner = uuid.uuid4().hex
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    def _key(broadcast_id: str) -> str:
+        return f"{config.REDIS_PREFIX}:broadcast:{broadcast_id}"
+
+    @staticmethod
+    def _active_key() -> str:
+        return f"{config.REDIS_PREFIX}:broadcasts:active"
+
+    async def start_collab_broadcast(self, session: AsyncSession, coupon_type_id: int) -> Optional[str]:
+        """
+        Запускает рассылку о подтвержденной коллаборации клиентам компании
+        Args:
+            session: Сессия БД
+            coupon_type_id: ID типа купона
+        Returns:
+            Optional[str]: ID рассылки или None, если тип купона не найден
+        """
+        announcement = await BroadcastService(session).collab_announcement(coupon_type_id)
+        if announcement is None:
+            return None
+        company_id, text = announcement
+
+        broadcast_id = f"collab-{coupon_type_id}"
+        key = self._key(broadcast_id)
+        # Задание записывается целиком одной транзакцией: упавший между
+        # командами процесс не оставит рассылку без текста или вне списка активных
+        try:
+            async with redis.pipeline(transaction=True) as pipe:
+                await pipe.watch(key)
+                if await pipe.exists(key):
+                    # Рассылка об этой коллаборации уже была
+                    return broadcast_id
+                pipe.multi()
+                pipe.hset(key, mapping={
+                    'company_id': company_id,
+                    'text': text,
+                    'last_user_id': 0,
+                    'sent': 0,
+                    'failed': 0,
+                    'started_at': int(time.time()),
+                    'status': 'running',
+                })
+                pipe.sadd(self._active_key(), broadcast_id)
+                await pipe.execute()
+        except WatchError:
+            # Ту же рассылку одновременно создал другой процесс
+            return broadcast_id
+        self._spawn(broadcast_id)
+        return broadcast_id
+
+    def _spawn(self, broadcast_id: str) -> None:
+        if broadcast_id in self._tasks:
+            return
+        task = asyncio.create_task(self._run(broadcast_id), name=f"broadcast-{broadcast_id}")
+        self._tasks[broadcast_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(broadcast_id, None))
+
+    async def start(self) -> None:
+        """Продолжает незавершенные рассылки"""
+        try:
+            active = await redis.smembers(self._active_key())
+        except Exception as e:
+            logger.warning(f"Не удалось прочитать активные рассылки: {e}")
+            return
+        for broadcast_id in active:
+            self._spawn(broadcast_id.decode() if isinstance(broadcast_id, bytes) else broadcast_id)
+
+    async def stop(self) -> None:
+        """Останавливает рассылки; прогресс остается в Redis"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _take_lease(self, broadcast_id: str) -> bool:
+        lease_key = f"{self._key(broadcast_id)}:lease"
+        if await redis.set(lease_key, self.owner, nx=True, ex=self.lease_ttl):
+            return True
+        owner = await redis.get(lease_key)
+        if owner in (self.owner, self.owner.encode()):
+            await redis.expire(lease_key, self.lease_ttl)
+            return True
+        return False
+
+    async def _send(self, tg_id: int, text: str) -> bool:
+        for _ in range(3):
+            await self.limiter.acquire()
+            try:
+                await self.bot.send_message(chat_id=tg_id, text=text, parse_mode="HTML")
+                return True
+            except TelegramRetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+            except (TelegramForbiddenError, TelegramBadRequest):
+                return False
+            except Exception as e:
+                logger.warning(f"Ошибка отправки рассылки пользователю {tg_id}: {e}")
+                await asyncio.sleep(1)
+        return False
+
+    async def _run(self, broadcast_id: str) -> None:
+        key = self._key(broadcast_id)
+        try:
+            # Рассылку ведет другой процесс или аренда упавшего процесса еще не истекла
+            while not await self._take_lease(broadcast_id):
+                await asyncio.sleep(self.lease_ttl / 2)
+            state = await redis.hgetall(key)
+            state = {k.decode() if isinstance(k, bytes) else k: v.decode() if isinstance(v, bytes) else v
+                     for k, v in state.items()}
+            if state.get('status') != 'running':
+                await redis.srem(self._active_key(), broadcast_id)
+                return
+
+            company_id = int(state['company_id'])
+            text = state['text']
+            last_user_id = int(state['last_user_id'])
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def deliver(tg_id: int) -> bool:
+                async with semaphore:
+                    return await self._send(tg_id, text)
+
+            while True:
+                async with AsyncSessionLocal() as session:
+                    chunk = await BroadcastService(session).company_clients_chunk(
+                        company_id, last_user_id, self.chunk_size
+                    )
+                if not chunk:
+                    break
+
+                results = await asyncio.gather(*(deliver(tg_id) for _, tg_id in chunk))
+                last_user_id = chunk[-1][0]
+                sent = sum(results)
+                async with redis.pipeline(transaction=True) as pipe:
+                    pipe.hset(key, 'last_user_id', last_user_id)
+                    pipe.hincrby(key, 'sent', sent)
+                    pipe.hincrby(key, 'failed', len(results) - sent)
+                    pipe.expire(f"{key}:lease", self.lease_ttl)
+                    await pipe.execute()
+
+            await redis.hset(key, mapping={'status': 'done', 'finished_at': int(time.time())})
+            await redis.srem(self._active_key(), broadcast_id)
+            await redis.delete(f"{key}:lease")
+            logger.info(f"Рассылка {broadcast_id} завершена: {await self.progress(broadcast_id)}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Рассылка {broadcast_id} прервана: {e}")
+
+    async def progress(self, broadcast_id: str) -> dict:
+        """Прогресс рассылки: статус, отправлено, не доставлено"""
+        state = await redis.hmget(self._key(broadcast_id), 'status', 'sent', 'failed', 'last_user_id')
+        status, sent, failed, last_user_id = (
+            v.decode() if isinstance(v, bytes) else v for v in state
+        )
+        return {
+            'status': status,
+            'sent': int(sent or 0),
+            'failed': int(failed or 0),
+            'last_user_id': int(last_user_id or 0),
+        }
+
+
+broadcaster = Broadcaster(
+    bot,
+    chunk_size=config.BROADCAST_CHUNK_SIZE,
+    concurrency=config.BROADCAST_CONCURRENCY,
+    rate=config.BROADCAST_RATE,
+    lease_ttl=config.BROADCAST_LEASE_TTL,
+)
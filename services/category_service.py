@@ -1,6 +1,8 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from services.reference_cache import reference_cache, RefItem
 from utils.database.models import CompanyCategory
+from utils.pagination import Page
 import logging
 
 logger = logging.getLogger(__name__)
@@ -23,16 +25,27 @@ class CategoryService:
             self.session.add(category)
             await self.session.commit()
             await self.session.refresh(category)
+            await reference_cache.bump('categories')
             return category
         except Exception as e:
             logger.error(f"Ошибка создания категории: {e}")
             await self.session.rollback()
             raise
     
-    async def get_all_categories(self) -> list[CompanyCategory]:
-        """Получает все категории"""
-        result = await self.session.execute(select(CompanyCategory))
-        return result.scalars().all()
+    async def get_all_categories(self) -> tuple[RefItem, ...]:
+        """Получает все категории из кэша справочников"""
+        return await reference_cache.items('categories')
+
+    async def get_categories_page(self, page: int = 0, per_page: int = 10) -> Page[RefItem]:
+        """
+        Получает одну страницу категорий из кэша справочников
+        Args:
+            page: Номер страницы
+            per_page: Категорий на странице
+        Returns:
+            Page[RefItem]: Страница категорий
+        """
+        return await reference_cache.page('categories', page, per_page)
     
     async def get_category_by_id(self, category_id: int) -> CompanyCategory:
         """
@@ -69,6 +82,7 @@ class CategoryService:
         if category:
             category.name = name
             await self.session.commit()
+            await reference_cache.bump('categories')
             return category
         return None
     
@@ -84,5 +98,6 @@ class CategoryService:
         if category:
             await self.session.delete(category)
             await self.session.commit()
+            await reference_cache.bump('categories')
             return True
         return False
\ No newline at end of file
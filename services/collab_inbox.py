@@ -0,0 +1,72 @@
+import logging
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from services.coupon_service import CouponService
+from utils.bot_obj import redis
+from utils.config import config
+
+logger = logging.getLogger(__name__)
+
+# Метка заполненного множества: ID типов купонов начинаются с 1
+_SEEDED = 0
+
+
+class CollabInbox:
+    """
+    Счетчик непрочитанных запросов на коллаборацию компании-агента.
+
+    Хранится в Redis множеством ID запросов, поэтому повторная постановка
+    или повторный ответ на один и тот же запрос не сбивает счетчик.
+    Множество заполняется из БД при первом чтении (и после потери
+    ключа в Redis); дальше меню показывает число запросов без запроса к БД
+    """
+    @staticmethod
+    def _key(company_id: int) -> str:
+        return f"{config.REDIS_PREFIX}:collab_inbox:{company_id}"
+
+    async def _seed(self, session: AsyncSession, company_id: int) -> int:
+        request_ids = await CouponService(session).pending_collaboration_request_ids(company_id)
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.delete(self._key(company_id))
+            pipe.sadd(self._key(company_id), _SEEDED, *request_ids)
+            await pipe.execute()
+        return len(request_ids)
+
+    async def unread(self, session: AsyncSession, company_id: int) -> int:
+        """
+        Число непрочитанных запросов на коллаборацию
+        Args:
+            session: Сессия БД (нужна только для первого заполнения)
+            company_id: ID компании-агента
+        Returns:
+            int: Число запросов
+        """
+        try:
+            async with redis.pipeline(transaction=False) as pipe:
+                pipe.sismember(self._key(company_id), _SEEDED)
+                pipe.scard(self._key(company_id))
+                seeded, size = await pipe.execute()
+            if seeded:
+                return size - 1
+            return await self._seed(session, company_id)
+        except Exception as e:
+            logger.warning(f"Счетчик запросов на коллаборацию недоступен: {e}")
+            return len(await CouponService(session).pending_collaboration_request_ids(company_id))
+
+    async def add(self, company_id: int, coupon_type_id: int) -> None:
+        """Новый запрос на коллаборацию для компании-агента"""
+        try:
+            await redis.sadd(self._key(company_id), coupon_type_id)
+        except Exception as e:
+            logger.warning(f"Не удалось обновить счетчик запросов на коллаборацию: {e}")
+
+    async def remove(self, company_id: int, coupon_type_id: int) -> None:
+        """Запрос на коллаборацию обработан"""
+        try:
+            await redis.srem(self._key(company_id), coupon_type_id)
+        except Exception as e:
+            logger.warning(f"Не удалось обновить счетчик запросов на коллаборацию: {e}")
+
+
+collab_inbox = CollabInbox()
@@ -1,8 +1,12 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, delete
+from sqlalchemy import select, func, and_, delete, update, or_, cast, String
 
-from services.action_logger import CityLogger
-from utils.database.models import Company, CompLocation, UserRole, LocCat
+from utils.bot_obj import redis
+from utils.config import config
+from utils.database.db_session import AsyncSessionLocal
+from utils.database.models import Company, CompLocation, UserRole, LocCat, City
+from utils.pagination import Page, paginate
+from utils.stats_counters import COMPANIES, stats_counters
 import logging
 from typing import List, Any, Coroutine
 
@@ -15,28 +19,55 @@ class CompanyService:
     def __init__(self, session: AsyncSession):
         self.session = session
 
+    def _companies_filtered_stmt(
+            self,
+            city: list[int] = None,
+            category: list[int] = None,
+    ):
+        """
+        Компании, у которых есть локация в одном из городов и с одной из категорий.
+        Полусоединение через IN начинается с индекса городов локаций, а не с перебора
+        всех компаний, и не размножает строки, поэтому DISTINCT не нужен
+        """
+        loc_cat = select(LocCat.id_location).where(LocCat.id_location == CompLocation.id_location)
+        if category:
+            loc_cat = loc_cat.where(LocCat.id_category.in_(category))
+
+        location = select(CompLocation.id_comp).where(loc_cat.exists())
+        if city:
+            location = location.where(CompLocation.city_id.in_(city))
+
+        return select(Company).where(Company.id_comp.in_(location))
+
     async def get_companies_filtered_by_loc(
             self,
             city: list[int] = None,
             category: list[int] = None,
     ) -> List[Company]:
-        stmt = select(Company).join(
-            CompLocation, Company.id_comp == CompLocation.id_comp
-        ).join(
-            LocCat, LocCat.id_location == CompLocation.id_location and
-                    LocCat.comp_id == CompLocation.id_comp)
-        
-        if city:
-            city_names = await CityLogger(self.session).get_cities_name_by_id(city)
-            
-            stmt = stmt.where(CompLocation.city.in_(city_names))
-        if category:
-            stmt = stmt.where(LocCat.id_category.in_(category))
-            
-        stmt = stmt.distinct(Company.id_comp)
+        stmt = self._companies_filtered_stmt(city=city, category=category)
         result = await self.session.execute(stmt)
         return result.scalars().all()
 
+    async def get_companies_filtered_by_loc_page(
+            self,
+            city: list[int] = None,
+            category: list[int] = None,
+            page: int = 0,
+            per_page: int = 10
+    ) -> Page[Company]:
+        """
+        Получает одну страницу компаний, отфильтрованных по городам и категориям локаций
+        Args:
+            city: ID городов
+            category: ID категорий
+            page: Номер страницы
+            per_page: Компаний на странице
+        Returns:
+            Page[Company]: Страница компаний
+        """
+        stmt = self._companies_filtered_stmt(city=city, category=category)
+        return await paginate(self.session, stmt.order_by(Company.id_comp), page, per_page)
+
     async def create_company(self, name: str, owner_id: int) -> Company:
         """
         Создает новую компанию и возвращает её с ID из базы данных
@@ -69,6 +100,7 @@ class CompanyService:
             
             await self.session.commit()
             await self.session.refresh(company)
+            await stats_counters.incr(COMPANIES)
             
             return company
 
@@ -106,6 +138,17 @@ class CompanyService:
         """
         return await self.session.get(Company, company_id)
 
+    async def count_locations(self, company_id: int) -> int:
+        """
+        Считает локации компании без загрузки самих локаций
+        Args:
+            company_id: ID компании
+        Returns:
+            int: Количество локаций
+        """
+        stmt = select(func.count()).select_from(CompLocation).where(CompLocation.id_comp == company_id)
+        return await self.session.scalar(stmt) or 0
+
     async def update_company(self, company_id: int, update_data: dict) -> Company:
         """
         Обновляет данные компании
@@ -124,12 +167,14 @@ class CompanyService:
         return None
 
     async def create_location(self, company_id: int, city: str, name_loc: str,
-                              address: str, map_url: str, main_loc: bool = False) -> CompLocation:
+                              address: str, map_url: str, main_loc: bool = False,
+                              city_id: int = None) -> CompLocation:
         """
         Создает новую локацию компании
         Args:
             company_id: ID компании
             city: Город локации
+            city_id: ID города из справочника (если не задан - ищется по названию)
             address: Адрес локации
             name_loc: название локации
             map_url: Ссылка на адрес в картах
@@ -138,12 +183,15 @@ class CompanyService:
             CompLocation: Созданная локация
         """
         try:
+            if city_id is None:
+                city_id = await self._city_id_by_name(city)
             location = CompLocation(
                 id_comp=company_id,
                 address=address,
                 map_url=map_url,
                 name_loc=name_loc,
                 city=city,
+                city_id=city_id,
                 main_loc=main_loc
             )
             self.session.add(location)
@@ -246,6 +294,21 @@ class CompanyService:
         
         return locations
 
+    async def get_locations_page(self, company_id: int, page: int = 0, per_page: int = 10) -> Page[CompLocation]:
+        """
+        Получает одну страницу локаций компании
+        Args:
+            company_id: ID компании
+            page: Номер страницы
+            per_page: Локаций на странице
+        Returns:
+            Page[CompLocation]: Страница локаций
+        """
+        stmt = select(CompLocation).where(
+            CompLocation.id_comp == company_id
+        ).order_by(CompLocation.id_location)
+        return await paginate(self.session, stmt, page, per_page)
+
     async def get_location_by_id(self, location_id: int) -> CompLocation:
         """
         Получает локацию по ID
@@ -267,12 +330,48 @@ class CompanyService:
         """
         location = await self.get_location_by_id(location_id)
         if location:
+            if 'city' in update_data and 'city_id' not in update_data:
+                update_data = {**update_data, 'city_id': await self._city_id_by_name(update_data['city'])}
             for key, value in update_data.items():
                 setattr(location, key, value)
             await self.session.commit()
             return location
         return None
 
+    async def _city_id_by_name(self, name: str | None) -> int | None:
+        """ID города из справочника по точному названию"""
+        if not name:
+            return None
+        return await self.session.scalar(select(City.id).where(City.name == name).limit(1))
+
+    async def backfill_location_cities(self) -> int:
+        """
+        Заполняет city_id локаций, созданных до появления ссылки на справочник.
+        Город сопоставляется по названию либо по ID, записанному в поле city
+        Returns:
+            int: Количество обновленных локаций
+        """
+        city_id = select(City.id).where(
+            or_(City.name == CompLocation.city, cast(City.id, String) == CompLocation.city)
+        ).limit(1).scalar_subquery()
+        result = await self.session.execute(
+            update(CompLocation)
+            .where(CompLocation.city_id.is_(None), CompLocation.city.is_not(None))
+            .values(city_id=city_id)
+            .execution_options(synchronize_session=False)
+        )
+
+        # Там, где в city оказался ID города, возвращаем название
+        city_name = select(City.name).where(City.id == CompLocation.city_id).scalar_subquery()
+        await self.session.execute(
+            update(CompLocation)
+            .where(cast(CompLocation.city_id, String) == CompLocation.city)
+            .values(city=city_name)
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.commit()
+        return result.rowcount
+
     async def delete_location(self, location_id: int) -> None:
         """
         Удаляет данные локации
@@ -317,4 +416,22 @@ class CompanyService:
         """
         stmt = select(CompLocation).where(CompLocation.id_location == location_id)
         result = await self.session.execute(stmt)
-        return result.scalar() is not None
\ No newline at end of file
+        return result.scalar() is not None
+
+
+async def backfill_location_cities() -> None:
+    """
+    Заполняет city_id локаций, созданных до появления ссылки на справочник
+    городов, чтобы они находились фильтром по городу. Вызывается при старте
+    бота; выполняет один процесс, остальные видят блокировку и пропускают шаг.
+    Повторный запуск ничего не меняет
+    """
+    if not await redis.set(f"{config.REDIS_PREFIX}:backfill:location_cities", 1, nx=True, ex=600):
+        return
+    try:
+        async with AsyncSessionLocal() as session:
+            updated = await CompanyService(session).backfill_location_cities()
+        if updated:
+            logger.info(f"Заполнен city_id у {updated} локаций")
+    except Exception as e:
+        logger.error(f"Ошибка заполнения city_id локаций: {e}")
@@ -0,0 +1,175 @@
+import asyncio
+import logging
+import uuid
+from datetime import date, timedelta
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from repositories.coupon_repository import CouponRepository
+from repositories.coupon_type_repository import CouponTypeRepository
+from utils.bot_obj import redis
+from utils.config import config
+from utils.coupon_codes import make_coupon_code
+from utils.database.db_session import AsyncSessionLocal
+from utils.database.models import Coupon, CouponType, CouponStatus
+
+logger = logging.getLogger(__name__)
+
+
+class CouponPoolService:
+    """Сервис пула заранее сгенерированных купонов"""
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.coupon_repo = CouponRepository(session)
+        self.coupon_type_repo = CouponTypeRepository(session)
+
+    async def ensure_reserved_status(self) -> None:
+        """Создает статус "reserved", если его еще нет в справочнике"""
+        status_id = CouponStatus.get_status_id("reserved")
+        if await self.session.get(CouponStatus, status_id) is None:
+            self.session.add(CouponStatus(id_status=status_id, name="reserved"))
+            await self.session.commit()
+
+    async def refill(self, coupon_type: CouponType, count: int) -> int:
+        """
+        Досоздает купоны типа в пуле пачками по COUPON_POOL_BATCH_SIZE
+        Args:
+            coupon_type: Тип купона
+            count: Сколько купонов добавить
+        Returns:
+            int: Количество вставленных купонов
+        """
+        reserved_id = CouponStatus.get_status_id("reserved")
+        # Даты перезаписываются при выдаче купона клиенту
+        end_date = date.today() + timedelta(days=coupon_type.days_for_used)
+        inserted = 0
+        while count > 0:
+            batch = min(count, config.COUPON_POOL_BATCH_SIZE)
+            seqs = await self.coupon_type_repo.allocate_code_range(coupon_type.id_coupon_type, batch)
+            rows = [
+                {
+                    'code': make_coupon_code(coupon_type.code_prefix, coupon_type.id_coupon_type, seq),
+                    'coupon_type_id': coupon_type.id_coupon_type,
+                    'end_date': end_date,
+                    'status_id': reserved_id,
+                }
+                for seq in seqs
+            ]
+            inserted += await self.coupon_repo.insert_pool_batch(rows)
+            count -= batch
+        return inserted
+
+    async def claim(self, coupon_type: CouponType, client_id: int, issuer_id: int) -> Optional[Coupon]:
+        """
+        Выдает клиенту купон из пула
+        Args:
+            coupon_type: Тип купона
+            client_id: ID клиента
+            issuer_id: ID выдавшего купон
+        Returns:
+            Optional[Coupon]: Купон или None, если пул этого типа пуст
+        """
+        coupon = await self.coupon_repo.claim_pooled_coupon(
+            coupon_type_id=coupon_type.id_coupon_type,
+            client_id=client_id,
+            issuer_id=issuer_id,
+            days_for_used=coupon_type.days_for_used,
+            reserved_status_id=CouponStatus.get_status_id("reserved"),
+            active_status_id=CouponStatus.get_status_id("active")
+        )
+        if coupon is None:
+            coupon_pool_refiller.wake()
+        return coupon
+
+    async def refill_below_low_water(self) -> int:
+        """
+        Пополняет до COUPON_POOL_HIGH_WATER пулы активных типов купонов,
+        опустившиеся ниже COUPON_POOL_LOW_WATER
+        Returns:
+            int: Количество вставленных купонов
+        """
+        pooled = await self.coupon_repo.count_pooled_by_type(CouponStatus.get_status_id("reserved"))
+        stmt = select(CouponType).where(
+            (CouponType.is_active == True) &
+            (CouponType.end_date >= date.today())
+        )
+        coupon_types = (await self.session.execute(stmt)).scalars().all()
+
+        inserted = 0
+        for coupon_type in coupon_types:
+            available = pooled.get(coupon_type.id_coupon_type, 0)
+            if available < config.COUPON_POOL_LOW_WATER:
+                inserted += await self.refill(coupon_type, config.COUPON_POOL_HIGH_WATER - available)
+        return inserted
+
+
+class CouponPoolRefiller:
+    """
+    Фоновая задача, поддерживающая пулы купонов выше нижней границы.
+    Пополнение выполняет только один процесс одновременно: остальные
+    видят занятую блокировку и пропускают проход
+    """
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.owner = uuid.uuid4().hex
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+
+    @staticmethod
+    def _lock_key() -> str:
+        return f"{config.REDIS_PREFIX}:coupon_pool:refill_lock"
+
+    def wake(self) -> None:
+        """Запускает пополнение немедленно, не дожидаясь интервала"""
+        self._wakeup.set()
+
+    async def start(self) -> None:
+        if not config.COUPON_POOL_ENABLED or self._task is not None:
+            return
+        async with AsyncSessionLocal() as session:
+            await CouponPoolService(session).ensure_reserved_status()
+        self._task = asyncio.create_task(self._run(), name="coupon-pool-refiller")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _refill(self) -> None:
+        # Блокировка снимается после прохода, чтобы wake() в другом процессе
+        # не ждал интервала; TTL страхует от падения процесса во время пополнения
+        if not await redis.set(self._lock_key(), self.owner, nx=True, ex=max(60, int(self.interval))):
+            return
+        try:
+            async with AsyncSessionLocal() as session:
+                inserted = await CouponPoolService(session).refill_below_low_water()
+            if inserted:
+                logger.info(f"Пул купонов пополнен на {inserted} шт.")
+        finally:
+            if await redis.get(self._lock_key()) in (self.owner, self.owner.encode()):
+                await redis.delete(self._lock_key())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self._refill()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка пополнения пула купонов: {e}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+
+coupon_pool_refiller = CouponPoolRefiller(config.COUPON_POOL_REFILL_INTERVAL)
@@ -1,16 +1,39 @@
-import uuid
+import logging
+from dataclasses import replace
 from datetime import datetime, timedelta, date
 from decimal import Decimal
-from typing import Tuple, Optional
+from typing import NamedTuple, Tuple, Optional
 
-from sqlalchemy import select, or_, and_
-from sqlalchemy.orm import joinedload
+from sqlalchemy import select, or_, and_, case, update
+from sqlalchemy.orm import aliased, joinedload
 
 from repositories.coupon_repository import CouponRepository
+from repositories.coupon_type_repository import CouponTypeRepository
 from services.company_service import CompanyService
-from services.user_service import UserService
+from services.coupon_pool_service import CouponPoolService
+from services.identity_service import IdentityService
+from utils.pagination import Page, paginate
 from utils.database.models import Coupon, CouponType, CouponStatus, CompLocation, UserRole, Company, User
 from services.group_service import GroupService
+from utils.bot_obj import bot, redis
+from utils.config import config
+from utils.coupon_codes import make_coupon_code
+from utils.database.db_session import AsyncSessionLocal
+from utils.stats_counters import ACTIVE_COLLABORATIONS, COUPONS, USED_COUPONS, stats_counters
+
+logger = logging.getLogger(__name__)
+
+
+class CollabRow(NamedTuple):
+    """Строка списка коллабораций"""
+    id_coupon_type: int
+    code_prefix: str
+    company_name: str | None
+    start_date: date
+    end_date: date
+    discount_percent: Decimal
+    is_active: bool
+    agent_agree: bool
 
 
 class CouponService:
@@ -21,13 +44,20 @@ class CouponService:
         self.coupon_repo = CouponRepository(session)
         self.group_service = GroupService(session)
 
-    async def generate_coupon(self, issuer_id: int, client_id: int, coupon_type_id: int) -> Coupon:
+    async def generate_coupon(
+            self,
+            issuer_id: int,
+            client_id: int,
+            coupon_type_id: int,
+            client_tg_id: int = None
+    ) -> Coupon:
         """
         Генерирует новый купон
         Args:
             issuer_id: ID пользователя, выдающего купон
-            client_id: ID клиента, получающего купон
+            client_id: Внутренний ID клиента (User.id), получающего купон
             coupon_type_id: ID типа купона
+            client_tg_id: Telegram ID клиента для проверки подписки (опционально)
         Returns:
             Coupon: Созданный купон
         """
@@ -38,11 +68,25 @@ class CouponService:
 
         # Проверка подписки на группы (если требуется)
         if coupon_type.require_all_groups:
-            if not await self.group_service.check_user_subscription(client_id, coupon_type_id):
+            if client_tg_id is None:
+                client_tg_id = await self.session.scalar(select(User.id_tg).where(User.id == client_id))
+            if not await self.group_service.check_user_subscription(bot, client_tg_id, coupon_type_id):
                 raise ValueError("Пользователь не подписан на все требуемые группы")
 
+        # Пустой пул откатывает транзакцию, и коллаборация становится просроченной:
+        # ленивая загрузка ее полей в асинхронной сессии невозможна
+        code_prefix, days_for_used = coupon_type.code_prefix, coupon_type.days_for_used
+
+        # Выдача заранее сгенерированного купона из пула
+        if config.COUPON_POOL_ENABLED:
+            coupon = await CouponPoolService(self.session).claim(coupon_type, client_id, issuer_id)
+            if coupon:
+                await stats_counters.incr(COUPONS)
+                return coupon
+
         # Генерация уникального кода
-        code = f"{coupon_type.code_prefix}-{uuid.uuid4().hex[:8].upper()}"
+        seq = (await CouponTypeRepository(self.session).allocate_code_range(coupon_type_id, 1))[0]
+        code = make_coupon_code(code_prefix, coupon_type_id, seq)
 
         # Создание купона
         coupon = Coupon(
@@ -50,63 +94,83 @@ class CouponService:
             coupon_type_id=coupon_type_id,
             client_id=client_id,
             start_date=datetime.now().date(),
-            end_date=datetime.now().date() + timedelta(days=coupon_type.days_for_used),
+            end_date=datetime.now().date() + timedelta(days=days_for_used),
             issued_by=issuer_id,
             status_id=CouponStatus.get_status_id("active")
         )
 
         self.session.add(coupon)
         await self.session.commit()
+        await stats_counters.incr(COUPONS)
         return coupon
 
-    async def redeem_coupon(self, coupon_code: str, redeemed_by: int, amount: Decimal) -> Coupon:
+    async def redeem_coupon(self, coupon_code: str, redeemed_by: int, amount: Decimal) -> bool:
         """
-        Активирует (погашает) купон
+        Активирует (погашает) купон.
+        Погашение выполняется одним условным UPDATE, поэтому один и тот же
+        купон не может быть погашен дважды при одновременных запросах.
         Args:
             coupon_code: Код купона
             redeemed_by: ID пользователя, активировавшего купон
             amount: Сумма покупки
         Returns:
-            Coupon: Обновленный купон
+            bool: True если купон погашен
+        Raises:
+            ValueError: Купон не найден, не активен, истек или исчерпан лимит типа
         """
+        active_id = CouponStatus.get_status_id("active")
+        redeemed = await self.coupon_repo.redeem_coupon(
+            code=coupon_code,
+            redeemed_by=redeemed_by,
+            amount=amount,
+            active_status_id=active_id,
+            used_status_id=CouponStatus.get_status_id("used")
+        )
+        if redeemed:
+            await stats_counters.incr(USED_COUPONS)
+            return True
+
+        # Купон не погашен - выясняем причину только в этом случае
         coupon = await self.coupon_repo.get_coupon_by_code(coupon_code)
         if not coupon:
             raise ValueError("Купон не найден")
 
-        # Проверка статуса
-        if coupon.status_id != CouponStatus.get_status_id("active"):
+        if coupon.status_id != active_id:
             raise ValueError("Купон не активен")
 
-        # Проверка срока действия
         if coupon.end_date < datetime.now().date():
-            coupon.status_id = CouponStatus.get_status_id("expired")
-            await self.session.commit()
+            await self.coupon_repo.expire_coupon(
+                coupon_code, active_id, CouponStatus.get_status_id("expired")
+            )
             raise ValueError("Срок действия купона истек")
 
-        # Обновление данных купона
-        coupon.used_by = redeemed_by
-        coupon.used_at = datetime.now()
-        coupon.order_amount = amount
-        coupon.status_id = CouponStatus.get_status_id("used")
-
-        await self.session.commit()
-        return coupon
+        raise ValueError("Купон не удалось погасить")
 
     async def get_user_coupons(self, user_id: int) -> list[Coupon]:
         """
         Получает купоны пользователя
         Args:
-            user_id: ID пользователя
+            user_id: Внутренний ID пользователя (User.id)
         Returns:
             list[Coupon]: Список купонов
         """
-        stmt = select(Coupon).where(
+        stmt = select(Coupon).options(joinedload(Coupon.status)).where(
             (Coupon.client_id == user_id) &
             (Coupon.status_id == CouponStatus.get_status_id("active"))
         )
         result = await self.session.execute(stmt)
         return result.scalars().all()
 
+    async def get_coupon_by_code(self, code: str) -> Optional[Coupon]:
+        """
+        Получает купон по коду вместе со статусом
+        Args:
+            code: Код купона
+        Returns:
+            Coupon | None: Купон или None, если не найден
+        """
+        return await self.coupon_repo.get_coupon_by_code(code, options=[joinedload(Coupon.status)])
+
     async def create_coupon_type(
             self,
             company_id: int,
@@ -160,22 +224,32 @@ class CouponService:
         await self.session.commit()
         return coupon_type
 
-    async def get_collaborations(
-            self,
-            role: str | list,
-            comp_id: int,
-    ) -> list[CouponType]:
+    def _collaborations_stmt(self, role: str | list, comp_id: int):
         """
-        Получает коллаборации по роли пользователя
-        Args:
-            :param role:
-            :param comp_id:
-        Returns:
-            list[CouponType]: Список типов купонов (коллабораций)
+        Проекция коллабораций компании одним запросом: название компании
+        второй стороны берется из соединения с COMPANIES с обеих сторон
         """
         roles = [role] if isinstance(role, str) else role
-
-        stmt = select(CouponType)
+        partner = aliased(Company)
+        agent = aliased(Company)
+
+        stmt = (
+            select(
+                CouponType.id_coupon_type,
+                CouponType.code_prefix,
+                case(
+                    (CouponType.company_id == comp_id, agent.Name_comp),
+                    else_=partner.Name_comp
+                ).label('company_name'),
+                CouponType.start_date,
+                CouponType.end_date,
+                CouponType.discount_percent,
+                CouponType.is_active,
+                CouponType.agent_agree,
+            )
+            .join(partner, partner.id_comp == CouponType.company_id)
+            .outerjoin(agent, agent.id_comp == CouponType.company_agent_id)
+        )
 
         if "partner" in roles and not ("agent" in roles or "admin" in roles):
             stmt = stmt.where(CouponType.company_id == comp_id)
@@ -192,15 +266,45 @@ class CouponService:
         if len(roles) == 1:
             stmt = stmt.where(CouponType.is_active == 1)
 
-        result = await self.session.execute(stmt)
-        collaborations = result.scalars().all()
-        comp_service = CompanyService(session=self.session)
+        return stmt
 
-        for coupon in collaborations:
-            if coupon.company_id == comp_id:
-                coupon.company.Name_comp = (await comp_service.get_company_by_id(coupon.company_agent_id)).Name_comp
+    async def get_collaborations(
+            self,
+            role: str | list,
+            comp_id: int,
+    ) -> list[CollabRow]:
+        """
+        Получает коллаборации по роли пользователя
+        Args:
+            role: Роль или список ролей
+            comp_id: ID компании
+        Returns:
+            list[CollabRow]: Коллаборации с названием компании второй стороны
+        """
+        stmt = self._collaborations_stmt(role, comp_id).order_by(CouponType.id_coupon_type)
+        result = await self.session.execute(stmt)
+        return [CollabRow(*row) for row in result.all()]
 
-        return collaborations
+    async def get_collaborations_page(
+            self,
+            role: str | list,
+            comp_id: int,
+            page: int = 0,
+            per_page: int = 10
+    ) -> Page[CollabRow]:
+        """
+        Получает одну страницу коллабораций по роли пользователя
+        Args:
+            role: Роль или список ролей
+            comp_id: ID компании
+            page: Номер страницы
+            per_page: Коллабораций на странице
+        Returns:
+            Page[CollabRow]: Страница коллабораций с названием компании второй стороны
+        """
+        stmt = self._collaborations_stmt(role, comp_id).order_by(CouponType.id_coupon_type)
+        collaborations = await paginate(self.session, stmt, page, per_page, scalars=False)
+        return replace(collaborations, items=[CollabRow(*row) for row in collaborations.items])
 
     async def get_collaboration_info(
             self,
@@ -213,7 +317,10 @@ class CouponService:
         Returns:
             CouponType: Объект коллаборации
         """
-        stmt = select(CouponType, CompLocation).where(
+        stmt = select(CouponType, CompLocation).options(
+            joinedload(CouponType.company),
+            joinedload(CompLocation.company)
+        ).where(
             and_(
                 CouponType.id_coupon_type == coupon_id,
                 CouponType.location_agent_id == CompLocation.id_location,
@@ -240,15 +347,44 @@ class CouponService:
         coupon_type = await self.session.get(CouponType, coupon_type_id)
 
         if coupon_type is not None:
+            was_active = coupon_type.is_active and coupon_type.end_date >= date.today()
             coupon_type.end_date = datetime.now().date()
             coupon_type.is_active = False
 
             self.session.add(coupon_type)
             await self.session.commit()
             await self.session.refresh(coupon_type)
+            if was_active:
+                await stats_counters.incr(ACTIVE_COLLABORATIONS, -1)
 
         return coupon_type
 
+    @staticmethod
+    def _collaboration_requests_filter(company_id: int, location_id: int | None = None):
+        # Условия совпадают с индексом ix_coupon_types_agent_inbox
+        conditions = [CouponType.company_agent_id == company_id]
+        if location_id is not None:
+            conditions.append(CouponType.location_agent_id == location_id)
+        conditions.append(CouponType.agent_agree == False)
+        conditions.append(CouponType.agent_rejected == False)
+        return and_(*conditions)
+
+    def _collaboration_requests_stmt(self, company_id: int, location_id: int):
+        return select(CouponType).options(joinedload(CouponType.company)).where(
+            self._collaboration_requests_filter(company_id, location_id)
+        )
+
+    async def pending_collaboration_request_ids(self, company_id: int) -> list[int]:
+        """
+        ID входящих запросов на коллаборацию по всем локациям компании
+        Args:
+            company_id: ID Компании
+        Returns:
+            list[int]: ID типов купонов
+        """
+        stmt = select(CouponType.id_coupon_type).where(self._collaboration_requests_filter(company_id))
+        return list((await self.session.execute(stmt)).scalars().all())
+
     async def get_collaboration_requests(
             self,
             company_id: int,
@@ -262,31 +398,49 @@ class CouponService:
         Returns:
             list[CouponType]: Список запросов
         """
-        stmt = select(CouponType).where(
-            CouponType.agent_agree == False and
-            CouponType.company_agent_id == company_id and
-            location_id == CouponType.location_agent_id
-        )
+        stmt = self._collaboration_requests_stmt(company_id, location_id)
 
         result = await self.session.execute(stmt)
         return result.scalars().all()
 
+    async def get_collaboration_requests_page(
+            self,
+            company_id: int,
+            location_id: int,
+            page: int = 0,
+            per_page: int = 10
+    ) -> Page[CouponType]:
+        """
+        Получает одну страницу входящих запросов на коллаборацию
+        Args:
+            company_id: ID Компании
+            location_id: ID Локации
+            page: Номер страницы
+            per_page: Запросов на странице
+        Returns:
+            Page[CouponType]: Страница запросов
+        """
+        stmt = self._collaboration_requests_stmt(company_id, location_id).order_by(CouponType.id_coupon_type)
+        return await paginate(self.session, stmt, page, per_page)
+
     async def set_collab_status(
             self,
             coupon_type_id: int,
             status: bool = True
     ) -> CouponType | bool:
         """
-        Принимает запрос на коллаборацию
+        Принимает или отклоняет запрос на коллаборацию.
+        Отклоненный запрос помечается agent_rejected и больше не попадает во входящие
         Args:
             coupon_type_id: ID типа купона
-            status: Статус
+            status: True - принять, False - отклонить
         Returns:
             bool: Успешность операции
         """
         coupon_type = await self.session.get(CouponType, coupon_type_id)
         if coupon_type:
             coupon_type.agent_agree = status
+            coupon_type.agent_rejected = not status
             await self.session.commit()
             return coupon_type
         return False
@@ -305,8 +459,11 @@ class CouponService:
         """
         coupon_type = await self.session.get(CouponType, coupon_type_id)
         if coupon_type:
+            changed = bool(coupon_type.is_active) != status and coupon_type.end_date >= date.today()
             coupon_type.is_active = status
             await self.session.commit()
+            if changed:
+                await stats_counters.incr(ACTIVE_COLLABORATIONS, 1 if status else -1)
             return coupon_type
         return False
 
@@ -322,6 +479,25 @@ class CouponService:
         result = await self.session.execute(stmt)
         return result.scalar() is not None
 
+    async def location_collaboration_ids(self, location_id: int) -> list[int]:
+        """
+        Действующие коллаборации, купоны которых выдаются в локации
+        Args:
+            location_id: ID локации
+        Returns:
+            list[int]: ID типов купонов по возрастанию
+        """
+        stmt = (
+            select(CouponType.id_coupon_type)
+            .where(and_(
+                CouponType.location_id == location_id,
+                CouponType.is_active.is_(True),
+                CouponType.end_date >= date.today()
+            ))
+            .order_by(CouponType.id_coupon_type)
+        )
+        return list((await self.session.execute(stmt)).scalars().all())
+
     async def issue_coupon_to_client(
         self, 
         client_id: int, 
@@ -340,8 +516,7 @@ class CouponService:
             str: Сообщение с результатом операции
         """
         # Поиск внутреннего ID администратора
-        user_service = UserService(self.session)
-        admin = await user_service.get_user_by_tg_id(admin_tg_id)
+        admin = await IdentityService(self.session).resolve(admin_tg_id)
         if not admin:
             return "❌ Администратор не найден"
         
@@ -359,12 +534,18 @@ class CouponService:
         # Проверка, что пользователь еще не получал этот купон
         if await self.has_coupon(client_id, collaboration_id):
             return "⚠️ Вы уже получали этот купон ранее"
+
+        # Coupon.client_id всегда хранит внутренний ID пользователя
+        client = await IdentityService(self.session).resolve(client_id)
+        if not client:
+            return "❌ Клиент не найден"
         
         # Генерация купона
         try:
             coupon = await self.generate_coupon(
                 issuer_id=admin.id,
-                client_id=client_id,
+                client_id=client.id,
+                client_tg_id=client_id,
                 coupon_type_id=collaboration_id
             )
             return f"🎉 Купон активирован!\nКод: `{coupon.code}`"
@@ -381,13 +562,50 @@ class CouponService:
             bool: True если купон уже есть
         """
         # Находим внутренний ID пользователя
-        user = await UserService(self.session).get_user_by_tg_id(user_id)
+        user = await IdentityService(self.session).resolve(user_id)
         if not user:
             return False
-        
+
         stmt = select(Coupon).where(
             (Coupon.client_id == user.id) &
             (Coupon.coupon_type_id == collaboration_id)
         )
         result = await self.session.execute(stmt)
-        return result.scalar() is not None
\ No newline at end of file
+        return result.scalar() is not None
+
+    async def backfill_client_ids(self) -> int:
+        """
+        Переводит client_id купонов, выданных по Telegram ID, на внутренний ID.
+        Значение, совпадающее с чьим-то User.id, не трогается: такой купон
+        уже ссылается на внутренний ID
+        Returns:
+            int: Количество исправленных купонов
+        """
+        user_id = select(User.id).where(User.id_tg == Coupon.client_id).scalar_subquery()
+        result = await self.session.execute(
+            update(Coupon)
+            .where(Coupon.client_id.in_(select(User.id_tg)), Coupon.client_id.not_in(select(User.id)))
+            .values(client_id=user_id)
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.commit()
+        return result.rowcount
+
+
+async def backfill_coupon_clients() -> None:
+    """
+    Исправляет купоны, у которых в client_id записан Telegram ID клиента
+    (так их выдавали раньше), чтобы они находились по внутреннему ID
+    в "Моих купонах", проверке повторной выдачи и рассылках. Вызывается
+    при старте бота; выполняет один процесс, остальные видят блокировку
+    и пропускают шаг. Повторный запуск ничего не меняет
+    """
+    if not await redis.set(f"{config.REDIS_PREFIX}:backfill:coupon_clients", 1, nx=True, ex=600):
+        return
+    try:
+        async with AsyncSessionLocal() as session:
+            updated = await CouponService(session).backfill_client_ids()
+        if updated:
+            logger.info(f"client_id переведен на внутренний ID у {updated} купонов")
+    except Exception as e:
+        logger.error(f"Ошибка исправления client_id купонов: {e}")
@@ -1,7 +1,8 @@
 from aiogram import Bot
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from utils.database.models import GroupCoupon, CouponType
+from utils.database.models import GroupCoupon, CouponType, TgGroup
+from services.membership_service import membership_checker
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,36 +17,26 @@ class GroupService:
         Проверяет подписку пользователя на группы для купона
         Args:
             bot: Объект бота
-            user_id: ID пользователя
+            user_id: Telegram ID пользователя
             coupon_type_id: ID типа купона
         Returns:
             bool: True если подписка действительна
         """
         try:
-            # Получаем группы, необходимые для этого типа купона
-            stmt = select(GroupCoupon).where(
+            # Получаем Telegram ID групп, необходимых для этого типа купона
+            stmt = select(TgGroup.group_id).join(
+                GroupCoupon, GroupCoupon.group_id == TgGroup.id_tg_group
+            ).where(
                 GroupCoupon.coupon_type_id == coupon_type_id
             )
             result = await self.session.execute(stmt)
-            group_coupons = result.scalars().all()
+            chat_ids = result.scalars().all()
             
-            if not group_coupons:
+            if not chat_ids:
                 return True  # Если группы не требуются
             
-            # Проверяем подписку на каждую группу
-            for group_coupon in group_coupons:
-                try:
-                    member = await bot.get_chat_member(
-                        chat_id=group_coupon.group.group_id,
-                        user_id=user_id
-                    )
-                    if member.status not in ['member', 'administrator', 'creator']:
-                        return False
-                except Exception as e:
-                    logger.error(f"Ошибка проверки подписки: {e}")
-                    return False
-            
-            return True
+            # Проверяем подписку на все группы параллельно
+            return await membership_checker.check_all(bot, chat_ids, user_id)
         except Exception as e:
             logger.error(f"Ошибка проверки подписок: {e}")
             return False
@@ -58,11 +49,13 @@ class GroupService:
         Returns:
             list: Список групп
         """
-        stmt = select(GroupCoupon).where(
+        stmt = select(TgGroup.group_id, TgGroup.name).join(
+            GroupCoupon, GroupCoupon.group_id == TgGroup.id_tg_group
+        ).where(
             GroupCoupon.coupon_type_id == coupon_type_id
         )
         result = await self.session.execute(stmt)
         return [
-            {"id": gc.group.group_id, "name": gc.group.name}
-            for gc in result.scalars().all()
+            {"id": group_id, "name": name}
+            for group_id, name in result.all()
         ]
\ No newline at end of file
@@ -0,0 +1,320 @@
+import json
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from utils.bot_obj import redis
+from utils.config import config
+from utils.database.models import User, UserRole
+from utils.lru import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Кортеж роли: (role, company_id, location_id)
+RoleTuple = tuple[str, Optional[int], Optional[int]]
+
+# Отметка "пользователь не найден" в кэше
+_NOT_FOUND = object()
+_NOT_FOUND_JSON = 'null'
+
+# Записывает снимок, только если поколение пользователя не менялось с момента
+# чтения из БД: invalidate увеличивает поколение, поэтому resolve, прочитавший
+# БД до сброса, не вернет в кэш устаревшие роли
+_SET_IF_GENERATION_SCRIPT = """
+local current = redis.call('GET', KEYS[2]) or ''
+if current ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+
+@dataclass(frozen=True, slots=True)
+class UserIdentity:
+    """Неизменяемый снимок пользователя: внутренний ID, Telegram ID и роли"""
+    id: int
+    id_tg: int
+    roles: frozenset[RoleTuple]
+
+    @property
+    def role_names(self) -> frozenset[str]:
+        return frozenset(role for role, _, _ in self.roles)
+
+    def has_role(self, role_name: str) -> bool:
+        return role_name in self.role_names
+
+    def to_json(self) -> str:
+        return json.dumps({
+            'id': self.id,
+            'id_tg': self.id_tg,
+            'roles': sorted(self.roles, key=lambda r: (r[0], r[1] or 0, r[2] or 0)),
+        })
+
+    @classmethod
+    def from_json(cls, raw: str | bytes) -> "UserIdentity":
+        data = json.loads(raw)
+        return cls(
+            id=data['id'],
+            id_tg=data['id_tg'],
+            roles=frozenset(tuple(role) for role in data['roles']),
+        )
+
+
+class IdentityCache:
+    """
+    Двухуровневый кэш идентификации пользователей.
+
+    Первый уровень - LRU в памяти процесса с коротким TTL,
+    второй - общий для всех процессов Redis. Отрицательный результат
+    (пользователь не зарегистрирован) тоже кэшируется, но сбрасывается
+    при регистрации через invalidate.
+    """
+    def __init__(self, maxsize: int, local_ttl: float, redis_ttl: int):
+        self.local = LRUCache(maxsize, ttl=local_ttl)
+        self.redis_ttl = redis_ttl
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.stale_writes = 0
+        self._set_script = None
+
+    @staticmethod
+    def _key(tg_id: int) -> str:
+        return f"{config.REDIS_PREFIX}:identity:{tg_id}"
+
+    @staticmethod
+    def _generation_key(tg_id: int) -> str:
+        return f"{config.REDIS_PREFIX}:identity:gen:{tg_id}"
+
+    @staticmethod
+    def _decode(raw) -> str:
+        if raw is None:
+            return ''
+        return raw.decode() if isinstance(raw, bytes) else str(raw)
+
+    async def generations(self, tg_ids: list[int]) -> dict[int, Optional[str]]:
+        """
+        Текущие поколения пользователей; читаются до загрузки из БД и
+        передаются в set. None - Redis недоступен
+        """
+        try:
+            raws = await redis.mget([self._generation_key(tg_id) for tg_id in tg_ids])
+        except Exception as e:
+            logger.warning(f"Кэш идентификации в Redis недоступен: {e}")
+            return dict.fromkeys(tg_ids)
+        return {tg_id: self._decode(raw) for tg_id, raw in zip(tg_ids, raws)}
+
+    async def get(self, tg_id: int):
+        """
+        Возвращает UserIdentity, _NOT_FOUND или None, если в кэше ничего нет
+        """
+        cached = self.local.get(tg_id)
+        if cached is not None:
+            self.local_hits += 1
+            return cached
+
+        try:
+            raw = await redis.get(self._key(tg_id))
+        except Exception as e:
+            logger.warning(f"Кэш идентификации в Redis недоступен: {e}")
+            raw = None
+
+        if raw is None:
+            self.misses += 1
+            return None
+
+        self.redis_hits += 1
+        value = _NOT_FOUND if raw in (_NOT_FOUND_JSON, _NOT_FOUND_JSON.encode()) else UserIdentity.from_json(raw)
+        self.local.set(tg_id, value)
+        return value
+
+    async def get_many(self, tg_ids: list[int]) -> dict:
+        """
+        Пакетный вариант get: локальный уровень, затем один MGET в Redis.
+        В результат попадают только найденные в кэше записи
+        """
+        found = {}
+        remote = []
+        for tg_id in tg_ids:
+            cached = self.local.get(tg_id)
+            if cached is not None:
+                self.local_hits += 1
+                found[tg_id] = cached
+            else:
+                remote.append(tg_id)
+        if not remote:
+            return found
+
+        try:
+            raws = await redis.mget([self._key(tg_id) for tg_id in remote])
+        except Exception as e:
+            logger.warning(f"Кэш идентификации в Redis недоступен: {e}")
+            raws = [None] * len(remote)
+
+        for tg_id, raw in zip(remote, raws):
+            if raw is None:
+                self.misses += 1
+                continue
+            self.redis_hits += 1
+            value = _NOT_FOUND if raw in (_NOT_FOUND_JSON, _NOT_FOUND_JSON.encode()) else UserIdentity.from_json(raw)
+            self.local.set(tg_id, value)
+            found[tg_id] = value
+        return found
+
+    async def set(self, tg_id: int, identity: Optional[UserIdentity], generation: Optional[str]) -> None:
+        """
+        Кэширует снимок, загруженный из БД
+        Args:
+            tg_id: Telegram ID пользователя
+            identity: Снимок или None, если пользователь не зарегистрирован
+            generation: Поколение, прочитанное до загрузки из БД (generations)
+        """
+        raw = identity.to_json() if identity is not None else _NOT_FOUND_JSON
+        if generation is not None:
+            if self._set_script is None:
+                self._set_script = redis.register_script(_SET_IF_GENERATION_SCRIPT)
+            try:
+                written = await self._set_script(
+                    keys=[self._key(tg_id), self._generation_key(tg_id)],
+                    args=[generation, raw, self.redis_ttl]
+                )
+            except Exception as e:
+                logger.warning(f"Не удалось записать идентификацию в Redis: {e}")
+            else:
+                if not written:
+                    # Пока читали БД, запись сбросили: снимок мог устареть
+                    self.stale_writes += 1
+                    return
+        self.local.set(tg_id, identity if identity is not None else _NOT_FOUND)
+
+    async def invalidate(self, tg_id: int) -> None:
+        """Сбрасывает запись пользователя в обоих уровнях кэша"""
+        self.invalidations += 1
+        self.local.pop(tg_id)
+        try:
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.incr(self._generation_key(tg_id))
+                # Поколение живет дольше любого resolve, начатого до сброса
+                pipe.expire(self._generation_key(tg_id), self.redis_ttl)
+                pipe.delete(self._key(tg_id))
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Не удалось сбросить идентификацию в Redis: {e}")
+
+    def stats(self) -> dict:
+        """Счетчики попаданий и промахов кэша"""
+        lookups = self.local_hits + self.redis_hits + self.misses
+        hits = self.local_hits + self.redis_hits
+        return {
+            'local_hits': self.local_hits,
+            'redis_hits': self.redis_hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'stale_writes': self.stale_writes,
+            'local_size': len(self.local),
+            'hit_ratio': round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+identity_cache = IdentityCache(
+    maxsize=config.IDENTITY_CACHE_SIZE,
+    local_ttl=config.IDENTITY_LOCAL_TTL,
+    redis_ttl=config.IDENTITY_REDIS_TTL,
+)
+
+
+class IdentityService:
+    """Сервис для получения кэшированной идентификации пользователя"""
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def resolve(self, tg_id: int) -> Optional[UserIdentity]:
+        """
+        Возвращает снимок пользователя по Telegram ID
+        Args:
+            tg_id: Telegram ID пользователя
+        Returns:
+            Optional[UserIdentity]: Снимок или None, если пользователь не зарегистрирован
+        """
+        cached = await identity_cache.get(tg_id)
+        if cached is not None:
+            return None if cached is _NOT_FOUND else cached
+
+        generation = (await identity_cache.generations([tg_id]))[tg_id]
+        identity = await self._load(tg_id)
+        await identity_cache.set(tg_id, identity, generation)
+        return identity
+
+    async def resolve_many(self, tg_ids: list[int]) -> dict[int, Optional[UserIdentity]]:
+        """
+        Возвращает снимки сразу для нескольких пользователей,
+        догружая промахи кэша двумя запросами
+        Args:
+            tg_ids: Telegram ID пользователей
+        Returns:
+            dict[int, Optional[UserIdentity]]: Снимок (или None) для каждого Telegram ID
+        """
+        tg_ids = list(dict.fromkeys(tg_ids))
+        cached = await identity_cache.get_many(tg_ids)
+        result = {
+            tg_id: None if value is _NOT_FOUND else value
+            for tg_id, value in cached.items()
+        }
+
+        missing = [tg_id for tg_id in tg_ids if tg_id not in cached]
+        if missing:
+            generations = await identity_cache.generations(missing)
+            loaded = await self._load_many(missing)
+            for tg_id in missing:
+                identity = loaded.get(tg_id)
+                await identity_cache.set(tg_id, identity, generations[tg_id])
+                result[tg_id] = identity
+        return result
+
+    async def _load_many(self, tg_ids: list[int]) -> dict[int, UserIdentity]:
+        users = dict((await self.session.execute(
+            select(User.id_tg, User.id).where(User.id_tg.in_(tg_ids))
+        )).all())
+        if not users:
+            return {}
+
+        # Роль может быть записана как по Telegram ID, так и по внутреннему ID
+        owner_of = {tg_id: tg_id for tg_id in users}
+        owner_of.update({user_id: tg_id for tg_id, user_id in users.items()})
+        stmt = select(UserRole.user_id, UserRole.role, UserRole.company_id, UserRole.location_id).where(
+            UserRole.user_id.in_(owner_of)
+        )
+        roles: dict[int, set[RoleTuple]] = {tg_id: set() for tg_id in users}
+        for user_id, role, company_id, location_id in (await self.session.execute(stmt)).all():
+            roles[owner_of[user_id]].add((role, company_id, location_id))
+
+        return {
+            tg_id: UserIdentity(id=user_id, id_tg=tg_id, roles=frozenset(roles[tg_id]))
+            for tg_id, user_id in users.items()
+        }
+
+    async def _load(self, tg_id: int) -> Optional[UserIdentity]:
+        user_id = await self.session.scalar(select(User.id).where(User.id_tg == tg_id))
+        if user_id is None:
+            return None
+
+        # Исторически UserRole.user_id хранит как Telegram ID, так и внутренний ID
+        stmt = select(UserRole.role, UserRole.company_id, UserRole.location_id).where(
+            UserRole.user_id.in_({tg_id, user_id})
+        )
+        rows = (await self.session.execute(stmt)).all()
+        return UserIdentity(
+            id=user_id,
+            id_tg=tg_id,
+            roles=frozenset((role, company_id, location_id) for role, company_id, location_id in rows),
+        )
+
+    @staticmethod
+    async def invalidate(tg_id: int) -> None:
+        """Сбрасывает кэш идентификации пользователя"""
+        await identity_cache.invalidate(tg_id)
@@ -0,0 +1,164 @@
+import asyncio
+import logging
+from typing import Iterable
+
+from aiogram import Bot
+
+from utils.bot_obj import redis
+from utils.config import config
+
+logger = logging.getLogger(__name__)
+
+MEMBER_STATUSES = ('member', 'administrator', 'creator')
+
+
+class MembershipChecker:
+    """
+    Проверка подписки пользователей на Telegram группы.
+
+    Запросы get_chat_member выполняются параллельно (не более concurrency
+    одновременно), частоту запросов ограничивает middleware сессии бота.
+    Результаты кэшируются в Redis на пару (chat_id, user_id): положительные дольше,
+    отрицательные - недолго, чтобы новая подписка учитывалась быстро.
+    Ошибки API не кэшируются и считаются отсутствием подписки.
+    """
+    def __init__(
+            self,
+            concurrency: int,
+            positive_ttl: int,
+            negative_ttl: int
+    ):
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self.cache_hits = 0
+        self.api_calls = 0
+        self.api_errors = 0
+
+    @staticmethod
+    def _key(chat_id: int, user_id: int) -> str:
+        return f"{config.REDIS_PREFIX}:member:{chat_id}:{user_id}"
+
+    async def _fetch(self, bot: Bot, chat_id: int, user_id: int) -> bool | None:
+        """Запрашивает статус у Telegram; None при ошибке"""
+        async with self._semaphore:
+            self.api_calls += 1
+            try:
+                member = await bot.get_chat_member(chat_id=chat_id, user_id=user_id)
+            except Exception as e:
+                self.api_errors += 1
+                logger.error(f"Ошибка проверки подписки на {chat_id}: {e}")
+                return None
+        return member.status in MEMBER_STATUSES
+
+    async def _check_uncached(self, bot: Bot, chat_id: int, user_id: int) -> bool:
+        is_member = await self._fetch(bot, chat_id, user_id)
+        if is_member is None:
+            return False
+        ttl = self.positive_ttl if is_member else self.negative_ttl
+        try:
+            await redis.set(self._key(chat_id, user_id), '1' if is_member else '0', ex=ttl)
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить подписку в Redis: {e}")
+        return is_member
+
+    async def check_many(self, bot: Bot, chat_ids: Iterable[int], user_id: int) -> dict[int, bool]:
+        """
+        Проверяет подписку пользователя сразу на несколько групп
+        Args:
+            bot: Объект бота
+            chat_ids: Telegram ID групп
+            user_id: Telegram ID пользователя
+        Returns:
+            dict[int, bool]: Подписан ли пользователь на каждую группу
+        """
+        chat_ids = list(dict.fromkeys(chat_ids))
+        if not chat_ids:
+            return {}
+
+        try:
+            cached = await redis.mget([self._key(chat_id, user_id) for chat_id in chat_ids])
+        except Exception as e:
+            logger.warning(f"Кэш подписок в Redis недоступен: {e}")
+            cached = [None] * len(chat_ids)
+
+        result = {}
+        missing = []
+        for chat_id, value in zip(chat_ids, cached):
+            if value is None:
+                missing.append(chat_id)
+            else:
+                self.cache_hits += 1
+                result[chat_id] = value in ('1', b'1')
+
+        if missing:
+            checked = await asyncio.gather(*(
+                self._check_uncached(bot, chat_id, user_id) for chat_id in missing
+            ))
+            result.update(zip(missing, checked))
+        return result
+
+    async def check_all(self, bot: Bot, chat_ids: Iterable[int], user_id: int) -> bool:
+        """
+        Проверяет, что пользователь подписан на все группы.
+        При первом отказе оставшиеся запросы к API отменяются
+        Args:
+            bot: Объект бота
+            chat_ids: Telegram ID групп
+            user_id: Telegram ID пользователя
+        Returns:
+            bool: True если подписан на все группы
+        """
+        chat_ids = list(dict.fromkeys(chat_ids))
+        try:
+            cached = await redis.mget([self._key(chat_id, user_id) for chat_id in chat_ids]) if chat_ids else []
+        except Exception as e:
+            logger.warning(f"Кэш подписок в Redis недоступен: {e}")
+            cached = [None] * len(chat_ids)
+
+        missing = []
+        for chat_id, value in zip(chat_ids, cached):
+            if value is None:
+                missing.append(chat_id)
+            elif value in ('0', b'0'):
+                self.cache_hits += 1
+                return False
+            else:
+                self.cache_hits += 1
+        if not missing:
+            return True
+
+        tasks = [asyncio.create_task(self._check_uncached(bot, chat_id, user_id)) for chat_id in missing]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                if not await next_done:
+                    return False
+            return True
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def is_member(self, bot: Bot, chat_id: int, user_id: int) -> bool:
+        """Проверяет подписку пользователя на одну группу"""
+        return (await self.check_many(bot, [chat_id], user_id))[chat_id]
+
+    async def invalidate(self, chat_id: int, user_id: int) -> None:
+        """Сбрасывает закэшированный статус подписки"""
+        try:
+            await redis.delete(self._key(chat_id, user_id))
+        except Exception as e:
+            logger.warning(f"Не удалось сбросить подписку в Redis: {e}")
+
+    def stats(self) -> dict:
+        return {
+            'cache_hits': self.cache_hits,
+            'api_calls': self.api_calls,
+            'api_errors': self.api_errors,
+        }
+
+
+membership_checker = MembershipChecker(
+    concurrency=config.MEMBERSHIP_CONCURRENCY,
+    positive_ttl=config.MEMBERSHIP_POSITIVE_TTL,
+    negative_ttl=config.MEMBERSHIP_NEGATIVE_TTL,
+)
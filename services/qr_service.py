@@ -0,0 +1,256 @@
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Optional
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import BufferedInputFile, Message
+
+from utils.bot_obj import redis
+from utils.config import config
+from utils.lru import LRUCache
+from utils.qr_render import ERROR_CORRECT_M, SHEET_COLUMNS, SHEET_ROWS, render_qr_png, render_sheet_png
+
+logger = logging.getLogger(__name__)
+
+
+def _sheet_pages(entries: list[tuple[str, str]]) -> list[list[tuple[str, str]]]:
+    per_sheet = SHEET_COLUMNS * SHEET_ROWS
+    return [entries[i:i + per_sheet] for i in range(0, len(entries), per_sheet)]
+
+
+class QRService:
+    """
+    Генерация QR-кодов вне event loop.
+
+    PNG рисуются в пуле процессов или потоков (QR_EXECUTOR), поэтому
+    кодирование не задерживает обработку других обновлений. qrcode
+    написан на чистом Python и держит GIL, так что пул потоков лишь
+    дробит задержку, а пул процессов убирает ее. Готовые PNG
+    кэшируются в памяти по хэшу содержимого; одновременные запросы одного
+    и того же кода рисуются один раз. После первой отправки file_id фото
+    сохраняется в Redis, и повторная отправка того же кода не рисует и не
+    загружает его заново
+    """
+    def __init__(self, executor_kind: str, workers: int, cache_size: int, cache_bytes: int):
+        self.executor_kind = executor_kind
+        self.workers = workers
+        self.cache = LRUCache(cache_size, maxbytes=cache_bytes, sizeof=len)
+        self._executor: Optional[Executor] = None
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._file_ids = LRUCache(cache_size)
+        self.renders = 0
+        self.cache_hits = 0
+        self.uploads = 0
+        self.file_id_hits = 0
+
+    @staticmethod
+    def _key() -> str:
+        return f"{config.REDIS_PREFIX}:qr:file_ids"
+
+    @staticmethod
+    def digest(kind: str, *parts) -> str:
+        """Хэш содержимого и параметров изображения"""
+        return hashlib.sha256(repr((kind, *parts)).encode()).hexdigest()
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_kind == 'process':
+                # spawn: дочерние процессы не наследуют event loop, соединения и потоки бота.
+                # Они заново импортируют main.py, поэтому приложение там импортируется
+                # только внутри main()
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='qr')
+        return self._executor
+
+    async def _render(self, digest: str, func, *args) -> bytes:
+        png = self.cache.get(digest)
+        if png is not None:
+            self.cache_hits += 1
+            return png
+
+        future = self._inflight.get(digest)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._get_executor(), func, *args)
+        self._inflight[digest] = future
+        try:
+            png = await asyncio.shield(future)
+        finally:
+            self._inflight.pop(digest, None)
+        self.renders += 1
+        self.cache.set(digest, png)
+        return png
+
+    async def png(self, data: str, error_correction: int = ERROR_CORRECT_M) -> bytes:
+        """
+        PNG QR-кода из кэша или из пула
+        Args:
+            data: Содержимое QR-кода
+            error_correction: Уровень коррекции ошибок
+        Returns:
+            bytes: PNG-изображение
+        """
+        digest = self.digest('qr', data, error_correction)
+        return await self._render(digest, render_qr_png, data, error_correction)
+
+    async def _cached_file_id(self, digest: str) -> Optional[str]:
+        file_id = self._file_ids.get(digest)
+        if file_id is not None:
+            return file_id
+        try:
+            file_id = await redis.hget(self._key(), digest)
+        except Exception as e:
+            logger.warning(f"file_id QR-кодов в Redis недоступны: {e}")
+            return None
+        if file_id is None:
+            return None
+        file_id = file_id.decode() if isinstance(file_id, bytes) else file_id
+        self._file_ids.set(digest, file_id)
+        return file_id
+
+    async def _remember_file_id(self, digest: str, file_id: str) -> None:
+        self._file_ids.set(digest, file_id)
+        try:
+            await redis.hset(self._key(), digest, file_id)
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить file_id QR-кода: {e}")
+
+    async def _forget_file_id(self, digest: str) -> None:
+        self._file_ids.pop(digest)
+        try:
+            await redis.hdel(self._key(), digest)
+        except Exception as e:
+            logger.warning(f"Не удалось удалить file_id QR-кода: {e}")
+
+    async def _answer(self, message: Message, digest: str, render, filename: str, **kwargs) -> Message:
+        file_id = await self._cached_file_id(digest)
+        if file_id is not None:
+            try:
+                sent = await message.answer_photo(photo=file_id, **kwargs)
+                self.file_id_hits += 1
+                return sent
+            except TelegramBadRequest as e:
+                logger.warning(f"file_id QR-кода недействителен, загружаем заново: {e}")
+                await self._forget_file_id(digest)
+
+        png = await render()
+        sent = await message.answer_photo(photo=BufferedInputFile(png, filename=filename), **kwargs)
+        self.uploads += 1
+        if sent.photo:
+            await self._remember_file_id(digest, sent.photo[-1].file_id)
+        return sent
+
+    async def answer_qr(
+            self,
+            message: Message,
+            data: str,
+            caption: Optional[str] = None,
+            parse_mode: Optional[str] = None,
+            error_correction: int = ERROR_CORRECT_M,
+            reuse: bool = True
+    ) -> Message:
+        """
+        Отправляет QR-код в ответ на сообщение
+        Args:
+            message: Сообщение, на которое отвечаем
+            data: Содержимое QR-кода
+            caption: Подпись к фото
+            parse_mode: Режим разметки подписи
+            error_correction: Уровень коррекции ошибок
+            reuse: Кэшировать PNG и file_id для повторных отправок (не нужно
+                для одноразовых кодов, например кода купона)
+        Returns:
+            Message: Отправленное сообщение
+        """
+        digest = self.digest('qr', data, error_correction)
+        filename = f"qr_{digest[:12]}.png"
+        if not reuse:
+            png = await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(), render_qr_png, data, error_correction
+            )
+            self.renders += 1
+            self.uploads += 1
+            return await message.answer_photo(
+                photo=BufferedInputFile(png, filename=filename), caption=caption, parse_mode=parse_mode
+            )
+        return await self._answer(
+            message, digest, lambda: self.png(data, error_correction), filename,
+            caption=caption, parse_mode=parse_mode
+        )
+
+    async def answer_sheets(
+            self,
+            message: Message,
+            entries: list[tuple[str, str]],
+            caption: Optional[str] = None,
+            parse_mode: Optional[str] = None
+    ) -> list[Message]:
+        """
+        Отправляет печатные листы QR-кодов, по одному фото на лист
+        Args:
+            message: Сообщение, на которое отвечаем
+            entries: Пары (содержимое, подпись)
+            caption: Подпись к первому листу
+            parse_mode: Режим разметки подписи
+        Returns:
+            list[Message]: Отправленные сообщения
+        """
+        pages = _sheet_pages(entries)
+        digests = [self.digest('sheet', page) for page in pages]
+        # Листы без сохраненного file_id рисуются параллельно до первой отправки
+        file_ids = await asyncio.gather(*(self._cached_file_id(digest) for digest in digests))
+        await asyncio.gather(*(
+            self._render(digest, render_sheet_png, page)
+            for page, digest, file_id in zip(pages, digests, file_ids) if file_id is None
+        ))
+
+        sent = []
+        for number, (page, digest) in enumerate(zip(pages, digests)):
+            sent.append(await self._answer(
+                message, digest, partial(self._render, digest, render_sheet_png, page),
+                f"qr_sheet_{number + 1}.png",
+                caption=caption if number == 0 else None, parse_mode=parse_mode
+            ))
+        return sent
+
+    async def start(self) -> None:
+        """Запускает процессы пула заранее, чтобы первый QR-код не ждал их старта"""
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        await asyncio.gather(*(
+            loop.run_in_executor(executor, render_qr_png, '') for _ in range(self.workers)
+        ))
+
+    async def stop(self) -> None:
+        logger.info(f"QR stats: {self.stats()}")
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict:
+        """Счетчики генерации, кэша и повторного использования file_id"""
+        return {
+            'renders': self.renders,
+            'cache_hits': self.cache_hits,
+            'uploads': self.uploads,
+            'file_id_hits': self.file_id_hits,
+            'cache_size': len(self.cache),
+            'cache_bytes': self.cache.nbytes,
+        }
+
+
+qr_service = QRService(
+    executor_kind=config.QR_EXECUTOR,
+    workers=config.QR_WORKERS,
+    cache_size=config.QR_CACHE_SIZE,
+    cache_bytes=config.QR_CACHE_BYTES,
+)
@@ -0,0 +1,139 @@
+import logging
+import time
+from typing import NamedTuple
+
+from sqlalchemy import select
+
+from utils.bot_obj import redis
+from utils.config import config
+from utils.database.db_session import AsyncSessionLocal
+from utils.database.models import CompanyCategory, City
+from utils.pagination import Page
+
+logger = logging.getLogger(__name__)
+
+
+class RefItem(NamedTuple):
+    """Элемент справочника: ID и название"""
+    id: int
+    name: str
+
+
+class ReferenceTable:
+    """Снимок одного справочника, отсортированный и разбитый на страницы"""
+    def __init__(self, name: str, model):
+        self.name = name
+        self.model = model
+        self.version: int | None = None
+        self.items: tuple[RefItem, ...] = ()
+        self._pages: dict[int, tuple[Page[RefItem], ...]] = {}
+
+    @property
+    def version_key(self) -> str:
+        return f"{config.REDIS_PREFIX}:refdata:{self.name}:version"
+
+    def load(self, items: list[RefItem], version: int) -> None:
+        self.items = tuple(sorted(items, key=lambda item: (item.name.lower(), item.id)))
+        self.version = version
+        self._pages = {}
+
+    def page(self, page: int, per_page: int) -> Page[RefItem]:
+        pages = self._pages.get(per_page)
+        if pages is None:
+            total = len(self.items)
+            source = (self.name, self.version)
+            pages = tuple(
+                Page(
+                    items=self.items[start:start + per_page],
+                    page=number,
+                    per_page=per_page,
+                    total=total,
+                    source=source
+                )
+                for number, start in enumerate(range(0, max(total, 1), per_page))
+            )
+            self._pages[per_page] = pages
+        return pages[max(0, min(page or 0, len(pages) - 1))]
+
+
+class ReferenceCache:
+    """
+    Кэш редко меняющихся справочников (категории, города) в памяти процесса.
+
+    Загружается при старте бота. Изменение справочника увеличивает его
+    версию в Redis; процессы сверяют версию не чаще раза в
+    REFDATA_VERSION_CHECK_INTERVAL секунд и перечитывают таблицу при
+    расхождении. Чтение из кэша не обращается к БД.
+    """
+    def __init__(self, check_interval: float):
+        self.check_interval = check_interval
+        self.tables = {
+            'categories': ReferenceTable('categories', CompanyCategory),
+            'cities': ReferenceTable('cities', City),
+        }
+        self._checked_at = 0.0
+        self.reloads = 0
+
+    async def _remote_versions(self) -> dict[str, int]:
+        tables = list(self.tables.values())
+        try:
+            values = await redis.mget([table.version_key for table in tables])
+        except Exception as e:
+            logger.warning(f"Версии справочников в Redis недоступны: {e}")
+            return {}
+        return {table.name: int(value or 0) for table, value in zip(tables, values)}
+
+    async def _reload(self, table: ReferenceTable, version: int) -> None:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(select(table.model.id, table.model.name))
+            table.load([RefItem(id, name) for id, name in result.all()], version)
+        self.reloads += 1
+
+    async def load_all(self) -> None:
+        """Загружает все справочники (при старте бота)"""
+        versions = await self._remote_versions()
+        for table in self.tables.values():
+            await self._reload(table, versions.get(table.name, 0))
+        self._checked_at = time.monotonic()
+
+    async def _ensure_fresh(self) -> None:
+        now = time.monotonic()
+        loaded = all(table.version is not None for table in self.tables.values())
+        if loaded and now - self._checked_at < self.check_interval:
+            return
+
+        self._checked_at = now
+        versions = await self._remote_versions()
+        for table in self.tables.values():
+            version = versions.get(table.name, table.version or 0)
+            if table.version != version:
+                await self._reload(table, version)
+
+    async def items(self, name: str) -> tuple[RefItem, ...]:
+        """Все элементы справочника, отсортированные по названию"""
+        await self._ensure_fresh()
+        return self.tables[name].items
+
+    async def page(self, name: str, page: int = 0, per_page: int = 10) -> Page[RefItem]:
+        """Одна страница справочника"""
+        await self._ensure_fresh()
+        return self.tables[name].page(page, per_page)
+
+    async def names_by_id(self, name: str) -> dict[int, str]:
+        return {item.id: item.name for item in await self.items(name)}
+
+    async def bump(self, name: str) -> None:
+        """
+        Отмечает изменение справочника: увеличивает версию в Redis
+        и сразу перечитывает таблицу в текущем процессе
+        """
+        table = self.tables[name]
+        try:
+            version = await redis.incr(table.version_key)
+        except Exception as e:
+            logger.warning(f"Не удалось обновить версию справочника {name}: {e}")
+            version = (table.version or 0) + 1
+        await self._reload(table, version)
+
+
+reference_cache = ReferenceCache(config.REFDATA_VERSION_CHECK_INTERVAL)
@@ -0,0 +1,234 @@
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from typing import AsyncIterator, Optional
+
+from aiogram.types import FSInputFile
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from utils.bot_obj import redis
+from utils.config import config
+from utils.database.db_session import AsyncSessionLocal
+from utils.database.models import CompLocation, Company, Coupon, CouponStatus, CouponType, User
+from utils.report_export import open_report_writer
+from utils.stats_counters import (ACTIVE_COLLABORATIONS, COMPANIES, COUPONS, USED_COUPONS, USERS,
+                                  stats_counters)
+
+logger = logging.getLogger(__name__)
+
+COUPONS_REPORT_HEADER = (
+    'ID', 'Код', 'Тип купона', 'Компания', 'Локация', 'Выдал', 'Использовал',
+    'Сумма заказа', 'Статус', 'Начало', 'Окончание', 'Использован',
+)
+
+
+class ReportService:
+    """Сервис отчетов и системной статистики"""
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def count_all(self) -> dict[str, int]:
+        """
+        Точные значения статистики из БД. Полные подсчеты по таблицам:
+        вызывается сверкой, а не на каждый запрос статистики
+        Returns:
+            dict[str, int]: Значения всех счетчиков
+        """
+        users = await self.session.scalar(select(func.count()).select_from(User))
+        companies = await self.session.scalar(select(func.count()).select_from(Company))
+
+        # Один проход по индексу статусов вместо отдельных COUNT
+        by_status = dict((await self.session.execute(
+            select(Coupon.status_id, func.count()).group_by(Coupon.status_id)
+        )).all())
+        reserved = by_status.get(CouponStatus.get_status_id("reserved"), 0)
+
+        active_collaborations = await self.session.scalar(
+            select(func.count()).select_from(CouponType).where(
+                (CouponType.is_active == True) &
+                (CouponType.end_date >= date.today())
+            )
+        )
+        return {
+            USERS: users or 0,
+            COMPANIES: companies or 0,
+            COUPONS: sum(by_status.values()) - reserved,
+            USED_COUPONS: by_status.get(CouponStatus.get_status_id("used"), 0),
+            ACTIVE_COLLABORATIONS: active_collaborations or 0,
+        }
+
+    async def reconcile(self) -> dict[str, int]:
+        """
+        Сверяет счетчики статистики с БД. Снимок счетчиков берется после
+        подсчета: изменение, зафиксированное в БД во время подсчета, уже
+        учтено и в подсчете, и в счетчике, поэтому не удваивается
+        Returns:
+            dict[str, int]: Исправленные расхождения
+        """
+        actual = await self.count_all()
+        before = await stats_counters.snapshot()
+        return await stats_counters.correct(before, actual)
+
+    @staticmethod
+    def _reconcile_lock_key() -> str:
+        return f"{config.REDIS_PREFIX}:stats:reconcile_lock"
+
+    async def reconcile_exclusive(self, lock_ttl: int) -> Optional[dict[str, int]]:
+        """
+        Сверка под общим для всех процессов замком. Поправки считаются от
+        снимка счетчиков, поэтому две одновременные сверки применили бы
+        одну и ту же поправку дважды
+        Args:
+            lock_ttl: Время жизни замка, сек.; замок не снимается, чтобы
+                следующая сверка выполнялась не раньше чем через lock_ttl
+        Returns:
+            Optional[dict[str, int]]: Исправленные расхождения или None,
+                если замок у другого процесса
+        """
+        if not await redis.set(self._reconcile_lock_key(), 1, nx=True, ex=lock_ttl):
+            return None
+        return await self.reconcile()
+
+    @staticmethod
+    def _coupons_report_stmt():
+        """Плоская проекция купонов для отчета; пул предгенерации не выгружается"""
+        issuer = aliased(User)
+        redeemer = aliased(User)
+        return (
+            select(
+                Coupon.id_coupon,
+                Coupon.code,
+                CouponType.code_prefix,
+                Company.Name_comp,
+                CompLocation.name_loc,
+                issuer.first_name + ' ' + issuer.last_name,
+                redeemer.first_name + ' ' + redeemer.last_name,
+                Coupon.order_amount,
+                CouponStatus.name,
+                Coupon.start_date,
+                Coupon.end_date,
+                Coupon.used_at,
+            )
+            .join(CouponType, CouponType.id_coupon_type == Coupon.coupon_type_id)
+            .join(Company, Company.id_comp == CouponType.company_id)
+            .outerjoin(CompLocation, CompLocation.id_location == CouponType.location_id)
+            .outerjoin(CouponStatus, CouponStatus.id_status == Coupon.status_id)
+            .outerjoin(issuer, issuer.id == Coupon.issued_by)
+            .outerjoin(redeemer, redeemer.id == Coupon.used_by)
+            .where(Coupon.client_id.is_not(None))
+            .order_by(Coupon.id_coupon)
+        )
+
+    @asynccontextmanager
+    async def generate_coupons_report(
+            self,
+            fmt: str = config.REPORT_FORMAT,
+            compress: bool = config.REPORT_GZIP
+    ) -> AsyncIterator[FSInputFile]:
+        """
+        Выгружает все купоны в файл и отдает его для отправки.
+        Строки читаются серверным курсором пачками по REPORT_CHUNK_SIZE
+        и сразу пишутся во временный файл (запись - в отдельном потоке),
+        поэтому память не растет с числом строк. Файл удаляется при
+        выходе из контекста
+        Args:
+            fmt: Формат: csv или xlsx
+            compress: Сжимать CSV в gzip
+        Returns:
+            AsyncIterator[FSInputFile]: Файл отчета
+        """
+        fd, path = tempfile.mkstemp(prefix='coupons_report_')
+        os.close(fd)
+        try:
+            started = time.monotonic()
+            writer = open_report_writer(path, COUPONS_REPORT_HEADER, fmt, compress)
+            rows = 0
+            try:
+                result = await self.session.stream(
+                    self._coupons_report_stmt().execution_options(yield_per=config.REPORT_CHUNK_SIZE)
+                )
+                async for partition in result.partitions():
+                    await asyncio.to_thread(writer.write_rows, partition)
+                    rows += len(partition)
+            finally:
+                await asyncio.to_thread(writer.close)
+
+            logger.info(f"Отчет по купонам: {rows} строк, {os.path.getsize(path)} байт, "
+                        f"{time.monotonic() - started:.1f} с")
+            filename = f"coupons_{datetime.now():%Y%m%d_%H%M}.{writer.extension}"
+            yield FSInputFile(path, filename=filename)
+        finally:
+            os.remove(path)
+
+    async def get_system_stats(self) -> dict[str, int]:
+        """
+        Системная статистика из счетчиков Redis, без подсчетов в БД.
+        Если счетчики еще не заполнены, один раз выполняет сверку; если
+        сверку уже выполняет другой процесс, считает значения в БД
+        Returns:
+            dict[str, int]: Статистика для экрана владельца
+        """
+        counters = await stats_counters.get()
+        if counters is None:
+            if await self.reconcile_exclusive(stats_reconciler.lock_ttl) is not None:
+                counters = await stats_counters.get() or {}
+            else:
+                counters = await self.count_all()
+
+        return {
+            'total_users': counters.get(USERS, 0),
+            'total_companies': counters.get(COMPANIES, 0),
+            'total_coupons': counters.get(COUPONS, 0),
+            'used_coupons': counters.get(USED_COUPONS, 0),
+            'active_collaborations': counters.get(ACTIVE_COLLABORATIONS, 0),
+            'reconciled_at': counters.get('reconciled_at', 0),
+        }
+
+
+class StatsReconciler:
+    """
+    Фоновая сверка счетчиков статистики с БД.
+    В каждом интервале сверку выполняет только один процесс
+    """
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.lock_ttl = max(1, int(interval * 0.9))
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run(), name="stats-reconciler")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                async with AsyncSessionLocal() as session:
+                    drift = await ReportService(session).reconcile_exclusive(self.lock_ttl)
+                if drift:
+                    logger.info(f"Счетчики статистики исправлены сверкой: {drift}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка сверки счетчиков статистики: {e}")
+
+            await asyncio.sleep(self.interval)
+
+
+stats_reconciler = StatsReconciler(config.STATS_RECONCILE_INTERVAL)
@@ -1,13 +1,15 @@
 # role_service.py
-from typing import Any, Coroutine, List, Tuple
+import functools
+import operator
+from typing import Any, Coroutine, Iterable, List, Tuple
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete
+from sqlalchemy import select, delete, or_
 from datetime import date, timedelta
 
-from sqlalchemy.testing.suite.test_reflection import users
-
+from services.identity_service import IdentityService, RoleTuple
 from utils.database.models import User, UserRole
+from utils.pagination import Page, paginate
 from utils.config import config
 import logging
 
@@ -55,7 +57,7 @@ class RoleService:
         """
         Назначает роль пользователю
         Args:
-            user_id: ID пользователя
+            user_id: ID пользователя (внутренний или Telegram ID)
             role_name: Название роли
             company_id: ID компании
             location_id: ID локации (опционально)
@@ -85,8 +87,22 @@ class RoleService:
 
         self.session.add(user_role)
         await self.session.commit()
+        await self._invalidate_identity(user_id)
         return user_role
 
+    async def _invalidate_identity(self, user_id: int) -> None:
+        """
+        Сбрасывает кэш идентификации владельца роли.
+        UserRole.user_id бывает и Telegram ID, и внутренним ID, а кэш
+        ведется по Telegram ID, поэтому сбрасываются оба ключа
+        """
+        tg_ids = set((await self.session.scalars(
+            select(User.id_tg).where(or_(User.id == user_id, User.id_tg == user_id))
+        )).all())
+        tg_ids.add(user_id)
+        for tg_id in tg_ids:
+            await IdentityService.invalidate(tg_id)
+
     async def get_user_roles(self, user_id: int) -> list[UserRole]:
         """
         Получает роли пользователя
@@ -99,34 +115,92 @@ class RoleService:
         result = await self.session.execute(stmt)
         return result.scalars().all()
 
-    async def has_permission(self, user_id: int, permission: str) -> bool:
+    async def has_permission(
+            self,
+            tg_id: int,
+            permission: str,
+            company_id: int = None,
+            location_id: int = None
+    ) -> bool:
         """
         Проверяет наличие разрешения у пользователя
         Args:
-            user_id: ID пользователя
+            tg_id: Telegram ID пользователя (User.id_tg, не внутренний User.id)
             permission: Требуемое разрешение
+            company_id: Проверять только роли в этой компании (опционально)
+            location_id: Проверять только роли в этой локации (опционально)
         Returns:
             bool: True если разрешение есть
         """
-        # Получаем пользователя по ID
-        user = await self.session.get(User, user_id)
-        if not user:
-            return False
-
         # Если OWNER_ID задан и Telegram ID пользователя совпадает с OWNER_ID, то разрешаем всё
-        if config.OWNER_ID and user.id_tg == config.OWNER_ID:
+        if config.OWNER_ID and tg_id == config.OWNER_ID:
             return True
 
-        # Получаем роли пользователя
-        roles = await self.get_user_roles(user_id)
+        bit = PERMISSION_BITS.get(permission, 0)
+        if not bit:
+            return False
 
-        # Проверяем разрешения для каждой роли
-        for role in roles:
-            permissions = self.PERMISSION_MAP.get(role.role, [])
-            if permission in permissions:
-                return True
+        identity = await IdentityService(self.session).resolve(tg_id)
+        if not identity:
+            return False
+        return bool(effective_mask(identity.roles, company_id, location_id) & bit)
 
-        return False
+    async def get_permissions(
+            self,
+            tg_id: int,
+            permissions: Iterable[str],
+            company_id: int = None,
+            location_id: int = None
+    ) -> dict[str, bool]:
+        """
+        Проверяет сразу несколько разрешений одного пользователя
+        Args:
+            tg_id: Telegram ID пользователя (User.id_tg, не внутренний User.id)
+            permissions: Проверяемые разрешения
+            company_id: ID компании (опционально)
+            location_id: ID локации (опционально)
+        Returns:
+            dict[str, bool]: Результат проверки для каждого разрешения
+        """
+        permissions = list(permissions)
+        if config.OWNER_ID and tg_id == config.OWNER_ID:
+            return dict.fromkeys(permissions, True)
+
+        identity = await IdentityService(self.session).resolve(tg_id)
+        mask = effective_mask(identity.roles, company_id, location_id) if identity else 0
+        return {
+            permission: bool(mask & PERMISSION_BITS.get(permission, 0))
+            for permission in permissions
+        }
+
+    async def users_with_permission(
+            self,
+            tg_ids: Iterable[int],
+            permission: str,
+            company_id: int = None,
+            location_id: int = None
+    ) -> dict[int, bool]:
+        """
+        Проверяет одно разрешение сразу у нескольких пользователей
+        Args:
+            tg_ids: Telegram ID пользователей
+            permission: Требуемое разрешение
+            company_id: ID компании (опционально)
+            location_id: ID локации (опционально)
+        Returns:
+            dict[int, bool]: Результат проверки для каждого Telegram ID
+        """
+        bit = PERMISSION_BITS.get(permission, 0)
+        identities = await IdentityService(self.session).resolve_many(list(tg_ids))
+        result = {}
+        for tg_id, identity in identities.items():
+            if config.OWNER_ID and tg_id == config.OWNER_ID:
+                result[tg_id] = True
+            elif identity is None or not bit:
+                result[tg_id] = False
+            else:
+                result[tg_id] = bool(effective_mask(identity.roles, company_id, location_id) & bit)
+        return result
 
     async def remove_role(
             self,
@@ -139,7 +213,7 @@ class RoleService:
         Удаляет роль пользователя
 
         Args:
-            user_id: ID пользователя в Telegram
+            user_id: ID пользователя (внутренний или Telegram ID)
             company_id: ID компании
             role_name: Название роли (если None - удаляет все роли пользователя в компании/локации)
             location_id: ID локации (если None - удаляет роли в рамках всей компании)
@@ -160,9 +234,30 @@ class RoleService:
 
         result = await self.session.execute(stmt)
         await self.session.commit()
+        await self._invalidate_identity(user_id)
 
         return result.rowcount > 0
 
+    def _roles_in_loc_stmt(
+            self,
+            company_id: int,
+            role_name: str = None,
+            location_id: int = None
+    ):
+        stmt = select(UserRole, User).join(
+            User, UserRole.user_id == User.id_tg
+        ).where(
+            UserRole.company_id == company_id
+        )
+
+        if role_name:
+            stmt = stmt.where(UserRole.role == role_name)
+
+        if location_id:
+            stmt = stmt.where(UserRole.location_id == location_id)
+
+        return stmt
+
     async def get_roles_in_loc(
             self,
             company_id: int,
@@ -180,17 +275,69 @@ class RoleService:
         Returns:
             List[Tuple[UserRole, User]]: Список пар объектов UserRole и User
         """
-        stmt = select(UserRole, User).join(
-            User, UserRole.user_id == User.id_tg
-        ).where(
-            UserRole.company_id == company_id
-        )
+        stmt = self._roles_in_loc_stmt(company_id, role_name, location_id)
+        result = await self.session.execute(stmt)
+        return result.all()
 
-        if role_name:
-            stmt = stmt.where(UserRole.role == role_name)
+    async def get_roles_in_loc_page(
+            self,
+            company_id: int,
+            role_name: str = None,
+            location_id: int = None,
+            page: int = 0,
+            per_page: int = 8
+    ) -> Page[Tuple[UserRole, User]]:
+        """
+        Получает одну страницу пар (UserRole, User) для заданных условий
 
-        if location_id:
-            stmt = stmt.where(UserRole.location_id == location_id)
+        Args:
+            company_id: ID компании
+            role_name: Название роли (опционально)
+            location_id: ID локации (опционально)
+            page: Номер страницы
+            per_page: Элементов на странице
 
-        result = await self.session.execute(stmt)
-        return result.all()
+        Returns:
+            Page[Tuple[UserRole, User]]: Страница пар UserRole и User
+        """
+        stmt = self._roles_in_loc_stmt(company_id, role_name, location_id).order_by(UserRole.id)
+        return await paginate(self.session, stmt, page, per_page, scalars=False)
+
+
+def _compile_permissions(permission_map: dict[str, list[str]]) -> tuple[dict[str, int], dict[str, int]]:
+    """
+    Переводит карту разрешений в битовые маски:
+    каждому разрешению - свой бит, каждой роли - OR битов ее разрешений
+    """
+    bits: dict[str, int] = {}
+    for permissions in permission_map.values():
+        for permission in permissions:
+            bits.setdefault(permission, 1 << len(bits))
+    masks = {
+        role: functools.reduce(operator.or_, (bits[p] for p in permissions), 0)
+        for role, permissions in permission_map.items()
+    }
+    return bits, masks
+
+
+PERMISSION_BITS, ROLE_MASKS = _compile_permissions(RoleService.PERMISSION_MAP)
+
+
+@functools.lru_cache(maxsize=4096)
+def effective_mask(
+        roles: frozenset[RoleTuple],
+        company_id: int | None = None,
+        location_id: int | None = None
+) -> int:
+    """
+    Итоговая маска разрешений набора ролей в заданной области.
+    Роль без локации действует на все локации своей компании
+    """
+    mask = 0
+    for role, role_company_id, role_location_id in roles:
+        if company_id is not None and role_company_id != company_id:
+            continue
+        if location_id is not None and role_location_id not in (None, location_id):
+            continue
+        mask |= ROLE_MASKS.get(role, 0)
+    return mask
@@ -1,5 +1,6 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, delete
+from sqlalchemy.orm import joinedload
 from utils.database.models import TgGroup
 from typing import List, Optional
 
@@ -14,8 +15,8 @@ class TgGroupService:
         return result.scalars().all()
 
     async def get_group_by_id(self, group_id: int) -> Optional[TgGroup]:
-        """Получает группу по ID"""
-        return await self.session.get(TgGroup, group_id)
+        """Получает группу по ID вместе с компанией"""
+        return await self.session.get(TgGroup, group_id, options=[joinedload(TgGroup.company)])
 
     async def create_group(
         self,
@@ -1,6 +1,7 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from utils.database.models import User, UserRole
+from services.identity_service import IdentityService
+from utils.database.models import User
 
 class UserService:
     """Сервис для работы с пользователями"""
@@ -70,15 +71,5 @@ class UserService:
         Returns:
             bool: True если администратор
         """
-        # Находим внутренний ID пользователя
-        user = await self.get_user_by_tg_id(user_id)
-        if not user:
-            return False
-        
-        # Проверяем наличие роли admin
-        stmt = select(UserRole).where(
-            (UserRole.user_id == user.id) &
-            (UserRole.role == "admin")
-        )
-        result = await self.session.execute(stmt)
-        return result.scalar() is not None
\ No newline at end of file
+        identity = await IdentityService(self.session).resolve(user_id)
+        return identity is not None and identity.has_role("admin")
@@ -0,0 +1,152 @@
+"""
+Общие настройки тестов.
+
+Тесты не требуют MySQL и Redis: БД - файл SQLite (aiosqlite) во временной
+папке теста, Redis - fakeredis в тех тестах, где он нужен. Асинхронные
+тесты и фикстуры выполняет pytest-asyncio (asyncio_mode = auto в pytest.ini);
+без него асинхронные тесты пропускаются.
+"""
+import inspect
+import os
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+# Настройки читаются при импорте utils.config, поэтому задаются до импорта модулей бота
+os.environ.setdefault('BOT_TG_TOKEN', '123456:TEST-TOKEN')
+os.environ.setdefault('REDIS_PREFIX', 'test')
+os.environ.setdefault('COUPON_CODE_SECRET', 'test-secret')
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pytest
+from sqlalchemy import BigInteger
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.ext.compiler import compiles
+
+try:
+    import pytest_asyncio
+except ImportError:
+    pytest_asyncio = None
+
+from utils.database.models import (Base, CompLocation, Company, CouponStatus, CouponStatusHelper, CouponType,
+                                   User)
+
+
+@compiles(BigInteger, 'sqlite')
+def _sqlite_bigint(type_, compiler, **kw):
+    # Автоинкремент в SQLite есть только у INTEGER PRIMARY KEY
+    return 'INTEGER'
+
+
+async def _seed(session) -> None:
+    """Справочник статусов, два пользователя, две компании с главными локациями"""
+    session.add_all([
+        CouponStatus(id_status=status_id, name=name)
+        for name, status_id in CouponStatusHelper.STATUS_MAP.items()
+    ])
+    session.add_all([
+        User(id=1, id_tg=1001, first_name='Иван', last_name='Партнер', tel_num='70000000001'),
+        User(id=2, id_tg=1002, first_name='Петр', last_name='Агент', tel_num='70000000002'),
+        Company(id_comp=1, Name_comp='Партнер'),
+        Company(id_comp=2, Name_comp='Агент'),
+        CompLocation(id_location=1, id_comp=1, name_loc='Партнер, главная', main_loc=True),
+        CompLocation(id_location=2, id_comp=2, name_loc='Агент, главная', main_loc=True),
+    ])
+    await session.commit()
+
+
+def pytest_collection_modifyitems(items):
+    if pytest_asyncio is not None:
+        return
+    skip = pytest.mark.skip(reason="асинхронные тесты выполняет pytest-asyncio")
+    for item in items:
+        if inspect.iscoroutinefunction(getattr(item, 'function', None)):
+            item.add_marker(skip)
+
+
+@pytest.fixture
+async def engine(tmp_path):
+    """Движок тестовой БД с таблицами и базовыми данными; закрывается после теста"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+        await _seed(session)
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    """Фабрика сессий тестовой БД: у каждого участника гонки своя сессия"""
+    return async_sessionmaker(engine, expire_on_commit=False, autoflush=False)
+
+
+@pytest.fixture
+async def session(session_factory):
+    """Сессия тестовой БД"""
+    async with session_factory() as session:
+        yield session
+
+
+@pytest.fixture
+def make_coupon_type():
+    """
+    Фабрика коллабораций: партнер - компания 1, агент - компания 2
+    Returns:
+        Callable: async (session, **fields) -> CouponType
+    """
+    async def create(session, **fields) -> CouponType:
+        values = {
+            'code_prefix': 'TST',
+            'company_id': 1,
+            'location_id': 1,
+            'discount_percent': 10,
+            'commission_percent': 5,
+            'usage_limit': 0,
+            'start_date': date.today(),
+            'end_date': date.today() + timedelta(days=30),
+            'company_agent_id': 2,
+            'location_agent_id': 2,
+            'days_for_used': 7,
+            'agent_agree': True,
+            'is_active': True,
+        }
+        values.update(fields)
+        coupon_type = CouponType(**values)
+        session.add(coupon_type)
+        await session.commit()
+        return coupon_type
+    return create
+
+
+@pytest.fixture
+def fake_redis():
+    """Асинхронный клиент fakeredis; тест пропускается, если fakeredis не установлен"""
+    fakeredis = pytest.importorskip('fakeredis')
+    return fakeredis.FakeAsyncRedis()
+
+
+@pytest.fixture(scope='session')
+def dispatcher():
+    """Диспетчер с middleware воркера; роутер подключается к диспетчеру один раз за процесс"""
+    from fake_telegram import build_dispatcher
+    return build_dispatcher()
+
+
+@pytest.fixture
+def telegram(dispatcher, session_factory, fake_redis, monkeypatch):
+    """
+    Бот с фиктивным Bot API: сессии БД открываются в тестовой БД,
+    кэш идентификации хранится в fakeredis
+    """
+    pytest.importorskip('lupa', reason="запись в кэш идентификации использует Lua-скрипт fakeredis")
+    import middlewares.database_middleware as database_middleware
+    import services.identity_service as identity_service
+    from fake_telegram import FakeTelegram
+
+    monkeypatch.setattr(database_middleware, 'async_session', session_factory)
+    monkeypatch.setattr(identity_service, 'redis', fake_redis)
+    monkeypatch.setattr(identity_service, 'identity_cache', identity_service.IdentityCache(100, 60, 600))
+    return FakeTelegram(dispatcher)
@@ -0,0 +1,97 @@
+"""
+Фиктивный Bot API для тестов обработчиков.
+
+Обновление проходит через настоящий Dispatcher с теми же middleware, что
+регистрирует main.py для воркера, а запросы бота к Telegram записываются
+вместо отправки.
+"""
+import itertools
+import time
+from pathlib import Path
+from typing import Any, AsyncGenerator, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import GetMe, SendDocument, SendMessage, SendPhoto, TelegramMethod
+from aiogram.types import Chat, FSInputFile, Message, Update, User
+
+from handlers import admin_handlers, client_handlers, common_handlers, owner_handlers
+from middlewares import DatabaseMiddleware, RoleMiddleware
+
+
+class FakeTelegramSession(BaseSession):
+    """
+    Сессия Bot API, которая записывает запросы и отвечает успехом.
+    Содержимое отправленных файлов читается сразу: обработчик может
+    удалить временный файл после отправки
+    """
+    def __init__(self):
+        super().__init__()
+        self.requests: list[TelegramMethod] = []
+        self.documents: list[tuple[str, bytes]] = []
+
+    async def make_request(self, bot: Bot, method: TelegramMethod, timeout: Optional[int] = None) -> Any:
+        self.requests.append(method)
+        if isinstance(method, SendDocument) and isinstance(method.document, FSInputFile):
+            self.documents.append((method.document.filename, Path(method.document.path).read_bytes()))
+        if isinstance(method, GetMe):
+            return User(id=bot.id, is_bot=True, first_name='Бот', username='test_bot')
+        if isinstance(method, (SendMessage, SendDocument, SendPhoto)):
+            return Message(
+                message_id=len(self.requests),
+                date=int(time.time()),
+                chat=Chat(id=method.chat_id, type='private'),
+                text=getattr(method, 'text', None),
+            )
+        return True
+
+    async def stream_content(self, url: str, headers: Optional[dict] = None, timeout: int = 30,
+                             chunk_size: int = 65536, raise_for_status: bool = True) -> AsyncGenerator[bytes, None]:
+        yield b''
+
+    async def close(self) -> None:
+        pass
+
+
+def build_dispatcher() -> Dispatcher:
+    """Диспетчер с middleware воркера и роутерами, которые проверяют тесты"""
+    dp = Dispatcher()
+    dp.update.middleware(DatabaseMiddleware())
+    dp.message.middleware(RoleMiddleware())
+    dp.callback_query.middleware(RoleMiddleware())
+    dp.include_router(common_handlers.router)
+    dp.include_router(owner_handlers.router)
+    dp.include_router(admin_handlers.router)
+    dp.include_router(client_handlers.router)
+    return dp
+
+
+class FakeTelegram:
+    """Бот с фиктивной сессией и отправка ему сообщений от пользователей"""
+    _update_ids = itertools.count(1)
+
+    def __init__(self, dp: Dispatcher):
+        self.dp = dp
+        self.session = FakeTelegramSession()
+        self.bot = Bot(token='42:TEST', session=self.session)
+
+    async def send(self, tg_id: int, text: str) -> list[TelegramMethod]:
+        """
+        Передает диспетчеру сообщение пользователя
+        Returns:
+            list[TelegramMethod]: Запросы бота, сделанные при обработке
+        """
+        update_id = next(self._update_ids)
+        update = Update.model_validate({
+            'update_id': update_id,
+            'message': {
+                'message_id': update_id,
+                'date': int(time.time()),
+                'chat': {'id': tg_id, 'type': 'private'},
+                'from': {'id': tg_id, 'is_bot': False, 'first_name': 'Тест'},
+                'text': text,
+            },
+        }, context={'bot': self.bot})
+        sent = len(self.session.requests)
+        await self.dp.feed_update(self.bot, update)
+        return self.session.requests[sent:]
@@ -0,0 +1,49 @@
+"""
+Подсчет действий по сводкам журнала.
+
+Сводки заполняются напрямую: запись в журнал использует MySQL-специфичный
+INSERT ... ON DUPLICATE KEY UPDATE. Часовые сводки лежат так, как их
+оставляет очистка: только за последние ACTION_LOG_HOURLY_ROLLUP_DAYS дней.
+"""
+from datetime import datetime, timedelta
+
+from repositories.action_log_repository import ActionLogRepository, _day_start
+from utils.config import config
+from utils.database.models import ActionLogRollup
+
+PER_HOUR = 1
+DAYS = config.ACTION_LOG_HOURLY_ROLLUP_DAYS + 10
+
+
+async def _fill_rollups(session, now: datetime) -> None:
+    """Одно действие в час за DAYS полных дней до сегодняшнего"""
+    horizon = now - timedelta(days=config.ACTION_LOG_HOURLY_ROLLUP_DAYS)
+    today = _day_start(now)
+    rows = []
+    for day in range(1, DAYS + 1):
+        day_start = today - timedelta(days=day)
+        rows.append(ActionLogRollup(action_type='coupon_redeemed', period='day',
+                                    bucket_start=day_start, count=24 * PER_HOUR))
+        for hour in range(24):
+            bucket = day_start + timedelta(hours=hour)
+            if bucket >= horizon:
+                rows.append(ActionLogRollup(action_type='coupon_redeemed', period='hour',
+                                            bucket_start=bucket, count=PER_HOUR))
+    session.add_all(rows)
+    await session.commit()
+
+
+async def test_count_within_hourly_horizon_is_exact_to_the_hour(session):
+    now = datetime.now()
+    await _fill_rollups(session, now)
+    since = _day_start(now) - timedelta(days=3) + timedelta(hours=15)
+    # 9 часов первого дня и два полных дня
+    assert await ActionLogRepository(session).get_action_count('coupon_redeemed', since) == 9 + 48
+
+
+async def test_count_beyond_hourly_horizon_uses_day_rollups(session):
+    now = datetime.now()
+    await _fill_rollups(session, now)
+    since = _day_start(now) - timedelta(days=DAYS) + timedelta(hours=15)
+    # Часовых сводок за первый день уже нет: он считается целиком
+    assert await ActionLogRepository(session).get_action_count('coupon_redeemed', since) == 24 * DAYS
@@ -0,0 +1,50 @@
+"""
+Команды администратора через настоящий Dispatcher.
+"""
+from datetime import date, timedelta
+
+import pytest
+from aiogram.methods import SendMessage, SendPhoto
+
+import handlers.admin_handlers as admin_handlers
+import services.qr_service as qr_service_module
+from utils.database.models import UserRole
+
+ADMIN_TG_ID = 1002
+
+
+@pytest.fixture(autouse=True)
+async def qr(monkeypatch, telegram, fake_redis):
+    monkeypatch.setattr(admin_handlers, 'bot', telegram.bot)
+    monkeypatch.setattr(qr_service_module, 'redis', fake_redis)
+    monkeypatch.setattr(qr_service_module.qr_service, 'executor_kind', 'thread')
+    monkeypatch.setattr(qr_service_module.qr_service, '_executor', None)
+    yield
+    await qr_service_module.qr_service.stop()
+
+
+async def _make_admin(session, company_id: int, location_id: int) -> None:
+    session.add(UserRole(user_id=2, role='admin', company_id=company_id, location_id=location_id,
+                         start_date=date.today(), end_date=date.today() + timedelta(days=365), changed_by=1))
+    await session.commit()
+
+
+async def test_location_admin_receives_qr_sheet(telegram, session, make_coupon_type):
+    await make_coupon_type(session)
+    await _make_admin(session, company_id=1, location_id=1)
+
+    requests = await telegram.send(ADMIN_TG_ID, "/get_location_qr 1")
+
+    [photo] = [request for request in requests if isinstance(request, SendPhoto)]
+    assert "QR для выдачи купонов в локации `1`" in photo.caption
+
+
+async def test_admin_of_another_location_is_refused(telegram, session, make_coupon_type):
+    await make_coupon_type(session)
+    await _make_admin(session, company_id=2, location_id=2)
+
+    requests = await telegram.send(ADMIN_TG_ID, "/get_location_qr 1")
+
+    assert [request.text for request in requests if isinstance(request, SendMessage)] == [
+        "❌ Только для администраторов этой локации"
+    ]
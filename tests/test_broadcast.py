@@ -0,0 +1,75 @@
+"""
+Создание и выборка получателей рассылки о коллаборации.
+"""
+import asyncio
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+import services.broadcast_service as broadcast_service
+from services.broadcast_service import BroadcastService, Broadcaster
+from utils.database.models import Coupon, CouponStatus
+
+
+@pytest.fixture
+def broadcaster(monkeypatch, fake_redis):
+    monkeypatch.setattr(broadcast_service, 'redis', fake_redis)
+    broadcaster = Broadcaster(bot=None, chunk_size=10, concurrency=1, rate=10, lease_ttl=30)
+    broadcaster.spawned = []
+    monkeypatch.setattr(broadcaster, '_spawn', broadcaster.spawned.append)
+    return broadcaster
+
+
+async def test_concurrent_starts_create_one_complete_job(broadcaster, session_factory, session,
+                                                         make_coupon_type, fake_redis):
+    collaboration_id = (await make_coupon_type(session)).id_coupon_type
+
+    async def start():
+        async with session_factory() as other:
+            return await broadcaster.start_collab_broadcast(other, collaboration_id)
+
+    ids = await asyncio.gather(*(start() for _ in range(5)))
+
+    broadcast_id = f"collab-{collaboration_id}"
+    assert ids == [broadcast_id] * 5
+    assert broadcaster.spawned == [broadcast_id]
+    job = await fake_redis.hgetall(broadcaster._key(broadcast_id))
+    assert {k.decode() for k in job} == {
+        'company_id', 'text', 'last_user_id', 'sent', 'failed', 'started_at', 'status'
+    }
+    assert await fake_redis.smembers(broadcaster._active_key()) == {broadcast_id.encode()}
+
+
+async def test_interrupted_start_leaves_no_partial_job(broadcaster, session, make_coupon_type, fake_redis,
+                                                      monkeypatch):
+    collaboration_id = (await make_coupon_type(session)).id_coupon_type
+
+    def crash():
+        raise RuntimeError("процесс остановлен")
+
+    # Падение процесса при подготовке задания
+    with monkeypatch.context() as patch, pytest.raises(RuntimeError):
+        patch.setattr(broadcast_service, 'time', SimpleNamespace(time=crash))
+        await broadcaster.start_collab_broadcast(session, collaboration_id)
+
+    broadcast_id = await broadcaster.start_collab_broadcast(session, collaboration_id)
+    assert broadcaster.spawned == [broadcast_id]
+    assert await fake_redis.hget(broadcaster._key(broadcast_id), 'status') == b'running'
+
+
+async def test_clients_chunk_pages_company_clients_by_user_id(session, make_coupon_type):
+    coupon_type = await make_coupon_type(session)
+    session.add_all([
+        Coupon(code=f"BC-{i}", coupon_type_id=coupon_type.id_coupon_type, client_id=client_id,
+               issued_by=1, end_date=date.today() + timedelta(days=7),
+               status_id=CouponStatus.get_status_id("active"))
+        for i, client_id in enumerate((2, 1, 2))
+    ])
+    await session.commit()
+
+    service = BroadcastService(session)
+    assert await service.company_clients_chunk(1, 0, 1) == [(1, 1001)]
+    assert await service.company_clients_chunk(1, 1, 1) == [(2, 1002)]
+    assert await service.company_clients_chunk(1, 2, 1) == []
+    assert await service.company_clients_chunk(2, 0, 10) == []
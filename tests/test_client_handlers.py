@@ -0,0 +1,64 @@
+"""
+Купоны клиента: Coupon.client_id хранит внутренний ID пользователя.
+
+Купон выдается по Telegram ID из deep-link, а находится в "Моих купонах"
+по снимку идентификации; купоны, выданные раньше по Telegram ID,
+переводятся на внутренний ID при старте.
+"""
+from datetime import date, timedelta
+
+import pytest
+from aiogram.methods import SendMessage
+from sqlalchemy import select
+
+import utils.stats_counters as stats_counters_module
+from services.coupon_service import CouponService
+from utils.database.models import Coupon, CouponStatus
+
+CLIENT_TG_ID = 1002
+ADMIN_TG_ID = 1001
+
+
+@pytest.fixture(autouse=True)
+def redis(monkeypatch, fake_redis):
+    monkeypatch.setattr(stats_counters_module, 'redis', fake_redis)
+    return fake_redis
+
+
+def _texts(requests) -> list[str]:
+    return [request.text for request in requests if isinstance(request, SendMessage)]
+
+
+async def test_coupon_issued_by_deep_link_is_listed_in_my_coupons(telegram, make_coupon_type, session):
+    collaboration_id = (await make_coupon_type(session)).id_coupon_type
+    result = await CouponService(session).issue_coupon_to_client(
+        client_id=CLIENT_TG_ID,
+        collaboration_id=collaboration_id,
+        admin_tg_id=ADMIN_TG_ID,
+        location_id=1
+    )
+    code = result.split('`')[1]
+
+    [text] = _texts(await telegram.send(CLIENT_TG_ID, "Мои купоны"))
+
+    assert f"🎫 Купон: {code}" in text
+    assert await session.scalar(select(Coupon.client_id).where(Coupon.code == code)) == 2
+    assert await CouponService(session).issue_coupon_to_client(
+        CLIENT_TG_ID, collaboration_id, ADMIN_TG_ID, 1
+    ) == "⚠️ Вы уже получали этот купон ранее"
+
+
+async def test_backfill_moves_coupons_issued_by_telegram_id(session, make_coupon_type):
+    coupon_type = await make_coupon_type(session)
+    session.add_all([
+        Coupon(code=code, coupon_type_id=coupon_type.id_coupon_type, client_id=client_id, issued_by=1,
+               end_date=date.today() + timedelta(days=7), status_id=CouponStatus.get_status_id("active"))
+        for code, client_id in [('LEGACY', CLIENT_TG_ID), ('CURRENT', 1)]
+    ])
+    await session.commit()
+
+    assert await CouponService(session).backfill_client_ids() == 1
+    assert await CouponService(session).backfill_client_ids() == 0
+
+    rows = dict((await session.execute(select(Coupon.code, Coupon.client_id))).all())
+    assert rows == {'LEGACY': 2, 'CURRENT': 1}
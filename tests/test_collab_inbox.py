@@ -0,0 +1,39 @@
+"""
+Счетчик входящих запросов на коллаборацию.
+
+Число на кнопке "Запросы (N)" берется из множества в Redis, список - из БД.
+Тесты проверяют, что после ответа агента и после потери ключа в Redis
+они совпадают.
+"""
+import pytest
+
+import services.collab_inbox as collab_inbox_module
+from services.collab_inbox import CollabInbox
+from services.coupon_service import CouponService
+
+
+@pytest.fixture
+def inbox(monkeypatch, fake_redis):
+    monkeypatch.setattr(collab_inbox_module, 'redis', fake_redis)
+    return CollabInbox()
+
+
+async def _answer(session, inbox: CollabInbox, coupon_type_id: int, status: bool) -> None:
+    coupon_type = await CouponService(session).set_collab_status(coupon_type_id, status)
+    await inbox.remove(coupon_type.company_agent_id, coupon_type_id)
+
+
+async def test_answered_requests_leave_counter_and_list(session, make_coupon_type, inbox, fake_redis):
+    requests = [await make_coupon_type(session, agent_agree=False, is_active=False) for _ in range(3)]
+    assert await inbox.unread(session, 2) == 3
+
+    await _answer(session, inbox, requests[0].id_coupon_type, True)
+    await _answer(session, inbox, requests[1].id_coupon_type, False)
+
+    listed = await CouponService(session).get_collaboration_requests(2, 2)
+    assert [row.id_coupon_type for row in listed] == [requests[2].id_coupon_type]
+    assert await inbox.unread(session, 2) == 1
+
+    # Ключ потерян: заполнение из БД не возвращает отклоненный запрос
+    await fake_redis.flushall()
+    assert await inbox.unread(session, 2) == 1
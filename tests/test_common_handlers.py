@@ -0,0 +1,34 @@
+"""
+Общие экраны пользователя через настоящий Dispatcher.
+"""
+from datetime import date, timedelta
+
+from aiogram.methods import SendMessage
+
+from utils.database.models import UserRole
+
+
+def _texts(requests) -> list[str]:
+    return [request.text for request in requests if isinstance(request, SendMessage)]
+
+
+async def test_profile_lists_roles_stored_by_either_id(telegram, session):
+    session.add_all([
+        UserRole(user_id=user_id, role=role, company_id=company_id, start_date=date.today(),
+                 end_date=date.today() + timedelta(days=365), changed_by=1)
+        for user_id, role, company_id in [(1, 'partner', 1), (1001, 'admin', 2)]
+    ])
+    await session.commit()
+
+    [text] = _texts(await telegram.send(1001, "Мой профиль"))
+
+    assert "▫️ ID: 1\n" in text
+    assert "▫️ Имя: Иван Партнер" in text
+    assert "▫️ Telegram ID: 1001" in text
+    assert text.endswith("- partner в компании ID 1\n- admin в компании ID 2")
+
+
+async def test_profile_of_unregistered_user_points_to_start(telegram):
+    assert _texts(await telegram.send(5005, "Мой профиль")) == [
+        "Вы еще не зарегистрированы. Отправьте /start"
+    ]
@@ -0,0 +1,35 @@
+"""
+Коды купонов и ключ COUPON_CODE_SECRET.
+"""
+import importlib
+
+import pytest
+
+import utils.coupon_codes as coupon_codes
+from utils.config import config
+
+
+@pytest.fixture
+def without_secret(monkeypatch):
+    monkeypatch.setattr(config, 'COUPON_CODE_SECRET', '')
+    coupon_codes._keys.cache_clear()
+    yield
+    monkeypatch.undo()
+    coupon_codes._keys.cache_clear()
+
+
+def test_codes_are_distinct_and_valid():
+    codes = {coupon_codes.make_coupon_code('TST', 7, seq) for seq in range(1000)}
+    assert len(codes) == 1000
+    assert all(coupon_codes.is_valid_coupon_code(code) for code in codes)
+
+
+def test_missing_secret_fails_on_startup_check_not_on_import(without_secret):
+    # Модуль импортируют обработчики, которым ключ не нужен (проверка формата кода)
+    importlib.reload(coupon_codes)
+    assert coupon_codes.is_valid_coupon_code(coupon_codes.normalize_coupon_code('tst-0123abcd'))
+
+    with pytest.raises(RuntimeError, match="COUPON_CODE_SECRET не задан"):
+        coupon_codes.check_secret()
+    with pytest.raises(RuntimeError, match="COUPON_CODE_SECRET не задан"):
+        coupon_codes.make_coupon_code('TST', 7, 1)
@@ -0,0 +1,92 @@
+"""
+Гонки при погашении купонов.
+
+Каждый участник гонки работает в своей сессии и своем соединении с БД.
+SQLite сериализует запись, InnoDB блокирует строки, но в обоих случаях
+условный UPDATE видит результат уже зафиксированной конкурирующей
+транзакции, что и проверяют тесты: один код гасится ровно один раз,
+а лимит типа не превышается.
+"""
+import asyncio
+from datetime import date, timedelta
+from decimal import Decimal
+
+from sqlalchemy import select
+
+from repositories.coupon_repository import CouponRepository
+from utils.database.models import Coupon, CouponStatus, CouponType
+
+ACTIVE = CouponStatus.get_status_id("active")
+USED = CouponStatus.get_status_id("used")
+
+
+async def _add_active_coupons(session, coupon_type: CouponType, count: int) -> list[str]:
+    codes = [f"RACE-{coupon_type.id_coupon_type}-{i}" for i in range(count)]
+    session.add_all([
+        Coupon(code=code, coupon_type_id=coupon_type.id_coupon_type, client_id=2, issued_by=1,
+               end_date=date.today() + timedelta(days=7), status_id=ACTIVE)
+        for code in codes
+    ])
+    await session.commit()
+    return codes
+
+
+async def _redeem(session_factory, code: str, redeemed_by: int) -> bool:
+    async with session_factory() as session:
+        return await CouponRepository(session).redeem_coupon(
+            code=code,
+            redeemed_by=redeemed_by,
+            amount=Decimal('100.00'),
+            active_status_id=ACTIVE,
+            used_status_id=USED
+        )
+
+
+async def _used_count(session_factory, coupon_type: CouponType) -> int:
+    async with session_factory() as session:
+        return await session.scalar(
+            select(CouponType.used_count).where(CouponType.id_coupon_type == coupon_type.id_coupon_type)
+        )
+
+
+async def test_one_code_is_redeemed_once_by_concurrent_sessions(session, session_factory, make_coupon_type):
+    coupon_type = await make_coupon_type(session)
+    [code] = await _add_active_coupons(session, coupon_type, 1)
+
+    results = await asyncio.gather(*(_redeem(session_factory, code, redeemed_by=1) for _ in range(8)))
+
+    async with session_factory() as fresh:
+        coupon = await fresh.scalar(select(Coupon).where(Coupon.code == code))
+    assert sorted(results) == [False] * 7 + [True]
+    assert coupon.status_id == USED
+    assert await _used_count(session_factory, coupon_type) == 1
+
+
+async def test_usage_limit_holds_under_concurrent_redemption(session, session_factory, make_coupon_type):
+    coupon_type = await make_coupon_type(session, usage_limit=3)
+    codes = await _add_active_coupons(session, coupon_type, 8)
+
+    results = await asyncio.gather(
+        *(_redeem(session_factory, code, redeemed_by=1) for code in codes),
+        return_exceptions=True
+    )
+
+    async with session_factory() as fresh:
+        statuses = (await fresh.scalars(
+            select(Coupon.status_id).where(Coupon.coupon_type_id == coupon_type.id_coupon_type)
+        )).all()
+    assert results.count(True) == 3
+    assert all(isinstance(result, ValueError) for result in results if result is not True)
+    assert await _used_count(session_factory, coupon_type) == 3
+    # Погашение сверх лимита откатывается вместе с увеличением счетчика
+    assert statuses.count(USED) == 3
+    assert statuses.count(ACTIVE) == 5
+
+
+async def test_expired_coupon_is_not_redeemed(session, session_factory, make_coupon_type):
+    coupon_type = await make_coupon_type(session)
+    session.add(Coupon(code='OLD-1', coupon_type_id=coupon_type.id_coupon_type, client_id=2, issued_by=1,
+                       end_date=date.today() - timedelta(days=1), status_id=ACTIVE))
+    await session.commit()
+
+    assert await _redeem(session_factory, 'OLD-1', redeemed_by=1) is False
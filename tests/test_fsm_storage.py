@@ -0,0 +1,51 @@
+"""
+Буферизованное хранилище FSM и очередь обновлений пользователя.
+
+Обновление изображается блоком BufferedEventIsolation.lock: внутри него
+обращения к FSM идут в буфер, а в Redis пишутся при выходе.
+"""
+import asyncio
+
+import pytest
+from aiogram.fsm.storage.redis import DefaultKeyBuilder
+from aiogram.fsm.storage.base import StorageKey
+
+from utils.fsm_storage import BufferedEventIsolation, BufferedRedisStorage
+from utils.keyed_lock import KeyedLock
+
+KEY = StorageKey(bot_id=1, chat_id=1001, user_id=1001)
+
+
+@pytest.fixture
+def storage(fake_redis):
+    return BufferedRedisStorage(fake_redis, key_builder=DefaultKeyBuilder(prefix='test'))
+
+
+async def test_writes_before_first_read_are_not_overwritten(storage):
+    await storage.set_state(KEY, 'old:state')
+    await storage.set_data(KEY, {'page': 1, 'company_id': 7})
+
+    async with storage.buffer(KEY):
+        await storage.set_state(KEY, 'new:state')
+        # Данные читаются из Redis, состояние остается записанным в буфере
+        assert await storage.get_data(KEY) == {'page': 1, 'company_id': 7}
+        assert await storage.get_state(KEY) == 'new:state'
+
+        await storage.set_data(KEY, {'page': 2})
+        assert await storage.get_data(KEY) == {'page': 2}
+
+    assert await storage.get_state(KEY) == 'new:state'
+    assert await storage.get_data(KEY) == {'page': 2}
+
+
+async def test_updates_of_one_user_do_not_lose_data(storage):
+    isolation = BufferedEventIsolation(storage, KeyedLock(max_queue=100))
+
+    async def toggle(i: int):
+        async with isolation.lock(KEY):
+            data = await storage.get_data(KEY)
+            await asyncio.sleep(0)
+            await storage.set_data(KEY, {'selected': data.get('selected', []) + [i]})
+
+    await asyncio.gather(*(toggle(i) for i in range(20)))
+    assert sorted((await storage.get_data(KEY))['selected']) == list(range(20))
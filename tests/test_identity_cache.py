@@ -0,0 +1,88 @@
+"""
+Кэш идентификации пользователей.
+
+resolve читает БД и затем записывает снимок в Redis. Тесты проверяют, что
+сброс кэша между этими шагами не дает записать устаревшие роли, и что
+RoleMiddleware при попадании в кэш не обращается к БД.
+"""
+import asyncio
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+import services.identity_service as identity_service
+from middlewares.role_middleware import RoleMiddleware
+from services.identity_service import IdentityCache, IdentityService
+from services.role_service import RoleService
+from utils.database.models import UserRole
+from utils.database.query_counter import QueryCounter
+
+pytest.importorskip('lupa', reason="запись в кэш использует Lua-скрипт fakeredis")
+
+
+@pytest.fixture(autouse=True)
+def cache(monkeypatch, fake_redis):
+    monkeypatch.setattr(identity_service, 'redis', fake_redis)
+    cache = IdentityCache(maxsize=100, local_ttl=60, redis_ttl=600)
+    monkeypatch.setattr(identity_service, 'identity_cache', cache)
+    return cache
+
+
+async def _grant(session, user_id: int, role: str) -> None:
+    session.add(UserRole(user_id=user_id, role=role, company_id=1, start_date=date.today(),
+                         end_date=date.today() + timedelta(days=365), changed_by=user_id))
+    await session.commit()
+
+
+async def test_invalidate_during_resolve_does_not_cache_stale_roles(session, session_factory, cache, monkeypatch):
+    loaded = asyncio.Event()
+    invalidated = asyncio.Event()
+    original_load = IdentityService._load
+
+    async def slow_load(self, tg_id):
+        identity = await original_load(self, tg_id)
+        loaded.set()
+        await invalidated.wait()
+        return identity
+
+    async def grant_role():
+        await loaded.wait()
+        async with session_factory() as other:
+            await _grant(other, 1, 'admin')
+        await IdentityService.invalidate(1001)
+        invalidated.set()
+
+    monkeypatch.setattr(IdentityService, '_load', slow_load)
+    stale, _ = await asyncio.gather(IdentityService(session).resolve(1001), grant_role())
+    monkeypatch.setattr(IdentityService, '_load', original_load)
+    assert not stale.has_role('admin')
+    assert cache.stale_writes == 1
+
+    assert (await IdentityService(session).resolve(1001)).has_role('admin')
+
+
+async def test_role_middleware_uses_cached_identity(engine, session):
+    middleware = RoleMiddleware()
+    seen = []
+
+    async def handler(event, data):
+        seen.append(data['identity'])
+
+    data = {'session': session, 'event_from_user': SimpleNamespace(id=1002)}
+    await middleware(handler, object(), dict(data))
+    async with QueryCounter(engine, limit=0):
+        await middleware(handler, object(), dict(data))
+    assert [identity.id for identity in seen] == [2, 2]
+
+
+@pytest.mark.parametrize('user_id', [1, 1001], ids=['internal_id', 'tg_id'])
+async def test_role_change_by_either_id_resets_cached_identity(session, user_id):
+    role_service = RoleService(session)
+    assert not await role_service.has_permission(1001, 'activate_coupons')
+
+    await role_service.assign_role_to_user(user_id=user_id, company_id=1, role_name='admin')
+    assert await role_service.has_permission(1001, 'activate_coupons')
+
+    await role_service.remove_role(user_id=user_id, company_id=1, role_name='admin')
+    assert not await role_service.has_permission(1001, 'activate_coupons')
@@ -0,0 +1,34 @@
+"""
+Очередь обновлений одного пользователя в KeyedLock.
+"""
+import asyncio
+
+import pytest
+
+from utils.keyed_lock import KeyedLock, QueueFull
+
+
+async def test_queue_holds_at_most_max_queue_updates():
+    locks = KeyedLock(max_queue=3)
+    release = asyncio.Event()
+
+    async def update():
+        async with locks.acquire(1):
+            await release.wait()
+
+    tasks = [asyncio.create_task(update()) for _ in range(3)]
+    await asyncio.sleep(0)
+    assert locks.depth(1) == 3
+
+    with pytest.raises(QueueFull):
+        async with locks.acquire(1):
+            pass
+    # Другие пользователи не ждут очереди первого
+    async with locks.acquire(2):
+        pass
+
+    release.set()
+    await asyncio.gather(*tasks)
+    assert len(locks) == 0
+    assert locks.stats()['rejected'] == 1
+    assert locks.stats()['depth_max'] == 3
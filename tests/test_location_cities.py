@@ -0,0 +1,64 @@
+"""
+Заполнение city_id у локаций, созданных до справочника городов.
+
+Фильтр компаний по городу смотрит только на city_id, поэтому без
+заполнения старые локации из поиска по городу пропадают.
+"""
+import asyncio
+
+from sqlalchemy import select, update
+
+import services.company_service as company_service
+from services.company_service import CompanyService
+from utils.database.models import City, CompanyCategory, CompLocation, LocCat
+
+
+async def _prepare(session) -> None:
+    session.add_all([
+        City(id=10, name='Москва'),
+        City(id=20, name='Казань'),
+        CompanyCategory(id=1, name='Кафе'),
+        LocCat(comp_id=1, id_location=1, id_category=1),
+        LocCat(comp_id=2, id_location=2, id_category=1),
+    ])
+    await session.flush()
+    # Старые записи: город по названию и город, сохраненный как ID
+    await session.execute(update(CompLocation).where(CompLocation.id_location == 1).values(city='Москва'))
+    await session.execute(update(CompLocation).where(CompLocation.id_location == 2).values(city='20'))
+    await session.commit()
+
+
+async def test_startup_backfill_makes_old_locations_searchable_by_city(session, session_factory, fake_redis,
+                                                                       monkeypatch):
+    monkeypatch.setattr(company_service, 'redis', fake_redis)
+    monkeypatch.setattr(company_service, 'AsyncSessionLocal', session_factory)
+    await _prepare(session)
+    assert await CompanyService(session).get_companies_filtered_by_loc(city=[10]) == []
+
+    await company_service.backfill_location_cities()
+
+    async with session_factory() as fresh:
+        locations = (await fresh.execute(
+            select(CompLocation.id_location, CompLocation.city_id, CompLocation.city)
+            .order_by(CompLocation.id_location)
+        )).all()
+        moscow = await CompanyService(fresh).get_companies_filtered_by_loc(city=[10])
+        kazan = await CompanyService(fresh).get_companies_filtered_by_loc(city=[20])
+    assert [tuple(row) for row in locations] == [(1, 10, 'Москва'), (2, 20, 'Казань')]
+    assert [company.id_comp for company in moscow] == [1]
+    assert [company.id_comp for company in kazan] == [2]
+
+
+async def test_startup_backfill_runs_in_one_process(session_factory, fake_redis, monkeypatch):
+    monkeypatch.setattr(company_service, 'redis', fake_redis)
+    monkeypatch.setattr(company_service, 'AsyncSessionLocal', session_factory)
+    calls = []
+    original = CompanyService.backfill_location_cities
+
+    async def counted(self):
+        calls.append(1)
+        return await original(self)
+
+    monkeypatch.setattr(CompanyService, 'backfill_location_cities', counted)
+    await asyncio.gather(*(company_service.backfill_location_cities() for _ in range(3)))
+    assert len(calls) == 1
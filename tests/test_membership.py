@@ -0,0 +1,94 @@
+"""
+Проверка подписки на группы с фиктивным ботом.
+
+FakeBot отвечает на get_chat_member с заданной задержкой, как Bot API,
+и считает запросы: по времени видно, что группы проверяются параллельно,
+по счетчику - что повторная проверка берется из кэша Redis.
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import services.membership_service as membership_service
+from services.membership_service import MembershipChecker
+
+LATENCY = 0.2
+
+
+class FakeBot:
+    """Bot API с задержкой ответа; statuses - статус пользователя в каждой группе"""
+    def __init__(self, statuses: dict[int, str], latency: float = LATENCY, delays: dict[int, float] = None):
+        self.statuses = statuses
+        self.latency = latency
+        self.delays = delays or {}
+        self.calls = 0
+
+    async def get_chat_member(self, chat_id: int, user_id: int):
+        self.calls += 1
+        await asyncio.sleep(self.delays.get(chat_id, self.latency))
+        status = self.statuses[chat_id]
+        if status == 'error':
+            raise RuntimeError("Bad Request: chat not found")
+        return SimpleNamespace(status=status)
+
+
+@pytest.fixture
+def checker(monkeypatch, fake_redis):
+    monkeypatch.setattr(membership_service, 'redis', fake_redis)
+    return MembershipChecker(concurrency=10, positive_ttl=300, negative_ttl=30)
+
+
+async def test_groups_are_checked_concurrently_and_cached(checker):
+    chat_ids = list(range(-110, -100))
+    bot = FakeBot({chat_id: 'member' for chat_id in chat_ids})
+
+    started = time.monotonic()
+    result = await checker.check_many(bot, chat_ids, user_id=1)
+    elapsed = time.monotonic() - started
+
+    # Последовательно 10 запросов заняли бы 10 * LATENCY
+    assert elapsed < 3 * LATENCY
+    assert result == {chat_id: True for chat_id in chat_ids}
+    assert bot.calls == 10
+
+    assert await checker.check_all(bot, chat_ids, user_id=1) is True
+    assert bot.calls == 10
+    assert checker.cache_hits == 10
+
+
+async def test_concurrency_limit_is_respected(monkeypatch, fake_redis):
+    monkeypatch.setattr(membership_service, 'redis', fake_redis)
+    checker = MembershipChecker(concurrency=2, positive_ttl=300, negative_ttl=30)
+
+    chat_ids = list(range(-106, -100))
+    bot = FakeBot({chat_id: 'member' for chat_id in chat_ids})
+
+    started = time.monotonic()
+    await checker.check_many(bot, chat_ids, user_id=1)
+    # 6 запросов по 2 одновременно - три волны
+    assert time.monotonic() - started >= 3 * LATENCY * 0.9
+
+
+async def test_check_all_stops_at_first_refusal(checker):
+    bot = FakeBot({-1: 'left', -2: 'member'}, delays={-1: 0.01, -2: 5})
+
+    started = time.monotonic()
+    assert await checker.check_all(bot, [-1, -2], user_id=1) is False
+    # Медленный запрос ко второй группе отменен, а не дожидается ответа
+    assert time.monotonic() - started < 1
+
+    # Отказ закэширован: повторная проверка не обращается к API
+    assert await checker.check_all(bot, [-1, -2], user_id=1) is False
+    assert bot.calls == 2
+
+
+async def test_api_errors_are_not_cached(checker):
+    bot = FakeBot({-1: 'error'}, latency=0)
+
+    assert await checker.is_member(bot, -1, user_id=1) is False
+    bot.statuses[-1] = 'member'
+    assert await checker.is_member(bot, -1, user_id=1) is True
+    assert bot.calls == 2
+    assert checker.api_errors == 1
@@ -0,0 +1,201 @@
+"""
+Очередь исходящих сообщений и ограничитель запросов с фиктивным Bot API.
+
+Несколько экземпляров Outbox с общим fakeredis изображают процессы бота:
+сообщения живого процесса никто не забирает, сообщения процесса с
+истекшей или снятой арендой забирает ровно один другой процесс.
+"""
+import asyncio
+
+import pytest
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from aiogram.methods import GetMe, SendMessage
+
+import utils.outbox as outbox_module
+from utils.outbox import Outbox
+from utils.rate_limiter import ThrottlingRequestMiddleware, TokenBucket
+
+pytest.importorskip('lupa', reason="аренда очереди использует Lua-скрипт fakeredis")
+
+
+class FakeBot:
+    """Bot API: записывает доставленные сообщения; errors - ошибки по chat_id"""
+    def __init__(self, name: str, sent: list, errors: dict = None):
+        self.name = name
+        self.sent = sent
+        self.errors = errors or {}
+        self.calls = 0
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        self.calls += 1
+        error = self.errors.get(chat_id)
+        if error is not None:
+            raise error
+        self.sent.append((self.name, text))
+
+
+def _retry_after(seconds: int = 0) -> TelegramRetryAfter:
+    return TelegramRetryAfter(method=SendMessage(chat_id=1, text=''), message="Flood control", retry_after=seconds)
+
+
+@pytest.fixture(autouse=True)
+def redis(monkeypatch, fake_redis):
+    monkeypatch.setattr(outbox_module, 'redis', fake_redis)
+    return fake_redis
+
+
+async def _wait_for(condition, timeout: float = 2) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "условие не выполнено за отведенное время"
+        await asyncio.sleep(0.01)
+
+
+async def test_live_process_messages_are_not_taken_over():
+    sent = []
+    # Процесс без отправителей: сообщения лежат в его очереди в памяти
+    first = Outbox(FakeBot('first', sent), workers=0, max_attempts=3, lease_ttl=30)
+    await first.start()
+    for i in range(5):
+        await first.send_message(1, f"m{i}")
+
+    second = Outbox(FakeBot('second', sent), workers=2, max_attempts=3, lease_ttl=30)
+    await second.start()
+    await asyncio.sleep(0.1)
+    assert sent == []
+
+    await second.stop()
+    await first.stop()
+
+
+async def test_messages_of_dead_process_are_sent_once(redis):
+    sent = []
+    dead = Outbox(FakeBot('dead', sent), workers=0, max_attempts=3, lease_ttl=1)
+    await dead.start()
+    for i in range(5):
+        await dead.send_message(1, f"m{i}")
+    # Процесс упал: аренда больше не продлевается
+    dead._lease_task.cancel()
+
+    survivors = [
+        Outbox(FakeBot(f"survivor-{i}", sent), workers=2, max_attempts=3, lease_ttl=1)
+        for i in range(2)
+    ]
+    for survivor in survivors:
+        await survivor.start()
+    await _wait_for(lambda: len(sent) == 5, timeout=3)
+    await asyncio.sleep(0.5)
+
+    assert sorted(text for _, text in sent) == [f"m{i}" for i in range(5)]
+    assert len({name for name, _ in sent}) == 1
+    assert await redis.hlen(dead._key(dead.owner)) == 0
+    for survivor in survivors:
+        await survivor.stop()
+        assert await redis.hlen(survivor._key(survivor.owner)) == 0
+
+
+async def test_graceful_stop_hands_messages_over_immediately():
+    sent = []
+    old = Outbox(FakeBot('old', sent), workers=0, max_attempts=3, lease_ttl=30)
+    await old.start()
+    for i in range(3):
+        await old.send_message(1, f"m{i}")
+    await old.stop()
+
+    new = Outbox(FakeBot('new', sent), workers=1, max_attempts=3, lease_ttl=30)
+    await new.start()
+    await _wait_for(lambda: len(sent) == 3)
+    assert [text for _, text in sent] == ["m0", "m1", "m2"]
+    await new.stop()
+
+
+async def test_retry_after_is_capped_by_max_attempts(redis):
+    bot = FakeBot('bot', [], errors={1: _retry_after()})
+    box = Outbox(bot, workers=1, max_attempts=3, lease_ttl=30)
+    await box.start()
+    await box.send_message(1, "flood")
+    await _wait_for(lambda: box.failed == 1)
+
+    assert bot.calls == 3
+    assert box.retried == 2
+    assert await redis.hlen(box._key(box.owner)) == 0
+    assert box.stats()['pending'] == 0
+    await box.stop()
+
+
+async def test_message_waiting_for_retry_is_pending():
+    bot = FakeBot('bot', [], errors={1: _retry_after(60)})
+    box = Outbox(bot, workers=1, max_attempts=3, lease_ttl=30)
+    await box.start()
+    await box.send_message(1, "flood")
+    await _wait_for(lambda: box.retried == 1)
+
+    assert box.stats()['pending'] == 1
+    await box.stop()
+
+
+async def test_blocked_bot_is_not_retried():
+    forbidden = TelegramForbiddenError(method=SendMessage(chat_id=1, text=''), message="bot was blocked")
+    bot = FakeBot('bot', [], errors={1: forbidden})
+    box = Outbox(bot, workers=1, max_attempts=5, lease_ttl=30)
+    await box.start()
+    await box.send_message(1, "hello")
+    await _wait_for(lambda: box.failed == 1)
+
+    assert bot.calls == 1
+    await box.stop()
+
+
+def _middleware(max_retries: int = 2, max_retry_after: float = 10) -> ThrottlingRequestMiddleware:
+    return ThrottlingRequestMiddleware(
+        limiter=TokenBucket(1000),
+        chat_rate=1000,
+        group_rate=1000,
+        chat_burst=1000,
+        max_retry_after=max_retry_after,
+        max_retries=max_retries,
+        max_chats=100,
+    )
+
+
+async def test_middleware_retries_retry_after_up_to_the_cap():
+    calls = []
+
+    async def make_request(bot, method):
+        calls.append(method)
+        raise _retry_after()
+
+    middleware = _middleware(max_retries=2)
+    with pytest.raises(TelegramRetryAfter):
+        await middleware(make_request, None, SendMessage(chat_id=1, text='x'))
+    assert len(calls) == 3
+    assert middleware.retry_after_count == 3
+
+
+async def test_middleware_does_not_wait_out_long_retry_after():
+    calls = []
+
+    async def make_request(bot, method):
+        calls.append(method)
+        raise _retry_after(60)
+
+    with pytest.raises(TelegramRetryAfter):
+        await _middleware(max_retry_after=10)(make_request, None, SendMessage(chat_id=1, text='x'))
+    assert len(calls) == 1
+
+
+async def test_token_bucket_rejects_more_tokens_than_capacity():
+    bucket = TokenBucket(rate=10, capacity=2)
+    with pytest.raises(ValueError):
+        await asyncio.wait_for(bucket.acquire(3), timeout=1)
+    await asyncio.wait_for(bucket.acquire(2), timeout=1)
+
+
+async def test_middleware_passes_through_unlimited_methods():
+    async def make_request(bot, method):
+        return 'ok'
+
+    middleware = _middleware()
+    middleware.limiter = TokenBucket(rate=0.001, capacity=0)
+    # getMe не отправляет сообщений и не ждет токена
+    assert await asyncio.wait_for(middleware(make_request, None, GetMe()), timeout=1) == 'ok'
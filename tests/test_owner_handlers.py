@@ -0,0 +1,79 @@
+"""
+Экраны владельца через настоящий Dispatcher.
+
+Сообщение проходит DatabaseMiddleware и RoleMiddleware, поэтому тесты
+видят и ошибки внедрения аргументов обработчика, и проверку прав.
+"""
+import csv
+import gzip
+import io
+from datetime import date, timedelta
+
+import pytest
+from aiogram.methods import SendDocument, SendMessage
+
+import services.report_service as report_service
+import utils.stats_counters as stats_counters_module
+from utils.database.models import Coupon, UserRole
+
+OWNER_TG_ID = 1001
+CLIENT_TG_ID = 1002
+
+
+@pytest.fixture(autouse=True)
+def redis(monkeypatch, fake_redis):
+    monkeypatch.setattr(report_service, 'redis', fake_redis)
+    monkeypatch.setattr(stats_counters_module, 'redis', fake_redis)
+    return fake_redis
+
+
+@pytest.fixture
+async def owner(session):
+    session.add(UserRole(user_id=1, role='owner', company_id=1, start_date=date.today(),
+                         end_date=date.today() + timedelta(days=365), changed_by=1))
+    await session.commit()
+
+
+def _texts(requests) -> list[str]:
+    return [request.text for request in requests if isinstance(request, SendMessage)]
+
+
+async def test_owner_sees_system_stats(telegram, owner, make_coupon_type, session):
+    await make_coupon_type(session)
+
+    [text] = _texts(await telegram.send(OWNER_TG_ID, "Статистика"))
+
+    assert text.startswith("📊 Системная статистика")
+    assert "👤 Пользователей: 2" in text
+    assert "🤝 Активных коллабораций: 1" in text
+
+
+async def test_stats_are_refused_without_permission(telegram, owner):
+    assert _texts(await telegram.send(CLIENT_TG_ID, "Статистика")) == [
+        "⛔ У вас нет прав для просмотра статистики"
+    ]
+
+
+async def test_owner_receives_streamed_coupon_report(telegram, owner, make_coupon_type, session):
+    coupon_type = await make_coupon_type(session)
+    session.add_all([
+        Coupon(code=f"RPT-{i}", coupon_type_id=coupon_type.id_coupon_type, client_id=2, issued_by=1,
+               end_date=date.today() + timedelta(days=7), status_id=1)
+        for i in range(3)
+    ])
+    await session.commit()
+
+    requests = await telegram.send(OWNER_TG_ID, "Отчет по купонам")
+
+    assert [type(request) for request in requests] == [SendDocument]
+    [(filename, content)] = telegram.session.documents
+    assert filename.endswith('.csv.gz')
+    rows = list(csv.reader(io.StringIO(gzip.decompress(content).decode('utf-8-sig')), delimiter=';'))
+    assert rows[0][:2] == ['ID', 'Код']
+    assert [row[1] for row in rows[1:]] == ['RPT-0', 'RPT-1', 'RPT-2']
+
+
+async def test_coupon_report_is_refused_without_permission(telegram, owner):
+    assert _texts(await telegram.send(CLIENT_TG_ID, "Отчет по купонам")) == [
+        "⛔ У вас нет прав для просмотра статистики"
+    ]
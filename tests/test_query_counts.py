@@ -0,0 +1,123 @@
+"""
+Число SQL-запросов на методы сервисов.
+
+Связи моделей объявлены с lazy="raise", поэтому обращение к неподгруженной
+связи падает, а не делает скрытый запрос. Тесты проверяют, что методы,
+переведенные на явную подгрузку, укладываются в свой бюджет запросов
+и возвращают объекты, связи которых можно читать без обращения к БД.
+Измерения идут в отдельной сессии, чтобы ничего не бралось из карты
+объектов сессии, подготовившей данные.
+"""
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.exc import InvalidRequestError
+
+from services.company_service import CompanyService
+from services.coupon_service import CouponService
+from services.tg_group_service import TgGroupService
+from utils.database.models import Coupon, TgGroup
+from utils.database.query_counter import QueryCounter, QueryLimitExceeded
+
+
+async def _add_coupons(session, coupon_type, client_id: int, count: int) -> list[str]:
+    codes = [f"TST-{coupon_type.id_coupon_type}-{i}" for i in range(count)]
+    session.add_all([
+        Coupon(code=code, coupon_type_id=coupon_type.id_coupon_type, client_id=client_id, issued_by=1,
+               end_date=date.today() + timedelta(days=7), status_id=1)
+        for code in codes
+    ])
+    await session.commit()
+    return codes
+
+
+async def test_user_coupons_load_status_in_one_query(engine, session, session_factory, make_coupon_type):
+    await _add_coupons(session, await make_coupon_type(session), client_id=2, count=5)
+
+    async with session_factory() as fresh:
+        async with QueryCounter(engine, limit=1):
+            coupons = await CouponService(fresh).get_user_coupons(2)
+            statuses = {coupon.status.name for coupon in coupons}
+    assert len(coupons) == 5
+    assert statuses == {'active'}
+
+
+async def test_coupon_by_code_loads_status_in_one_query(engine, session, session_factory, make_coupon_type):
+    [code] = await _add_coupons(session, await make_coupon_type(session), client_id=2, count=1)
+
+    async with session_factory() as fresh:
+        async with QueryCounter(engine, limit=1):
+            coupon = await CouponService(fresh).get_coupon_by_code(code)
+            assert coupon.status.name == 'active'
+
+
+async def test_collaboration_info_loads_both_companies_in_one_query(engine, session, session_factory,
+                                                                    make_coupon_type):
+    coupon_type = await make_coupon_type(session)
+
+    async with session_factory() as fresh:
+        async with QueryCounter(engine, limit=1):
+            collab, location = await CouponService(fresh).get_collaboration_info(coupon_type.id_coupon_type)
+            assert collab.company.Name_comp == 'Партнер'
+            assert location.company.Name_comp == 'Агент'
+
+
+async def test_group_by_id_loads_company_in_one_query(engine, session, session_factory):
+    group = TgGroup(group_id=-100500, company_id=1, name='Группа партнера')
+    session.add(group)
+    await session.commit()
+
+    async with session_factory() as fresh:
+        async with QueryCounter(engine, limit=1):
+            loaded = await TgGroupService(fresh).get_group_by_id(group.id_tg_group)
+            assert loaded.company.Name_comp == 'Партнер'
+
+
+async def test_company_menu_counts_locations_without_loading_them(engine, session):
+    async with QueryCounter(engine, limit=1) as counter:
+        assert await CompanyService(session).count_locations(1) == 1
+    assert 'count' in counter.statements[0].lower()
+
+
+async def test_unloaded_relationship_raises_instead_of_querying(session, session_factory, make_coupon_type):
+    [code] = await _add_coupons(session, await make_coupon_type(session), client_id=2, count=1)
+
+    async with session_factory() as fresh:
+        coupon = await fresh.scalar(select(Coupon).where(Coupon.code == code))
+        with pytest.raises(InvalidRequestError):
+            _ = coupon.status
+
+
+async def test_query_counter_reports_exceeded_limit(engine, session):
+    with pytest.raises(QueryLimitExceeded):
+        async with QueryCounter(engine, limit=1):
+            await CompanyService(session).count_locations(1)
+            await CompanyService(session).count_locations(2)
+
+
+async def test_collaborations_list_is_one_projection_query(engine, session, session_factory, make_coupon_type):
+    for _ in range(12):
+        await make_coupon_type(session)
+
+    async with session_factory() as fresh:
+        async with QueryCounter(engine, limit=1):
+            as_partner = await CouponService(fresh).get_collaborations('partner', 1)
+        async with QueryCounter(engine, limit=1):
+            as_agent = await CouponService(fresh).get_collaborations('agent', 2)
+    assert len(as_partner) == len(as_agent) == 12
+    # Название берется у второй стороны коллаборации
+    assert {row.company_name for row in as_partner} == {'Агент'}
+    assert {row.company_name for row in as_agent} == {'Партнер'}
+
+
+async def test_collaborations_page_is_count_plus_page_query(engine, session, session_factory, make_coupon_type):
+    for _ in range(25):
+        await make_coupon_type(session)
+
+    async with session_factory() as fresh:
+        async with QueryCounter(engine, limit=2):
+            page = await CouponService(fresh).get_collaborations_page('partner', 1, page=2, per_page=10)
+    assert page.total == 25
+    assert len(page.items) == 5
+    assert {row.company_name for row in page.items} == {'Агент'}
@@ -0,0 +1,57 @@
+"""
+Заполнение и сверка счетчиков статистики.
+
+Сверка применяет поправку (actual - before) от снимка счетчиков, поэтому
+одновременные сверки без замка удвоили бы каждый счетчик, а снимок,
+снятый до подсчета, удвоил бы изменения, сделанные во время подсчета.
+"""
+import asyncio
+
+import pytest
+
+import services.report_service as report_service
+import utils.stats_counters as stats_counters_module
+from services.report_service import ReportService
+from utils.database.models import User
+from utils.stats_counters import USERS
+
+
+@pytest.fixture(autouse=True)
+def redis(monkeypatch, fake_redis):
+    monkeypatch.setattr(report_service, 'redis', fake_redis)
+    monkeypatch.setattr(stats_counters_module, 'redis', fake_redis)
+    return fake_redis
+
+
+async def test_concurrent_first_taps_reconcile_once(session, session_factory, make_coupon_type):
+    for _ in range(3):
+        await make_coupon_type(session)
+    expected = await ReportService(session).count_all()
+
+    async def tap():
+        async with session_factory() as tap_session:
+            return await ReportService(tap_session).get_system_stats()
+
+    answers = await asyncio.gather(*(tap() for _ in range(5)))
+    assert {answer['active_collaborations'] for answer in answers} == {3}
+    assert {answer['total_users'] for answer in answers} == {2}
+
+    counters = await stats_counters_module.stats_counters.get()
+    assert {field: counters.get(field, 0) for field in expected} == expected
+
+
+async def test_change_committed_during_recount_is_not_counted_twice(session, monkeypatch):
+    await ReportService(session).reconcile()
+    original_count_all = ReportService.count_all
+
+    async def count_with_concurrent_registration(self):
+        # Регистрация пользователя фиксируется в БД и в счетчике, пока идет подсчет
+        session.add(User(id=3, id_tg=1003, first_name='Новый', last_name='Клиент', tel_num='70000000003'))
+        await session.commit()
+        await stats_counters_module.stats_counters.incr(USERS)
+        return await original_count_all(self)
+
+    monkeypatch.setattr(ReportService, 'count_all', count_with_concurrent_registration)
+    await ReportService(session).reconcile()
+
+    assert (await stats_counters_module.stats_counters.get())[USERS] == 3
@@ -0,0 +1,59 @@
+"""
+Обработка партиции потока обновлений воркером.
+"""
+import asyncio
+import time
+
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.types import Message, Update
+
+from utils.update_stream import GROUP_NAME, UpdateStream, UpdateStreamWorker
+
+CHAT_ID = 1002
+
+
+def _update(update_id: int, text: str) -> Update:
+    return Update.model_validate({
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': CHAT_ID, 'type': 'private'},
+            'from': {'id': CHAT_ID, 'is_bot': False, 'first_name': 'Тест'},
+            'text': text,
+        },
+    })
+
+
+async def test_failed_update_is_dead_lettered_without_rerunning_handlers(fake_redis):
+    handled = []
+    router = Router()
+
+    @router.message(F.text)
+    async def handler(message: Message):
+        handled.append(message.text)
+        if message.text == 'выдать купон':
+            raise RuntimeError("ошибка после выдачи")
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    stream = UpdateStream(fake_redis, partitions=1, maxlen=1000)
+    for update_id, text in enumerate(['привет', 'выдать купон', 'мои купоны'], start=1):
+        await stream.publish(_update(update_id, text), CHAT_ID)
+
+    worker = UpdateStreamWorker(Bot('42:TEST'), dp, stream, worker_index=0, worker_count=1,
+                                batch=10, block_ms=10, claim_idle_ms=60000)
+    key = stream.stream_key(0)
+    await stream.ensure_group(0)
+    # Чтение партиции без цикла _consume: fakeredis не блокирует XREADGROUP
+    [(_, entries)] = await fake_redis.xreadgroup(GROUP_NAME, worker.consumer, {key: '>'}, count=10)
+    async with asyncio.timeout(1):
+        for entry_id, fields in entries:
+            await worker._handle(key, entry_id, fields)
+
+    # Обработчик с побочным эффектом выполнился один раз, партиция не ждала
+    assert handled == ['привет', 'выдать купон', 'мои купоны']
+    assert worker.stats() == {'processed': 2, 'dead_lettered': 1}
+    [(_, fields)] = await fake_redis.xrange(stream.dead_letter_key())
+    assert fields[b'error'].decode() == "ошибка после выдачи"
+    assert (await fake_redis.xpending(key, GROUP_NAME))['pending'] == 0
@@ -1,15 +1,30 @@
 from aiogram import Bot, Dispatcher
+from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.redis import RedisStorage, DefaultKeyBuilder
+from aiogram.fsm.storage.redis import DefaultKeyBuilder
 from redis.asyncio.client import Redis
 from utils.config import config
+from utils.fsm_storage import BufferedRedisStorage, BufferedEventIsolation
+from utils.keyed_lock import KeyedLock
+from utils.rate_limiter import ThrottlingRequestMiddleware, telegram_api_limiter
 
-# Создание бота (совместимая версия)
+# Создание бота (aiogram 3.7+ принимает режим разметки только через default)
 bot = Bot(
     token=config.BOT_TG_TOKEN,
-    parse_mode=ParseMode.HTML
+    default=DefaultBotProperties(parse_mode=ParseMode.HTML)
 )
 
+# Лимиты Telegram на отправку и повтор при RetryAfter для всех запросов бота
+bot.session.middleware(ThrottlingRequestMiddleware(
+    limiter=telegram_api_limiter,
+    chat_rate=config.TG_CHAT_RATE,
+    group_rate=config.TG_GROUP_CHAT_RATE,
+    chat_burst=config.TG_CHAT_BURST,
+    max_retry_after=config.TG_RETRY_AFTER_MAX,
+    max_retries=config.TG_RETRY_MAX,
+    max_chats=config.TG_CHAT_BUCKETS,
+))
+
 # Настройка Redis
 redis = Redis(
     host=config.REDIS_HOST,
@@ -20,10 +35,23 @@ redis = Redis(
     auto_close_connection_pool=True
 )
 
+# Хранилище FSM: одно чтение и одна запись в Redis на обновление
+storage = BufferedRedisStorage(
+    redis,
+    key_builder=DefaultKeyBuilder(prefix=config.REDIS_PREFIX)
+)
+
 # Создание диспетчера
-dp = Dispatcher(
-    storage=RedisStorage(
-        redis,
-        key_builder=DefaultKeyBuilder(prefix=config.REDIS_PREFIX)
-    )
-)
\ No newline at end of file
+if config.PROCESS_ROLE == 'ingress':
+    # Приемник только кладет обновления в поток: состояние FSM и очередь
+    # пользователя нужны воркерам, здесь они дали бы лишнюю блокировку и чтение Redis
+    dp = Dispatcher(storage=storage, disable_fsm=True)
+else:
+    dp = Dispatcher(
+        storage=storage,
+        # Обновления одного пользователя - по очереди, разных - параллельно
+        events_isolation=BufferedEventIsolation(
+            storage,
+            KeyedLock(config.USER_MAX_QUEUE) if config.USER_SERIALIZATION_ENABLED else None
+        )
+    )
\ No newline at end of file
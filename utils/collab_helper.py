@@ -1,3 +1,4 @@
+import functools
 import logging
 from typing import Tuple
 
@@ -22,17 +23,18 @@ async def handle_pagination(cb: CallbackQuery, state: FSMContext, session: Async
         new_page = int(cb.data.split('_')[1])
 
         comp_service = CompanyService(session)
-        comp_list = await comp_service.get_companies_filtered_by_loc(
+        comp_page = await comp_service.get_companies_filtered_by_loc_page(
             city=data.get('filter_selected_city', []),
-            category=data.get('filter_selected_category', [])
+            category=data.get('filter_selected_category', []),
+            page=new_page
         )
 
         keyboard = loc_comp_keyboard(
-            companies=comp_list, page=new_page,
+            companies=comp_page,
             selected_companies=data.get('selected_companies', [])
         )
 
-        await state.update_data(current_page=new_page)
+        await state.update_data(current_page=comp_page.page)
         await cb.message.edit_reply_markup(reply_markup=keyboard)
     except Exception as e:
         logging.error(f"Ошибка: {str(e)}", show_alert=True)
@@ -40,7 +42,7 @@ async def handle_pagination(cb: CallbackQuery, state: FSMContext, session: Async
 
 async def filter_categories(cb: CallbackQuery, state: FSMContext, session: AsyncSession):
     category_service = CategoryService(session)
-    categories = await category_service.get_all_categories()
+    categories = await category_service.get_categories_page()
     keyboard = loc_categories_keyboard(categories, selected_category=[])
 
     await cb.message.edit_text(
@@ -54,7 +56,7 @@ async def filter_categories(cb: CallbackQuery, state: FSMContext, session: Async
 async def filter_cities(cb: CallbackQuery, state: FSMContext, session: AsyncSession):
     data = await state.get_data()
     city_service = CityLogger(session)
-    cities = await city_service.get_all_cities()
+    cities = await city_service.get_cities_page()
     keyboard = loc_city_keyboard(cities, selected_cities=data.get('filter_selected_city', []))
 
     await cb.message.edit_text(
@@ -69,7 +71,7 @@ async def comp_locations(cb: CallbackQuery, state: FSMContext, session: AsyncSes
     try:
         company_id = int(cb.data.split('_')[1])
         comp_service = CompanyService(session)
-        locations = await comp_service.get_locations_by_company(company_id=company_id)
+        locations = await comp_service.get_locations_page(company_id=company_id)
         keyboard = comp_location_keyboard(locations=locations)
 
         await cb.message.edit_text(text="Выберите локацию", reply_markup=keyboard)
@@ -96,7 +98,17 @@ def loc_info_text(comp: Company, loc: CompLocation, owner: User) -> str:
     )
 
 
+_COLLAB_BACK_ROW = [
+    InlineKeyboardButton(
+        text="⬅️ Назад",
+        callback_data="collab_back"
+    )
+]
+
+
+@functools.lru_cache(maxsize=1024)
 def collab_action_keyboard(comp_id: int) -> InlineKeyboardMarkup:
+    """Клавиатура действий с компанией; разметка строится один раз на компанию"""
     return InlineKeyboardMarkup(inline_keyboard=[
         [
             InlineKeyboardButton(
@@ -104,12 +116,7 @@ def collab_action_keyboard(comp_id: int) -> InlineKeyboardMarkup:
                 callback_data=f"send_collab_{comp_id}"
             )
         ],
-        [
-            InlineKeyboardButton(
-                text="⬅️ Назад",
-                callback_data="collab_back"
-            )
-        ]
+        _COLLAB_BACK_ROW
     ])
 
 
@@ -124,14 +131,15 @@ async def show_collaborations(
     data = await state.get_data()
 
     coupon_service = CouponService(session)
-    collaborations = await coupon_service.get_collaborations(
+    collaborations = await coupon_service.get_collaborations_page(
         role=collab_type,
-        comp_id=data['company_id']
+        comp_id=data['company_id'],
+        page=current_page or 0
     )
 
     # Сохраняем в контекст
     await state.update_data(
-        current_page=current_page,
+        current_page=collaborations.page,
         collab_type=collab_type
     )
 
@@ -146,12 +154,13 @@ async def collaborations_requests(
     """Общий метод для отображения коллабораций"""
     data = await state.get_data()
     coupon_service = CouponService(session)
-    collaborations = await coupon_service.get_collaboration_requests(
+    collaborations = await coupon_service.get_collaboration_requests_page(
         company_id=data['company_id'],
-        location_id=data['location_id']
+        location_id=data['location_id'],
+        page=current_page or 0
     )
     # Сохраняем в контекст
-    await state.update_data(current_page=current_page)
+    await state.update_data(current_page=collaborations.page)
 
     return collab_request_keyboard(collabs=collaborations)
 
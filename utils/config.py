@@ -10,12 +10,110 @@ class Config:
         self.REDIS_PASSWORD = os.getenv('REDIS_PASSWORD')
         self.REDIS_USERNAME = os.getenv('REDIS_USERNAME')
         self.REDIS_PREFIX = os.getenv('REDIS_PREFIX')
+        self.REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
+        self.REDIS_DB = int(os.getenv('REDIS_DB', 0))
         self.DB_HOST = os.getenv('DB_HOST')
         self.DB_PORT = os.getenv('DB_PORT', '3306')
         self.DB_USERNAME = os.getenv('DB_USERNAME')
         self.DB_PASSWORD = os.getenv('DB_PASSWORD')
         self.DB_NAME = os.getenv('DB_NAME')
+        # Пул соединений с БД
+        self.DB_POOL_ENABLED = os.getenv('DB_POOL_ENABLED', 'true').lower() == 'true'
+        self.DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+        self.DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 20))
+        self.DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+        self.DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))
+        self.DB_PRE_PING_INTERVAL = float(os.getenv('DB_PRE_PING_INTERVAL', 30))
         self.OWNER_ID = int(os.getenv('OWNER_ID', 0))
+        # Кэш идентификации пользователей (tg_id -> id и роли)
+        self.IDENTITY_CACHE_SIZE = int(os.getenv('IDENTITY_CACHE_SIZE', 10000))
+        self.IDENTITY_LOCAL_TTL = float(os.getenv('IDENTITY_LOCAL_TTL', 15))
+        self.IDENTITY_REDIS_TTL = int(os.getenv('IDENTITY_REDIS_TTL', 600))
+        # Пул заранее сгенерированных купонов
+        self.COUPON_POOL_ENABLED = os.getenv('COUPON_POOL_ENABLED', 'true').lower() == 'true'
+        self.COUPON_POOL_LOW_WATER = int(os.getenv('COUPON_POOL_LOW_WATER', 50))
+        self.COUPON_POOL_HIGH_WATER = int(os.getenv('COUPON_POOL_HIGH_WATER', 500))
+        self.COUPON_POOL_BATCH_SIZE = int(os.getenv('COUPON_POOL_BATCH_SIZE', 500))
+        self.COUPON_POOL_REFILL_INTERVAL = float(os.getenv('COUPON_POOL_REFILL_INTERVAL', 30))
+        # Ключ перестановки кодов купонов (обязателен); после выдачи первых купонов менять нельзя
+        self.COUPON_CODE_SECRET = os.getenv('COUPON_CODE_SECRET', '')
+        # Ограничение частоты запросов к Bot API (на всех воркеров вместе)
+        self.TG_API_RATE = float(os.getenv('TG_API_RATE', 30))
+        self.TG_API_BURST = float(os.getenv('TG_API_BURST', 30))
+        # Лимиты отправки в один чат (сообщений в секунду) и повторы при RetryAfter
+        self.TG_CHAT_RATE = float(os.getenv('TG_CHAT_RATE', 1))
+        self.TG_GROUP_CHAT_RATE = float(os.getenv('TG_GROUP_CHAT_RATE', 0.33))
+        self.TG_CHAT_BURST = float(os.getenv('TG_CHAT_BURST', 3))
+        self.TG_CHAT_BUCKETS = int(os.getenv('TG_CHAT_BUCKETS', 10000))
+        self.TG_RETRY_AFTER_MAX = float(os.getenv('TG_RETRY_AFTER_MAX', 10))
+        self.TG_RETRY_MAX = int(os.getenv('TG_RETRY_MAX', 3))
+        # Очередь исходящих сообщений
+        self.OUTBOX_WORKERS = int(os.getenv('OUTBOX_WORKERS', 8))
+        self.OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 5))
+        # Аренда сообщений очереди процессом, сек: после ее истечения сообщения забирает другой процесс
+        self.OUTBOX_LEASE_TTL = int(os.getenv('OUTBOX_LEASE_TTL', 30))
+        # Рассылки клиентам: размер пачки, параллельность, лимит сообщений в секунду
+        self.BROADCAST_CHUNK_SIZE = int(os.getenv('BROADCAST_CHUNK_SIZE', 500))
+        self.BROADCAST_CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY', 25))
+        self.BROADCAST_RATE = float(os.getenv('BROADCAST_RATE', 25))
+        self.BROADCAST_LEASE_TTL = int(os.getenv('BROADCAST_LEASE_TTL', 120))
+        # Генерация QR-кодов: пул (process|thread), размер пула, кэш PNG
+        self.QR_EXECUTOR = os.getenv('QR_EXECUTOR', 'process').lower()
+        self.QR_WORKERS = int(os.getenv('QR_WORKERS', 2))
+        self.QR_CACHE_SIZE = int(os.getenv('QR_CACHE_SIZE', 512))
+        self.QR_CACHE_BYTES = int(os.getenv('QR_CACHE_BYTES', 16 * 1024 * 1024))
+        # Сверка счетчиков системной статистики с БД, сек
+        self.STATS_RECONCILE_INTERVAL = float(os.getenv('STATS_RECONCILE_INTERVAL', 3600))
+        # Выгрузка отчетов: формат (csv|xlsx), gzip для CSV, строк в пачке курсора
+        self.REPORT_FORMAT = os.getenv('REPORT_FORMAT', 'csv').lower()
+        self.REPORT_GZIP = os.getenv('REPORT_GZIP', 'true').lower() == 'true'
+        self.REPORT_CHUNK_SIZE = int(os.getenv('REPORT_CHUNK_SIZE', 5000))
+        # Журнал действий: размер очереди, пачка INSERT, интервал записи и ожидание места в очереди, сек
+        self.AUDIT_LOG_MAX_QUEUE = int(os.getenv('AUDIT_LOG_MAX_QUEUE', 10000))
+        self.AUDIT_LOG_BATCH_SIZE = int(os.getenv('AUDIT_LOG_BATCH_SIZE', 500))
+        self.AUDIT_LOG_FLUSH_INTERVAL = float(os.getenv('AUDIT_LOG_FLUSH_INTERVAL', 1))
+        self.AUDIT_LOG_PUT_TIMEOUT = float(os.getenv('AUDIT_LOG_PUT_TIMEOUT', 0.5))
+        # Срок хранения журнала действий и часовых сводок, дни; удаление порциями и пауза между ними, сек
+        self.ACTION_LOG_RETENTION_DAYS = int(os.getenv('ACTION_LOG_RETENTION_DAYS', 90))
+        self.ACTION_LOG_HOURLY_ROLLUP_DAYS = int(os.getenv('ACTION_LOG_HOURLY_ROLLUP_DAYS', 30))
+        self.ACTION_LOG_RETENTION_CHUNK = int(os.getenv('ACTION_LOG_RETENTION_CHUNK', 1000))
+        self.ACTION_LOG_RETENTION_PAUSE = float(os.getenv('ACTION_LOG_RETENTION_PAUSE', 0.2))
+        self.ACTION_LOG_RETENTION_INTERVAL = float(os.getenv('ACTION_LOG_RETENTION_INTERVAL', 3600))
+        # Проверка подписки на группы
+        self.MEMBERSHIP_CONCURRENCY = int(os.getenv('MEMBERSHIP_CONCURRENCY', 10))
+        self.MEMBERSHIP_POSITIVE_TTL = int(os.getenv('MEMBERSHIP_POSITIVE_TTL', 300))
+        self.MEMBERSHIP_NEGATIVE_TTL = int(os.getenv('MEMBERSHIP_NEGATIVE_TTL', 30))
+        # Как часто сверять версии справочников (категории, города) в Redis
+        self.REFDATA_VERSION_CHECK_INTERVAL = float(os.getenv('REFDATA_VERSION_CHECK_INTERVAL', 5))
+        # Кэш построенных inline-клавиатур (число записей и бюджет в байтах)
+        self.MARKUP_CACHE_SIZE = int(os.getenv('MARKUP_CACHE_SIZE', 2048))
+        self.MARKUP_CACHE_BYTES = int(os.getenv('MARKUP_CACHE_BYTES', 4 * 1024 * 1024))
+        # Режим получения обновлений: long polling или webhook
+        self.WEBHOOK_ENABLED = os.getenv('WEBHOOK_ENABLED', 'false').lower() == 'true'
+        self.WEBHOOK_BASE_URL = os.getenv('WEBHOOK_BASE_URL', '')
+        self.WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+        self.WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+        self.WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', 8080))
+        # Обязателен при WEBHOOK_ENABLED: проверка заголовка Telegram и доступ к /stats
+        self.WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+        self.WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', 40))
+        self.WEBHOOK_CONCURRENCY = int(os.getenv('WEBHOOK_CONCURRENCY', 100))
+        self.WEBHOOK_MAX_PENDING = int(os.getenv('WEBHOOK_MAX_PENDING', 1000))
+        self.WEBHOOK_DRAIN_TIMEOUT = float(os.getenv('WEBHOOK_DRAIN_TIMEOUT', 30))
+        self.DROP_PENDING_UPDATES = os.getenv('DROP_PENDING_UPDATES', 'true').lower() == 'true'
+        # Роль процесса: standalone (все в одном), ingress (прием обновлений
+        # в Redis Streams) или worker (обработка своих партиций)
+        self.PROCESS_ROLE = os.getenv('PROCESS_ROLE', 'standalone').lower()
+        self.UPDATE_STREAM_PARTITIONS = int(os.getenv('UPDATE_STREAM_PARTITIONS', 16))
+        self.UPDATE_STREAM_MAXLEN = int(os.getenv('UPDATE_STREAM_MAXLEN', 100000))
+        self.UPDATE_STREAM_BATCH = int(os.getenv('UPDATE_STREAM_BATCH', 50))
+        self.UPDATE_STREAM_BLOCK_MS = int(os.getenv('UPDATE_STREAM_BLOCK_MS', 1000))
+        self.UPDATE_STREAM_CLAIM_IDLE_MS = int(os.getenv('UPDATE_STREAM_CLAIM_IDLE_MS', 60000))
+        self.WORKER_INDEX = int(os.getenv('WORKER_INDEX', 0))
+        self.WORKER_COUNT = int(os.getenv('WORKER_COUNT', 1))
+        # Последовательная обработка обновлений одного пользователя
+        self.USER_SERIALIZATION_ENABLED = os.getenv('USER_SERIALIZATION_ENABLED', 'true').lower() == 'true'
+        self.USER_MAX_QUEUE = int(os.getenv('USER_MAX_QUEUE', 20))
         #self.QR_GENERATION_URL = os.getenv('QR_GENERATION_URL')
 
 config = Config()
\ No newline at end of file
@@ -0,0 +1,160 @@
+"""
+Генерация и проверка кодов купонов.
+
+Код имеет вид PREFIX-XXXXXXXXXXC, где XXXXXXXXXX - 48-битное число
+в алфавите Crockford base32, а C - контрольный символ (остаток по модулю 37).
+Число получается перестановкой пары (ID типа купона, порядковый номер)
+ключевым шифром Фейстеля. Перестановка биективна, поэтому разные пары
+всегда дают разные коды, а без ключа соседние номера не угадываются.
+"""
+import functools
+import hashlib
+import re
+
+from utils.config import config
+
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+# Дополнительные символы для контрольной цифры по спецификации Crockford
+CHECK_ALPHABET = ALPHABET + "*~$=U"
+
+TYPE_BITS = 24
+SEQ_BITS = 24
+BLOCK_BITS = TYPE_BITS + SEQ_BITS
+HALF_BITS = BLOCK_BITS // 2
+HALF_MASK = (1 << HALF_BITS) - 1
+BODY_LENGTH = 10  # ceil(48 / 5)
+ROUNDS = 4
+
+MAX_TYPE_ID = (1 << TYPE_BITS) - 1
+MAX_SEQ = (1 << SEQ_BITS) - 1
+
+_DECODE = {char: value for value, char in enumerate(ALPHABET)}
+# Типичные опечатки, которые Crockford base32 трактует однозначно
+_DECODE.update({'O': 0, 'I': 1, 'L': 1})
+
+# Коды, выданные до перехода на этот формат: PREFIX-8 шестнадцатеричных символов
+_LEGACY_BODY = re.compile(r'^[0-9A-F]{8}$')
+
+
+def _round_keys(secret: str) -> list[bytes]:
+    return [
+        hashlib.blake2b(f"{secret}:{i}".encode(), digest_size=16).digest()
+        for i in range(ROUNDS)
+    ]
+
+
+def check_secret() -> None:
+    """
+    Проверяет, что задан ключ кодов купонов. Вызывается при старте бота,
+    чтобы процесс без ключа не запустился, а не падал на первой выдаче купона
+    Raises:
+        RuntimeError: COUPON_CODE_SECRET не задан
+    """
+    if not config.COUPON_CODE_SECRET:
+        # С пустым ключом перестановка общеизвестна: любой может вычислить действующие коды
+        raise RuntimeError(
+            "COUPON_CODE_SECRET не задан: укажите в .env случайную строку, одинаковую "
+            "для всех процессов бота. Без ключа коды купонов генерировать нельзя"
+        )
+
+
+@functools.cache
+def _keys() -> list[bytes]:
+    check_secret()
+    return _round_keys(config.COUPON_CODE_SECRET)
+
+
+def _round(half: int, key: bytes) -> int:
+    digest = hashlib.blake2b(half.to_bytes(3, 'big'), key=key, digest_size=3).digest()
+    return int.from_bytes(digest, 'big') & HALF_MASK
+
+
+def permute(value: int) -> int:
+    """Ключевая перестановка 48-битного числа (сеть Фейстеля)"""
+    left, right = value >> HALF_BITS, value & HALF_MASK
+    for key in _keys():
+        left, right = right, left ^ _round(right, key)
+    return (left << HALF_BITS) | right
+
+
+def unpermute(value: int) -> int:
+    """Обратная к permute перестановка"""
+    left, right = value >> HALF_BITS, value & HALF_MASK
+    for key in reversed(_keys()):
+        left, right = right ^ _round(left, key), left
+    return (left << HALF_BITS) | right
+
+
+def _check_symbol(value: int) -> str:
+    return CHECK_ALPHABET[value % 37]
+
+
+def _encode(value: int) -> str:
+    chars = []
+    for _ in range(BODY_LENGTH):
+        chars.append(ALPHABET[value & 31])
+        value >>= 5
+    return ''.join(reversed(chars))
+
+
+def make_coupon_code(prefix: str, coupon_type_id: int, seq: int) -> str:
+    """
+    Строит код купона по ID типа и порядковому номеру
+    Args:
+        prefix: Префикс типа купона
+        coupon_type_id: ID типа купона
+        seq: Порядковый номер купона в типе
+    Returns:
+        str: Код купона
+    """
+    if not 0 <= coupon_type_id <= MAX_TYPE_ID:
+        raise ValueError("ID типа купона вне допустимого диапазона")
+    if not 0 <= seq <= MAX_SEQ:
+        raise ValueError("Исчерпан диапазон кодов для типа купона")
+
+    value = permute((coupon_type_id << SEQ_BITS) | seq)
+    return f"{prefix}-{_encode(value)}{_check_symbol(value)}"
+
+
+def normalize_coupon_code(code: str) -> str:
+    """
+    Приводит введенный код к каноническому виду: верхний регистр,
+    без пробелов и дефисов внутри тела, O/I/L заменены на 0/1
+    """
+    code = code.strip()
+    prefix, sep, body = code.rpartition('-')
+    if not sep:
+        return code
+    body = body.upper().replace(' ', '')
+    if _LEGACY_BODY.match(body):
+        return f"{prefix}-{body}"
+    body = ''.join(ALPHABET[_DECODE[c]] if c in _DECODE else c for c in body)
+    return f"{prefix}-{body}"
+
+
+def is_valid_coupon_code(code: str) -> bool:
+    """
+    Проверяет формат и контрольный символ кода без обращения к БД.
+    Коды старого формата PREFIX-XXXXXXXX (hex) считаются допустимыми
+    Args:
+        code: Код купона (желательно после normalize_coupon_code)
+    Returns:
+        bool: True если код может существовать
+    """
+    prefix, sep, body = code.rpartition('-')
+    if not sep or not prefix:
+        return False
+    if _LEGACY_BODY.match(body):
+        return True
+    if len(body) != BODY_LENGTH + 1:
+        return False
+
+    value = 0
+    for char in body[:-1]:
+        digit = _DECODE.get(char)
+        if digit is None:
+            return False
+        value = (value << 5) | digit
+    if value >> BLOCK_BITS:
+        return False
+    return body[-1] == _check_symbol(value)
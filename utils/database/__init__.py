@@ -3,8 +3,8 @@ from .db_session import (
     Base,
     engine,
     AsyncSessionLocal as async_session,  # Создаем псевдоним
-    get_db,  init_db
+    get_db,  init_db, close_db, get_pool_stats
 )
 
 # Явно экспортируем объекты
-__all__ = ['Base', 'engine', 'async_session', 'get_db', 'init_db']
\ No newline at end of file
+__all__ = ['Base', 'engine', 'async_session', 'get_db', 'init_db', 'close_db', 'get_pool_stats']
\ No newline at end of file
@@ -1,22 +1,134 @@
+import time
+
+from sqlalchemy import event, exc
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
-from sqlalchemy.pool import NullPool
+from sqlalchemy.pool import NullPool, AsyncAdaptedQueuePool
 from typing import AsyncGenerator
 from utils.config import config
 
 # Базовый класс для моделей SQLAlchemy
 Base = declarative_base()
 
+
+class PoolMetrics:
+    """Счетчики занятости пула и времени ожидания соединения"""
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.pings = 0
+        self.stale_reconnects = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record_wait(self, seconds: float) -> None:
+        """Учитывает время ожидания свободного соединения"""
+        self.checkouts += 1
+        self.total_wait += seconds
+        self.max_wait = max(self.max_wait, seconds)
+
+    def as_dict(self) -> dict:
+        avg_wait = self.total_wait / self.checkouts if self.checkouts else 0.0
+        return {
+            'checkouts': self.checkouts,
+            'timeouts': self.timeouts,
+            'pings': self.pings,
+            'stale_reconnects': self.stale_reconnects,
+            'avg_wait_ms': round(avg_wait * 1000, 3),
+            'max_wait_ms': round(self.max_wait * 1000, 3),
+        }
+
+
+pool_metrics = PoolMetrics()
+
+
+class MeteredQueuePool(AsyncAdaptedQueuePool):
+    """Асинхронный пул соединений, замеряющий время получения соединения"""
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            pool_metrics.timeouts += 1
+            raise
+        finally:
+            pool_metrics.record_wait(time.perf_counter() - started)
+
+
+def _pool_options() -> dict:
+    """Параметры пула соединений из конфигурации"""
+    if not config.DB_POOL_ENABLED:
+        # Без пула: каждое обновление открывает новое соединение
+        return {'poolclass': NullPool, 'pool_pre_ping': True}
+    return {
+        'poolclass': MeteredQueuePool,
+        'pool_size': config.DB_POOL_SIZE,
+        'max_overflow': config.DB_MAX_OVERFLOW,
+        'pool_recycle': config.DB_POOL_RECYCLE,
+        'pool_timeout': config.DB_POOL_TIMEOUT,
+        'pool_use_lifo': True,  # Лишние соединения простаивают и закрываются по recycle
+    }
+
+
 # Создание асинхронного движка для подключения к MySQL
 engine = create_async_engine(
     #  строка подключения для MySQL
     f"mysql+aiomysql://{config.DB_USERNAME}:{config.DB_PASSWORD}"
     f"@{config.DB_HOST}:{config.DB_PORT}/{config.DB_NAME}",
     echo=True,          # Логирование SQL-запросов
-    pool_pre_ping=True, # Проверка соединения перед использованием
-    poolclass=NullPool  # Отключение пула соединений для асинхронной работы
+    **_pool_options()
 )
 
+
+if config.DB_POOL_ENABLED:
+    @event.listens_for(engine.sync_engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        """Запоминает момент возврата соединения в пул"""
+        connection_record.info['last_checkin'] = time.monotonic()
+
+    @event.listens_for(engine.sync_engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        """
+        Проверяет соединение, только если оно простаивало дольше
+        DB_PRE_PING_INTERVAL, вместо ping на каждое получение из пула
+        """
+        last_checkin = connection_record.info.get('last_checkin')
+        if last_checkin is None:
+            return
+        if time.monotonic() - last_checkin < config.DB_PRE_PING_INTERVAL:
+            return
+
+        pool_metrics.pings += 1
+        try:
+            alive = engine.dialect.do_ping(dbapi_connection)
+        except Exception:
+            alive = False
+        if not alive:
+            # Пул закроет соединение и повторит попытку с новым
+            pool_metrics.stale_reconnects += 1
+            raise exc.DisconnectionError("Соединение с БД устарело")
+
+
+def get_pool_stats() -> dict:
+    """
+    Возвращает текущую занятость пула и метрики ожидания
+
+    Returns:
+        dict: Размер пула, занятые/свободные соединения, переполнение и задержки
+    """
+    pool = engine.sync_engine.pool
+    stats = {'pool': pool.status()}
+    if isinstance(pool, MeteredQueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=pool.overflow(),
+        )
+    stats.update(pool_metrics.as_dict())
+    return stats
+
+
 # Фабрика для создания асинхронных сессий
 AsyncSessionLocal = sessionmaker(
     bind=engine,
@@ -46,5 +158,10 @@ async def init_db():
         # Создание всех таблиц, определенных в моделях
         await conn.run_sync(Base.metadata.create_all)
 
+
+async def close_db():
+    """Закрывает все соединения пула при остановке бота"""
+    await engine.dispose()
+
 # Псевдоним для совместимости с существующим кодом
-async_session = AsyncSessionLocal
\ No newline at end of file
+async_session = AsyncSessionLocal
@@ -1,11 +1,14 @@
 from sqlalchemy import (
     Column, Integer, PrimaryKeyConstraint, String, ForeignKey, Boolean, DateTime,
-    DECIMAL, TIMESTAMP, Date, Enum, BigInteger, Text, SmallInteger
+    DECIMAL, TIMESTAMP, Date, Enum, BigInteger, Text, SmallInteger, Index
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .db_session import Base
 
+# Все связи объявлены с lazy="raise": неявная подгрузка запрещена,
+# нужные связи подгружаются явно через options() в конкретном запросе.
+
 
 # Класс для работы со статусами купонов
 class CouponStatusHelper:
@@ -15,7 +18,8 @@ class CouponStatusHelper:
         "active": 1,
         "used": 2,
         "expired": 3,
-        "cancelled": 4
+        "cancelled": 4,
+        "reserved": 5  # Заранее сгенерирован и ждет выдачи клиенту
     }
 
     @staticmethod
@@ -46,7 +50,7 @@ class CompanyCategory(Base):
     locations = relationship(
         "LocCat",
         back_populates="category",
-        lazy="selectin"
+        lazy="raise"
     )
 
 
@@ -55,6 +59,8 @@ class LocCat(Base):
     __tablename__ = 'LOC_CATS'
     __table_args__ = (
         PrimaryKeyConstraint('comp_id', 'id_location', 'id_category'),
+        # Поиск локаций по категориям в фильтре компаний
+        Index('ix_loc_cats_category_location', 'id_category', 'id_location'),
         {}
     )
 
@@ -63,9 +69,9 @@ class LocCat(Base):
     id_category = Column(BigInteger, ForeignKey('COMPANY_CATEGORY.id', ondelete='CASCADE'))
 
     # Связи
-    company = relationship("Company", lazy="selectin")
-    location = relationship("CompLocation", lazy="selectin")
-    category = relationship("CompanyCategory", back_populates="locations", lazy="selectin")
+    company = relationship("Company", lazy="raise")
+    location = relationship("CompLocation", lazy="raise")
+    category = relationship("CompanyCategory", back_populates="locations", lazy="raise")
 
 
 # Модель пользователя
@@ -86,25 +92,25 @@ class User(Base):
         "Coupon",
         foreign_keys="Coupon.issued_by",
         back_populates="issuer",
-        lazy="selectin"
+        lazy="raise"
     )
     used_coupons = relationship(
         "Coupon",
         foreign_keys="Coupon.used_by",
         back_populates="user",
-        lazy="selectin"
+        lazy="raise"
     )
     client_coupons = relationship(
         "Coupon",
         foreign_keys="Coupon.client_id",
         back_populates="client",
-        lazy="selectin"
+        lazy="raise"
     )
     roles = relationship(
         "UserRole",
         back_populates="user",
         foreign_keys="UserRole.user_id",
-        lazy="selectin"
+        lazy="raise"
     )
 
 
@@ -120,30 +126,35 @@ class Company(Base):
         "CompLocation",
         back_populates="company",
         cascade="all, delete-orphan",
-        lazy="selectin"
+        lazy="raise"
     )
     coupon_types = relationship(
         "CouponType",
         back_populates="company",
         cascade="all, delete-orphan",
-        lazy="selectin"
+        lazy="raise"
     )
 
     loc_cats = relationship(
         "LocCat",
         back_populates="company",
         cascade="all, delete-orphan",
-        lazy="selectin"
+        lazy="raise"
     )
 
     tg_groups = relationship(
-        "TgGroup", back_populates="company"
+        "TgGroup", back_populates="company", lazy="raise"
     )
 
 
 # Модель локации компании
 class CompLocation(Base):
     __tablename__ = 'COMP_LOCATIONS'
+    __table_args__ = (
+        # Поиск компаний по городам локаций в фильтре компаний
+        Index('ix_comp_locations_city_comp', 'city_id', 'id_comp'),
+        {}
+    )
 
     id_location = Column(Integer, primary_key=True, autoincrement=True)
     id_comp = Column(Integer, ForeignKey('COMPANIES.id_comp', ondelete='CASCADE'), nullable=False,
@@ -152,31 +163,32 @@ class CompLocation(Base):
     address = Column(String(255), comment="Адрес локации")
     map_url = Column(Text, comment="Ссылка Адреса локации на картах")
     city = Column(String(255), comment="Город")
+    city_id = Column(Integer, ForeignKey('CITY.id', ondelete='SET NULL'), nullable=True, comment="ID города")
     main_loc = Column(Boolean, default=False, comment="Главная локация")
 
     # Отношения
     company = relationship(
         "Company",
         back_populates="locations",
-        lazy="selectin"
+        lazy="raise"
     )
     coupon_types = relationship(
         "CouponType",
         back_populates="location",
         cascade="all, delete-orphan",
-        lazy="selectin"
+        lazy="raise"
     )
 
     used_coupons = relationship(
         "Coupon",
         back_populates="used_location",
-        lazy="selectin"
+        lazy="raise"
     )
     loc_cats = relationship(
         "LocCat",
         back_populates="location",
         cascade="all, delete-orphan",
-        lazy="selectin"
+        lazy="raise"
     )
 
 
@@ -201,27 +213,32 @@ class UserRole(Base):
         "User",
         foreign_keys=[user_id],
         back_populates="roles",
-        lazy="selectin"
+        lazy="raise"
     )
 
     company = relationship(
         "Company",
-        lazy="selectin"
+        lazy="raise"
     )
     location = relationship(
         "CompLocation",
-        lazy="selectin"
+        lazy="raise"
     )
     changer = relationship(
         "User",
         foreign_keys=[changed_by],
-        lazy="selectin"
+        lazy="raise"
     )
 
 
 # Модель типа купона
 class CouponType(Base):
     __tablename__ = 'COUPON_TYPES'
+    __table_args__ = (
+        # Входящие запросы на коллаборацию агента
+        Index('ix_coupon_types_agent_inbox', 'company_agent_id', 'location_agent_id', 'agent_agree', 'agent_rejected'),
+        {}
+    )
 
     id_coupon_type = Column(Integer, primary_key=True, autoincrement=True)
     code_prefix = Column(String(10), nullable=False, comment="Префикс кода купона")
@@ -244,6 +261,8 @@ class CouponType(Base):
 
     require_all_groups = Column(Boolean, default=False, nullable=True, comment="Требуются все группы")
     usage_limit = Column(Integer, default=0, nullable=True, comment="Лимит использования")
+    used_count = Column(Integer, default=0, server_default='0', nullable=False, comment="Количество использований")
+    code_seq = Column(Integer, default=0, server_default='0', nullable=False, comment="Следующий номер кода купона")
 
     start_date = Column(Date, nullable=False, server_default=func.current_date(), comment="Дата начала действия")
     end_date = Column(Date, nullable=False, comment="Дата окончания действия")
@@ -253,30 +272,33 @@ class CouponType(Base):
     days_for_used = Column(BigInteger, nullable=False, comment="Дней для использования")
 
     agent_agree = Column(Boolean, default=False, nullable=False, comment="Подтверждение агента")
+    agent_rejected = Column(
+        Boolean, default=False, server_default='0', nullable=False, comment="Агент отклонил или остановил коллаборацию"
+    )
     is_active = Column(Boolean, default=False, nullable=False, comment="Подтверждение агента")
 
     # --- Relationships ---
     company = relationship(
         "Company",
         back_populates="coupon_types",
-        lazy="selectin"
+        lazy="raise"
     )
     location = relationship(
         "CompLocation",
         back_populates="coupon_types",
-        lazy="selectin"
+        lazy="raise"
     )
     coupons = relationship(
         "Coupon",
         back_populates="coupon_type",
         cascade="all, delete-orphan",
-        lazy="selectin"
+        lazy="raise"
     )
     group_coupons = relationship(
         "GroupCoupon",
         back_populates="coupon_type",
         cascade="all, delete-orphan",
-        lazy="selectin"
+        lazy="raise"
     )
 
 # Модель Telegram группы
@@ -296,13 +318,13 @@ class TgGroup(Base):
         "GroupCoupon",
         back_populates="group",
         cascade="all, delete-orphan",
-        lazy="selectin"
+        lazy="raise"
     )
 
     company = relationship(
         "Company",
         back_populates="tg_groups",
-        lazy="joined"  
+        lazy="raise"
     )
 
 
@@ -320,12 +342,12 @@ class GroupCoupon(Base):
     coupon_type = relationship(
         "CouponType",
         back_populates="group_coupons",
-        lazy="selectin"
+        lazy="raise"
     )
     group = relationship(
         "TgGroup",
         back_populates="group_coupons",
-        lazy="selectin"
+        lazy="raise"
     )
 
 
@@ -340,7 +362,7 @@ class CouponStatus(Base):
     coupons = relationship(
         "Coupon",
         back_populates="status",
-        lazy="selectin"
+        lazy="raise"
     )
 
     @staticmethod
@@ -360,15 +382,23 @@ class CouponStatus(Base):
 # Модель купона
 class Coupon(Base):
     __tablename__ = 'COUPONS'
+    __table_args__ = (
+        # Выдача из пула и подсчет купонов пула по типам
+        Index('ix_coupons_type_status', 'coupon_type_id', 'status_id'),
+        {}
+    )
 
     id_coupon = Column(Integer, primary_key=True, autoincrement=True, comment="ID купона")
     code = Column(String(50), unique=True, nullable=False, comment="Уникальный код купона")
     coupon_type_id = Column(Integer, ForeignKey('COUPON_TYPES.id_coupon_type', ondelete='CASCADE'), nullable=False,
                             comment="ID типа купона")
-    client_id = Column(Integer, ForeignKey('USERS.id', ondelete='CASCADE'), nullable=False, comment="ID клиента")
+    # client_id и issued_by пусты у купонов из пула предгенерации (статус reserved)
+    # Внутренний ID клиента (USERS.id), не Telegram ID. Купоны, выданные раньше
+    # по Telegram ID, переводит backfill_coupon_clients при старте
+    client_id = Column(Integer, ForeignKey('USERS.id', ondelete='CASCADE'), nullable=True, comment="ID клиента")
     start_date = Column(Date, nullable=False, server_default=func.current_date(), comment="Дата начала действия")
     end_date = Column(Date, nullable=False, comment="Дата окончания действия")
-    issued_by = Column(Integer, ForeignKey('USERS.id', ondelete='CASCADE'), nullable=False, comment="Кто выдал купон")
+    issued_by = Column(Integer, ForeignKey('USERS.id', ondelete='CASCADE'), nullable=True, comment="Кто выдал купон")
     used_by = Column(Integer, ForeignKey('USERS.id', ondelete='SET NULL'), comment="Кто использовал купон")
     status_id = Column(SmallInteger, ForeignKey('COUPON_STATUSES.id_status'), default=1, comment="Статус купона")
     order_amount = Column(DECIMAL(10, 2), comment="Сумма заказа")
@@ -382,42 +412,76 @@ class Coupon(Base):
     coupon_type = relationship(
         "CouponType",
         back_populates="coupons",
-        lazy="selectin"
+        lazy="raise"
     )
     client = relationship(
         "User",
         foreign_keys=[client_id],
         back_populates="client_coupons",
-        lazy="selectin"
+        lazy="raise"
     )
     issuer = relationship(
         "User",
         foreign_keys=[issued_by],
         back_populates="issued_coupons",
-        lazy="selectin"
+        lazy="raise"
     )
     user = relationship(
         "User",
         foreign_keys=[used_by],
         back_populates="used_coupons",
-        lazy="selectin"
+        lazy="raise"
     )
     status = relationship(
         "CouponStatus",
         back_populates="coupons",
-        lazy="selectin"
+        lazy="raise"
     )
     used_location = relationship(
         "CompLocation",
         back_populates="used_coupons",
-        lazy="selectin"
+        lazy="raise"
     )
     used_company = relationship(
         "Company",
-        lazy="selectin"
+        lazy="raise"
     )
 
 
+# Модель журнала действий пользователей
+class ActionLog(Base):
+    __tablename__ = 'ACTION_LOGS'
+    __table_args__ = (
+        # Журнал действий пользователя за период
+        Index('ix_action_logs_user_timestamp', 'user_id', 'timestamp'),
+        # Последние записи и удаление старых записей по сроку хранения
+        Index('ix_action_logs_timestamp', 'timestamp'),
+        {}
+    )
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey('USERS.id', ondelete='SET NULL'), nullable=True, comment="ID пользователя")
+    action_type = Column(String(50), nullable=False, comment="Тип действия")
+    entity_id = Column(Integer, nullable=True, comment="ID сущности действия")
+    timestamp = Column(TIMESTAMP, nullable=False, server_default=func.now(), comment="Время действия")
+
+    user = relationship("User", lazy="raise")
+
+
+# Сводка журнала действий: число действий типа за час или за день
+class ActionLogRollup(Base):
+    __tablename__ = 'ACTION_LOG_ROLLUPS'
+    __table_args__ = (
+        PrimaryKeyConstraint('action_type', 'period', 'bucket_start'),
+        {}
+    )
+
+    action_type = Column(String(50), nullable=False, comment="Тип действия")
+    period = Column(Enum('hour', 'day', name='rollup_periods'), nullable=False, comment="Длина интервала")
+    bucket_start = Column(DateTime, nullable=False, comment="Начало интервала")
+    count = Column(BigInteger, nullable=False, default=0, comment="Число действий за интервал")
+
+
 # Модель тега
 class Tag(Base):
     __tablename__ = 'TAGS'
@@ -0,0 +1,48 @@
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+
+class QueryLimitExceeded(AssertionError):
+    """Метод сервиса выполнил больше SQL-запросов, чем разрешено"""
+
+
+class QueryCounter:
+    """
+    Считает SQL-запросы, выполненные движком внутри блока.
+
+    Используется для контроля числа запросов на метод сервиса:
+
+        async with QueryCounter(engine, limit=2) as counter:
+            await UserService(session).get_user_by_tg_id(tg_id)
+
+    При выходе из блока с превышением limit выбрасывается QueryLimitExceeded.
+    """
+    def __init__(self, engine: AsyncEngine, limit: int | None = None):
+        self.engine = engine.sync_engine if isinstance(engine, AsyncEngine) else engine
+        self.limit = limit
+        self.statements: list[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self) -> "QueryCounter":
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+        if exc_type is None and self.limit is not None and self.count > self.limit:
+            statements = "\n".join(self.statements)
+            raise QueryLimitExceeded(
+                f"Выполнено {self.count} SQL-запросов при лимите {self.limit}:\n{statements}"
+            )
+
+    async def __aenter__(self) -> "QueryCounter":
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self.__exit__(exc_type, exc, tb)
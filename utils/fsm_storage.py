@@ -0,0 +1,278 @@
+"""
+Хранилище FSM с буферизацией на время обработки обновления.
+
+Состояние и данные FSM читаются из Redis один раз (одним pipeline) при
+первом обращении внутри обновления, все дальнейшие get/set работают
+с буфером в памяти, а изменения записываются одним pipeline при
+завершении обработки. Данные кодируются msgpack (если установлен) или
+компактным JSON без экранирования кириллицы; записи старого формата
+(JSON) читаются без миграции.
+"""
+import copy
+import json
+import logging
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseEventIsolation, StateType, StorageKey
+from aiogram.fsm.storage.redis import RedisStorage
+from aiogram.types import ErrorEvent
+
+from utils.keyed_lock import KeyedLock
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+
+def encode_data(data: dict[str, Any]) -> bytes:
+    """Кодирует данные FSM в компактный формат"""
+    if msgpack is not None:
+        return msgpack.packb(data, use_bin_type=True)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def decode_data(raw: bytes | str) -> dict[str, Any]:
+    """Декодирует данные FSM, записанные в любом из форматов"""
+    if isinstance(raw, str):
+        raw = raw.encode()
+    # JSON-объект начинается с '{', а словарь msgpack - никогда
+    if raw[:1] == b'{':
+        return json.loads(raw)
+    if msgpack is None:
+        raise ValueError("Данные FSM закодированы msgpack, но пакет msgpack не установлен")
+    return msgpack.unpackb(raw, raw=False, strict_map_key=False)
+
+
+def _legacy_size(data: dict[str, Any]) -> int:
+    """Размер данных в прежнем формате хранения (json.dumps по умолчанию)"""
+    return len(json.dumps(data)) if data else 0
+
+
+class _Buffer:
+    """Состояние и данные одного ключа FSM в рамках обновления"""
+    __slots__ = ('loaded', 'state', 'data', 'state_dirty', 'data_dirty',
+                 'calls', 'round_trips', 'bytes', 'legacy_bytes', 'label')
+
+    def __init__(self):
+        self.loaded = False
+        self.state: Optional[str] = None
+        self.data: dict[str, Any] = {}
+        self.state_dirty = False
+        self.data_dirty = False
+        # Обращения к хранилищу: без буфера каждое было бы запросом к Redis
+        self.calls = 0
+        self.round_trips = 0
+        self.bytes = 0
+        self.legacy_bytes = 0
+        self.label = 'unknown'
+
+
+class BufferedRedisStorage(RedisStorage):
+    """
+    RedisStorage, буферизующий состояние и данные FSM на время обновления.
+
+    Буфер открывается через buffer(key) (это делает BufferedEventIsolation);
+    вне буфера хранилище работает напрямую с Redis, как RedisStorage.
+    get_data возвращает копию, поэтому изменение полученного словаря
+    без update_data, как и раньше, ничего не сохраняет
+    """
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self._buffers: ContextVar[Optional[dict[StorageKey, _Buffer]]] = ContextVar('fsm_buffers', default=None)
+        self.stats_by_type: dict[str, dict[str, int]] = {}
+
+    def _buffer_for(self, key: StorageKey) -> Optional[_Buffer]:
+        buffers = self._buffers.get()
+        return buffers.get(key) if buffers else None
+
+    @asynccontextmanager
+    async def buffer(self, key: StorageKey) -> AsyncIterator[None]:
+        """Буферизует обращения к FSM ключа до выхода из контекста"""
+        buffers = self._buffers.get()
+        token = None
+        if buffers is None:
+            buffers = {}
+            token = self._buffers.set(buffers)
+        if key in buffers:
+            yield
+            return
+
+        buf = buffers[key] = _Buffer()
+        try:
+            yield
+        finally:
+            try:
+                await self._flush(key, buf)
+            except Exception as e:
+                logger.error(f"Не удалось сохранить состояние FSM: {e}")
+            finally:
+                del buffers[key]
+                if token is not None:
+                    self._buffers.reset(token)
+                self._record(buf)
+
+    def label_current(self, label: str) -> None:
+        """Помечает открытые буферы типом обновления для статистики"""
+        for buf in (self._buffers.get() or {}).values():
+            buf.label = label
+
+    async def _load(self, key: StorageKey, buf: _Buffer) -> None:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.get(self.key_builder.build(key, "state"))
+            pipe.get(self.key_builder.build(key, "data"))
+            state, data = await pipe.execute()
+
+        buf.loaded = True
+        buf.round_trips += 1
+        # Значения, записанные до первого чтения, новее сохраненных в Redis
+        if not buf.state_dirty:
+            buf.state = state.decode() if isinstance(state, bytes) else state
+        if data is not None:
+            buf.bytes += len(data)
+            if not buf.data_dirty:
+                buf.data = decode_data(data)
+
+    async def _flush(self, key: StorageKey, buf: _Buffer) -> None:
+        if not (buf.state_dirty or buf.data_dirty):
+            return
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            if buf.state_dirty:
+                state_key = self.key_builder.build(key, "state")
+                if buf.state is None:
+                    pipe.delete(state_key)
+                else:
+                    pipe.set(state_key, buf.state, ex=self.state_ttl)
+            if buf.data_dirty:
+                data_key = self.key_builder.build(key, "data")
+                if not buf.data:
+                    pipe.delete(data_key)
+                else:
+                    raw = encode_data(buf.data)
+                    buf.bytes += len(raw)
+                    pipe.set(data_key, raw, ex=self.data_ttl)
+            await pipe.execute()
+        buf.round_trips += 1
+
+    def _record(self, buf: _Buffer) -> None:
+        if not buf.calls:
+            return
+        stats = self.stats_by_type.setdefault(buf.label, {
+            'updates': 0, 'calls': 0, 'round_trips': 0, 'bytes': 0, 'legacy_bytes': 0,
+        })
+        stats['updates'] += 1
+        stats['calls'] += buf.calls
+        stats['round_trips'] += buf.round_trips
+        stats['bytes'] += buf.bytes
+        stats['legacy_bytes'] += buf.legacy_bytes
+
+    def report(self) -> dict[str, dict[str, float]]:
+        """
+        Сэкономленные запросы к Redis и байты на одно обновление
+        по типам обновлений (по сравнению с обращением к Redis на каждый вызов)
+        """
+        return {
+            label: {
+                'updates': stats['updates'],
+                'round_trips_saved': round((stats['calls'] - stats['round_trips']) / stats['updates'], 2),
+                'bytes_saved': round((stats['legacy_bytes'] - stats['bytes']) / stats['updates'], 1),
+            }
+            for label, stats in self.stats_by_type.items()
+        }
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        buf = self._buffer_for(key)
+        if buf is None:
+            return await super().set_state(key, state)
+        buf.calls += 1
+        buf.state = state.state if isinstance(state, State) else state
+        buf.state_dirty = True
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        buf = self._buffer_for(key)
+        if buf is None:
+            return await super().get_state(key)
+        buf.calls += 1
+        if not (buf.loaded or buf.state_dirty):
+            await self._load(key, buf)
+        return buf.state
+
+    async def set_data(self, key: StorageKey, data: dict[str, Any]) -> None:
+        buf = self._buffer_for(key)
+        if buf is None:
+            data_key = self.key_builder.build(key, "data")
+            if not data:
+                await self.redis.delete(data_key)
+            else:
+                await self.redis.set(data_key, encode_data(data), ex=self.data_ttl)
+            return
+        buf.calls += 1
+        buf.legacy_bytes += _legacy_size(data)
+        buf.data = copy.deepcopy(data)
+        buf.data_dirty = True
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        buf = self._buffer_for(key)
+        if buf is None:
+            raw = await self.redis.get(self.key_builder.build(key, "data"))
+            return decode_data(raw) if raw is not None else {}
+        buf.calls += 1
+        if not (buf.loaded or buf.data_dirty):
+            await self._load(key, buf)
+        buf.legacy_bytes += _legacy_size(buf.data)
+        return copy.deepcopy(buf.data)
+
+    async def close(self) -> None:
+        if self.stats_by_type:
+            logger.info(f"FSM buffer savings per update type: {self.report()}")
+        await super().close()
+
+
+class BufferedEventIsolation(BaseEventIsolation):
+    """
+    Изоляция событий для BufferedRedisStorage.
+
+    Единственное место, где обновления пользователя выстраиваются в
+    очередь (USER_SERIALIZATION_ENABLED, USER_MAX_QUEUE). Если задан locks,
+    обновления одного ключа FSM (чат + пользователь) выполняются строго
+    по очереди, а разных ключей - параллельно. aiogram берет эту
+    блокировку до чтения состояния, поэтому и фильтры по состоянию,
+    и обработчики видят результат предыдущего обновления; outer
+    middleware на dp.update для этого не подходит - оно выполняется
+    уже после чтения raw_state. Внутри блокировки обращения к FSM
+    буферизуются и сохраняются перед ее освобождением.
+    Обновления сверх очереди отбрасывает drop_on_queue_full
+    """
+    def __init__(self, storage: BufferedRedisStorage, locks: Optional[KeyedLock] = None):
+        self.storage = storage
+        self.locks = locks
+
+    @asynccontextmanager
+    async def lock(self, key: StorageKey) -> AsyncIterator[None]:
+        if self.locks is None:
+            async with self.storage.buffer(key):
+                yield
+            return
+
+        async with self.locks.acquire(key):
+            async with self.storage.buffer(key):
+                yield
+
+    async def close(self) -> None:
+        if self.locks is not None:
+            logger.info(f"FSM key lock stats: {self.locks.stats()}")
+
+
+async def drop_on_queue_full(event: ErrorEvent) -> bool:
+    """Обработчик ошибок: отбрасывает обновление сверх очереди пользователя"""
+    key = event.exception.args[0] if event.exception.args else None
+    user_id = key.user_id if isinstance(key, StorageKey) else None
+    logger.warning(f"Очередь обновлений пользователя {user_id} переполнена, "
+                   f"обновление {event.update.update_id} отброшено")
+    return True
@@ -1,22 +1,27 @@
 # keyboards.py
-from typing import List, Union, Tuple
+from typing import List, Sequence, Union, Tuple
 
 from aiogram.utils.keyboard import InlineKeyboardBuilder, ReplyKeyboardBuilder
 from aiogram.types import KeyboardButton, ReplyKeyboardMarkup, InlineKeyboardButton, InlineKeyboardMarkup
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from services.coupon_service import CollabRow
+from services.identity_service import IdentityService
+from services.reference_cache import RefItem
 from services.role_service import RoleService
-from utils.database.models import Company, CompLocation, CompanyCategory, User, UserRole, City, CouponType
+from utils.markup_cache import markup_cache
+from utils.pagination import Page
+from utils.database.models import Company, CompLocation, User, UserRole, CouponType
 
 
-async def main_menu(session: AsyncSession, user) -> ReplyKeyboardMarkup:
-    """Создает главное меню в зависимости от роли пользователя"""
+async def main_menu(session: AsyncSession, tg_id: int) -> ReplyKeyboardMarkup:
+    """Создает главное меню в зависимости от роли пользователя (по Telegram ID)"""
     builder = ReplyKeyboardBuilder()
     role_service = RoleService(session)
 
-    user_roles = await role_service.get_user_roles(user)
-    is_owner = await role_service.has_permission(user, 'owner')
-    roles = list(map(lambda role: role.role, user_roles))
+    identity = await IdentityService(session).resolve(tg_id)
+    is_owner = await role_service.has_permission(tg_id, 'owner')
+    roles = identity.role_names if identity else frozenset()
 
     # Кнопки для всех пользователей
     builder.row(KeyboardButton(text="Мои купоны"))
@@ -33,6 +38,65 @@ async def main_menu(session: AsyncSession, user) -> ReplyKeyboardMarkup:
     )
 
 
+def _pagination_row(
+        page: Page,
+        prev_text: str = "⬅️",
+        next_text: str = "➡️"
+) -> list[InlineKeyboardButton]:
+    """Ряд кнопок пагинации для страницы выборки"""
+    row = []
+    if page.has_prev:
+        row.append(InlineKeyboardButton(text=prev_text, callback_data=f"page_{page.page - 1}"))
+    else:
+        row.append(InlineKeyboardButton(text=" ", callback_data="noop"))
+
+    row.append(InlineKeyboardButton(text=f"{page.page + 1}/{page.total_pages}", callback_data="noop"))
+
+    if page.has_next:
+        row.append(InlineKeyboardButton(text=next_text, callback_data=f"page_{page.page + 1}"))
+    else:
+        row.append(InlineKeyboardButton(text=" ", callback_data="noop"))
+    return row
+
+
+def _two_column_rows(builder: InlineKeyboardBuilder, buttons: list[InlineKeyboardButton]) -> None:
+    """Добавляет кнопки в клавиатуру по две в ряд"""
+    for i in range(0, len(buttons), 2):
+        builder.row(*buttons[i:i + 2])
+
+
+def _picker_keyboard(
+        kind: str,
+        items: Page[RefItem],
+        selected: Union[List[int], set, int, None],
+        build
+) -> InlineKeyboardMarkup:
+    """
+    Клавиатура выбора из справочника через кэш разметки.
+
+    В ключ входят только отмеченные элементы текущей страницы, поэтому
+    выбор на других страницах не порождает новых записей кэша.
+    Страницы без версии источника строятся без кэша
+    Args:
+        kind: Вид клавиатуры
+        items: Страница справочника
+        selected: ID отмеченных элементов
+        build: Функция построения клавиатуры по (items, отмеченные ID)
+    Returns:
+        InlineKeyboardMarkup: Клавиатура
+    """
+    if selected is None:
+        selected = set()
+    elif isinstance(selected, int):
+        selected = {selected}
+    visible = frozenset(item.id for item in items.items if item.id in selected)
+
+    if items.source is None:
+        return build(items, visible)
+    key = (kind, items.source, items.page, items.per_page, visible)
+    return markup_cache.get_or_build(key, lambda: build(items, visible))
+
+
 def companies_keyboard(companies: list[Company]):
     """Клавиатура для выбора компаний"""
     builder = InlineKeyboardBuilder()
@@ -61,7 +125,7 @@ def locations_keyboard(locations: list[CompLocation]):
     return builder.as_markup()
 
 
-def categories_keyboard(categories: list[CompanyCategory]):
+def categories_keyboard(categories: Sequence[RefItem]):
     """Клавиатура для выбора категорий"""
     builder = InlineKeyboardBuilder()
     for category in categories:
@@ -74,8 +138,7 @@ def categories_keyboard(categories: list[CompanyCategory]):
     return builder.as_markup()
 
 
-def edit_company_fields_keyboard():
-    """Клавиатура для редактирования компании"""
+def _build_edit_company_fields_keyboard() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     fields = [
         ("Название", "name"),
@@ -88,8 +151,7 @@ def edit_company_fields_keyboard():
     return builder.as_markup()
 
 
-def edit_location_fields_keyboard():
-    """Клавиатура для редактирования локации"""
+def _build_edit_location_fields_keyboard() -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     fields = [
         ("Название", "name"),
@@ -103,54 +165,36 @@ def edit_location_fields_keyboard():
     return builder.as_markup()
 
 
-def loc_categories_keyboard(
-        categories: List[CompanyCategory],
-        selected_category: Union[List[int], list],
-        page: int = 0,
-        per_page: int = 10
-) -> InlineKeyboardMarkup:
-    """Клавиатура для выбора категорий с пагинацией (2 колонки, 10 элементов)"""
-    builder = InlineKeyboardBuilder()
+# Статичные клавиатуры строятся один раз при импорте
+_EDIT_COMPANY_FIELDS_KEYBOARD = _build_edit_company_fields_keyboard()
+_EDIT_LOCATION_FIELDS_KEYBOARD = _build_edit_location_fields_keyboard()
 
-    # Разбиваем на страницы
-    total_pages = (len(categories) + per_page - 1) // per_page
-    start_idx = page * per_page
-    end_idx = start_idx + per_page
-    paginated_categories = categories[start_idx:end_idx]
 
-    # Добавляем кнопки категорий (в 2 колонки)
-    row = []
-    for i, category in enumerate(paginated_categories):
-        text = f"🟢 {category.name}" if category.id in selected_category else category.name
-        button = InlineKeyboardButton(
-            text=text,
-            callback_data=f"category_{category.id}"
-        )
-        row.append(button)
+def edit_company_fields_keyboard():
+    """Клавиатура для редактирования компании"""
+    return _EDIT_COMPANY_FIELDS_KEYBOARD
 
-        # Каждые 2 кнопки — новая строка
-        if len(row) == 2:
-            builder.row(*row)
-            row = []
 
-    if row:  # Добавляем оставшуюся кнопку (если нечетное число)
-        builder.row(*row)
+def edit_location_fields_keyboard():
+    """Клавиатура для редактирования локации"""
+    return _EDIT_LOCATION_FIELDS_KEYBOARD
 
-    # Ряд пагинации
-    pagination_row = []
-    if page > 0:
-        pagination_row.append(InlineKeyboardButton(text="⬅️", callback_data=f"page_{page - 1}"))
-    else:
-        pagination_row.append(InlineKeyboardButton(text=" ", callback_data="noop"))
 
-    pagination_row.append(InlineKeyboardButton(text=f"{page + 1}/{total_pages}", callback_data="noop"))
+def _build_loc_categories_keyboard(
+        categories: Page[RefItem],
+        selected_category: frozenset[int]
+) -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
 
-    if page < total_pages - 1:
-        pagination_row.append(InlineKeyboardButton(text="➡️", callback_data=f"page_{page + 1}"))
-    else:
-        pagination_row.append(InlineKeyboardButton(text=" ", callback_data="noop"))
+    _two_column_rows(builder, [
+        InlineKeyboardButton(
+            text=f"🟢 {category.name}" if category.id in selected_category else category.name,
+            callback_data=f"category_{category.id}"
+        )
+        for category in categories.items
+    ])
 
-    builder.row(*pagination_row)
+    builder.row(*_pagination_row(categories))
 
     # Кнопка "Сохранить"
     builder.row(InlineKeyboardButton(text="🔽 Применить", callback_data="add_category"))
@@ -159,34 +203,30 @@ def loc_categories_keyboard(
     return builder.as_markup()
 
 
+def loc_categories_keyboard(
+        categories: Page[RefItem],
+        selected_category: Union[List[int], list]
+) -> InlineKeyboardMarkup:
+    """Клавиатура для выбора категорий с пагинацией (2 колонки, 10 элементов)"""
+    return _picker_keyboard('categories', categories, selected_category, _build_loc_categories_keyboard)
+
 def loc_admin_keyboard(
-        roles_users: List[Tuple[UserRole, User]],
-        page: int = 0,
-        per_page: int = 8,
+        roles_users: Page[Tuple[UserRole, User]],
         admin_user_id: int = None
 ) -> InlineKeyboardMarkup:
     """
     Создает клавиатуру для управления администраторами локации
 
     Args:
-        roles_users: Список пар (UserRole, User)
-        page: Текущая страница
-        per_page: Количество элементов на странице
+        roles_users: Страница пар (UserRole, User)
+        admin_user_id: Telegram ID выбранного администратора
 
     Returns:
         InlineKeyboardMarkup: Клавиатура с пагинацией
-        :param admin_user_id:
     """
     builder = InlineKeyboardBuilder()
 
-    # Разбиваем на страницы
-    total_pages = max(1, (len(roles_users) + per_page - 1) // per_page)
-    page = max(0, min(page, total_pages - 1))
-    start_idx = page * per_page
-    end_idx = start_idx + per_page
-    paginated_items = roles_users[start_idx:end_idx]
-
-    for user_role, user in paginated_items:
+    for user_role, user in roles_users.items:
         emoji = '⭕️' if admin_user_id == user.id_tg else ''
         builder.add(InlineKeyboardButton(
             text=f"{emoji} {user.user_name or user.id_tg}",
@@ -195,23 +235,7 @@ def loc_admin_keyboard(
 
     builder.adjust(1)
 
-    pagination_buttons = []
-    if page > 0:
-        pagination_buttons.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"page_{page - 1}"))
-    else:
-        pagination_buttons.append(InlineKeyboardButton(text=" ", callback_data="noop"))
-
-    pagination_buttons.append(InlineKeyboardButton(
-        text=f"{page + 1}/{total_pages}",
-        callback_data="noop"
-    ))
-
-    if page < total_pages - 1:
-        pagination_buttons.append(InlineKeyboardButton(text="Вперед ➡️", callback_data=f"page_{page + 1}"))
-    else:
-        pagination_buttons.append(InlineKeyboardButton(text=" ", callback_data="noop"))
-
-    builder.row(*pagination_buttons)
+    builder.row(*_pagination_row(roles_users, prev_text="⬅️ Назад", next_text="Вперед ➡️"))
 
     builder.row(InlineKeyboardButton(
         text="❌ Удалить Админа",
@@ -231,13 +255,14 @@ def loc_admin_keyboard(
     return builder.as_markup()
 
 
-def coupon_menu_keyboard(cb_data: str) -> InlineKeyboardMarkup:
+def _build_coupon_menu_keyboard(cb_data: str | None, requests_count: int = 0) -> InlineKeyboardMarkup:
     builder = InlineKeyboardBuilder()
     if cb_data == 'iam_coupon':
         builder.add(InlineKeyboardButton(text="Найти агента", callback_data="iam_coupon_search"))
         builder.add(InlineKeyboardButton(text="Активные коллаборации", callback_data="iam_coupon_active_collab"))
     if cb_data == 'iam_agent':
-        builder.add(InlineKeyboardButton(text="Запросы на Коллаборацию", callback_data="iam_agent_requests"))
+        requests_text = "Запросы на Коллаборацию" + (f" ({requests_count})" if requests_count else "")
+        builder.add(InlineKeyboardButton(text=requests_text, callback_data="iam_agent_requests"))
         builder.add(InlineKeyboardButton(text="Активные коллаборации", callback_data="iam_agent_active"))
     builder.add(InlineKeyboardButton(text="Назад", callback_data="back"))
     builder.adjust(1)
@@ -245,50 +270,38 @@ def coupon_menu_keyboard(cb_data: str) -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
-def loc_comp_keyboard(
-        companies: List[Company],
-        selected_companies: Union[List[int], list],
-        page: int = 0,
-        per_page: int = 10
-) -> InlineKeyboardMarkup:
-    """Клавиатура для выбора категорий с пагинацией (2 колонки, 10 элементов)"""
-    builder = InlineKeyboardBuilder()
+_COUPON_MENU_KEYBOARDS = {
+    cb_data: _build_coupon_menu_keyboard(cb_data)
+    for cb_data in ('iam_coupon', 'iam_agent', None)
+}
 
-    total_pages = (len(companies) + per_page - 1) // per_page
-    start_idx = page * per_page
-    end_idx = start_idx + per_page
-    paginated_categories = companies[start_idx:end_idx]
 
-    row = []
-    for i, company in enumerate(paginated_categories):
-        text = f"🟢 {company.Name_comp}" if company.id_comp in selected_companies else company.Name_comp
-        button = InlineKeyboardButton(
-            text=text,
-            callback_data=f"company_{company.id_comp}"
+def coupon_menu_keyboard(cb_data: str, requests_count: int = 0) -> InlineKeyboardMarkup:
+    """Меню коллабораций; для агента в кнопке запросов показывается их число"""
+    if cb_data == 'iam_agent' and requests_count:
+        return markup_cache.get_or_build(
+            ('coupon_menu', cb_data, requests_count),
+            lambda: _build_coupon_menu_keyboard(cb_data, requests_count)
         )
-        row.append(button)
-
-        if len(row) == 2:
-            builder.row(*row)
-            row = []
+    return _COUPON_MENU_KEYBOARDS.get(cb_data, _COUPON_MENU_KEYBOARDS[None])
 
-    if row:
-        builder.row(*row)
 
-    pagination_row = []
-    if page > 0:
-        pagination_row.append(InlineKeyboardButton(text="⬅️", callback_data=f"page_{page - 1}"))
-    else:
-        pagination_row.append(InlineKeyboardButton(text=" ", callback_data="noop"))
-
-    pagination_row.append(InlineKeyboardButton(text=f"{page + 1}/{total_pages}", callback_data="noop"))
+def loc_comp_keyboard(
+        companies: Page[Company],
+        selected_companies: Union[List[int], list]
+) -> InlineKeyboardMarkup:
+    """Клавиатура для выбора компаний с пагинацией (2 колонки, 10 элементов)"""
+    builder = InlineKeyboardBuilder()
 
-    if page < total_pages - 1:
-        pagination_row.append(InlineKeyboardButton(text="➡️", callback_data=f"page_{page + 1}"))
-    else:
-        pagination_row.append(InlineKeyboardButton(text=" ", callback_data="noop"))
+    _two_column_rows(builder, [
+        InlineKeyboardButton(
+            text=f"🟢 {company.Name_comp}" if company.id_comp in selected_companies else company.Name_comp,
+            callback_data=f"company_{company.id_comp}"
+        )
+        for company in companies.items
+    ])
 
-    builder.row(*pagination_row)
+    builder.row(*_pagination_row(companies))
 
     builder.row(InlineKeyboardButton(text="🔽 Фильтры 🔽", callback_data="noop"))
     builder.row(*[InlineKeyboardButton(text="🔍 Город", callback_data="filter_city"),
@@ -299,57 +312,21 @@ def loc_comp_keyboard(
     return builder.as_markup()
 
 
-def loc_city_keyboard(
-        cities: List[City],
-        selected_cities: Union[List[int], list] | int | None,
-        page: int = 0,
-        per_page: int = 10
+def _build_loc_city_keyboard(
+        cities: Page[RefItem],
+        selected_cities: frozenset[int]
 ) -> InlineKeyboardMarkup:
-    """Клавиатура для выбора категорий с пагинацией (2 колонки, 10 элементов)"""
     builder = InlineKeyboardBuilder()
 
-    selected_cities = [] if selected_cities is None else selected_cities
-
-    selected_cities= (
-        [selected_cities] if isinstance(selected_cities, int)
-        else list(selected_cities)
-    )
-
-    total_pages = (len(cities) + per_page - 1) // per_page
-    start_idx = page * per_page
-    end_idx = start_idx + per_page
-    paginated_categories = cities[start_idx:end_idx]
-
-    row = []
-    for i, company in enumerate(paginated_categories):
-        text = f"🟢 {company.name}" if company.id in selected_cities else company.name
-        button = InlineKeyboardButton(
-            text=text,
-            callback_data=f"city_{company.id}"
+    _two_column_rows(builder, [
+        InlineKeyboardButton(
+            text=f"🟢 {city.name}" if city.id in selected_cities else city.name,
+            callback_data=f"city_{city.id}"
         )
-        row.append(button)
+        for city in cities.items
+    ])
 
-        if len(row) == 2:
-            builder.row(*row)
-            row = []
-
-    if row:
-        builder.row(*row)
-
-    pagination_row = []
-    if page > 0:
-        pagination_row.append(InlineKeyboardButton(text="⬅️", callback_data=f"page_{page - 1}"))
-    else:
-        pagination_row.append(InlineKeyboardButton(text=" ", callback_data="noop"))
-
-    pagination_row.append(InlineKeyboardButton(text=f"{page + 1}/{total_pages}", callback_data="noop"))
-
-    if page < total_pages - 1:
-        pagination_row.append(InlineKeyboardButton(text="➡️", callback_data=f"page_{page + 1}"))
-    else:
-        pagination_row.append(InlineKeyboardButton(text=" ", callback_data="noop"))
-
-    builder.row(*pagination_row)
+    builder.row(*_pagination_row(cities))
 
     builder.row(InlineKeyboardButton(text="🔽 Применить", callback_data="add_city"))
     builder.row(InlineKeyboardButton(text="⬅️ Назад", callback_data="back_city"))
@@ -357,145 +334,64 @@ def loc_city_keyboard(
     return builder.as_markup()
 
 
-def comp_location_keyboard(
-        locations: List[CompLocation],
-        page: int = 0,
-        per_page: int = 10
+def loc_city_keyboard(
+        cities: Page[RefItem],
+        selected_cities: Union[List[int], list] | int | None
 ) -> InlineKeyboardMarkup:
-    builder = InlineKeyboardBuilder()
+    """Клавиатура для выбора городов с пагинацией (2 колонки, 10 элементов)"""
+    return _picker_keyboard('cities', cities, selected_cities, _build_loc_city_keyboard)
 
-    total_pages = (len(locations) + per_page - 1) // per_page
-    start_idx = page * per_page
-    end_idx = start_idx + per_page
-    paginated_categories = locations[start_idx:end_idx]
 
-    row = []
-    for i, location in enumerate(paginated_categories):
-        text = location.name_loc
-        button = InlineKeyboardButton(
-            text=text,
+def comp_location_keyboard(locations: Page[CompLocation]) -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+
+    _two_column_rows(builder, [
+        InlineKeyboardButton(
+            text=location.name_loc,
             callback_data=f"location_{location.id_location}"
         )
-        row.append(button)
-
-        if len(row) == 2:
-            builder.row(*row)
-            row = []
+        for location in locations.items
+    ])
 
-    if row:
-        builder.row(*row)
-
-    pagination_row = []
-    if page > 0:
-        pagination_row.append(InlineKeyboardButton(text="⬅️", callback_data=f"page_{page - 1}"))
-    else:
-        pagination_row.append(InlineKeyboardButton(text=" ", callback_data="noop"))
-
-    pagination_row.append(InlineKeyboardButton(text=f"{page + 1}/{total_pages}", callback_data="noop"))
-
-    if page < total_pages - 1:
-        pagination_row.append(InlineKeyboardButton(text="➡️", callback_data=f"page_{page + 1}"))
-    else:
-        pagination_row.append(InlineKeyboardButton(text=" ", callback_data="noop"))
-
-    builder.row(*pagination_row)
+    builder.row(*_pagination_row(locations))
 
     builder.row(InlineKeyboardButton(text="⬅️ Назад", callback_data="location_back"))
 
     return builder.as_markup()
 
 
-def collab_comp_keyboard(
-        collabs: List[CouponType],
-        page: int = 0,
-        per_page: int = 10
-) -> InlineKeyboardMarkup:
-    """Клавиатура для выбора категорий с пагинацией (2 колонки, 10 элементов)"""
+def collab_comp_keyboard(collabs: Page[CollabRow]) -> InlineKeyboardMarkup:
+    """Клавиатура для выбора коллабораций с пагинацией (2 колонки, 10 элементов)"""
     builder = InlineKeyboardBuilder()
 
-    total_pages = (len(collabs) + per_page - 1) // per_page
-    start_idx = page * per_page
-    end_idx = start_idx + per_page
-    paginated_categories = collabs[start_idx:end_idx]
-
-    row = []
-    for i, collab in enumerate(paginated_categories):
-        emoji = "🟢" if collab.is_active else "🟥"
-        button = InlineKeyboardButton(
-            text=f"{emoji} {collab.company.Name_comp}",
+    _two_column_rows(builder, [
+        InlineKeyboardButton(
+            text=f"{'🟢' if collab.is_active else '🟥'} {collab.company_name}",
             callback_data=f"my_collab_{collab.id_coupon_type}"
         )
-        row.append(button)
-
-        if len(row) == 2:
-            builder.row(*row)
-            row = []
-
-    if row:
-        builder.row(*row)
-
-    pagination_row = []
-    if page > 0:
-        pagination_row.append(InlineKeyboardButton(text="⬅️", callback_data=f"page_{page - 1}"))
-    else:
-        pagination_row.append(InlineKeyboardButton(text=" ", callback_data="noop"))
+        for collab in collabs.items
+    ])
 
-    pagination_row.append(InlineKeyboardButton(text=f"{page + 1}/{total_pages}", callback_data="noop"))
-
-    if page < total_pages - 1:
-        pagination_row.append(InlineKeyboardButton(text="➡️", callback_data=f"page_{page + 1}"))
-    else:
-        pagination_row.append(InlineKeyboardButton(text=" ", callback_data="noop"))
-
-    builder.row(*pagination_row)
+    builder.row(*_pagination_row(collabs))
 
     builder.row(InlineKeyboardButton(text="⬅️ Назад", callback_data="back_my_collab"))
 
     return builder.as_markup()
 
 
-def collab_request_keyboard(
-        collabs: List[CouponType],
-        page: int = 0,
-        per_page: int = 10
-) -> InlineKeyboardMarkup:
-    """Клавиатура для выбора категорий с пагинацией (2 колонки, 10 элементов)"""
+def collab_request_keyboard(collabs: Page[CouponType]) -> InlineKeyboardMarkup:
+    """Клавиатура для выбора запросов на коллаборацию с пагинацией (2 колонки, 10 элементов)"""
     builder = InlineKeyboardBuilder()
 
-    total_pages = (len(collabs) + per_page - 1) // per_page
-    start_idx = page * per_page
-    end_idx = start_idx + per_page
-    paginated_categories = collabs[start_idx:end_idx]
-
-    row = []
-    for i, collab in enumerate(paginated_categories):
-        button = InlineKeyboardButton(
+    _two_column_rows(builder, [
+        InlineKeyboardButton(
             text=f"{collab.company.Name_comp}",
             callback_data=f"collab_req_{collab.id_coupon_type}"
         )
-        row.append(button)
-
-        if len(row) == 2:
-            builder.row(*row)
-            row = []
-
-    if row:
-        builder.row(*row)
-
-    pagination_row = []
-    if page > 0:
-        pagination_row.append(InlineKeyboardButton(text="⬅️", callback_data=f"page_{page - 1}"))
-    else:
-        pagination_row.append(InlineKeyboardButton(text=" ", callback_data="noop"))
-
-    pagination_row.append(InlineKeyboardButton(text=f"{page + 1}/{total_pages}", callback_data="noop"))
-
-    if page < total_pages - 1:
-        pagination_row.append(InlineKeyboardButton(text="➡️", callback_data=f"page_{page + 1}"))
-    else:
-        pagination_row.append(InlineKeyboardButton(text=" ", callback_data="noop"))
+        for collab in collabs.items
+    ])
 
-    builder.row(*pagination_row)
+    builder.row(*_pagination_row(collabs))
 
     builder.row(InlineKeyboardButton(text="⬅️ Назад", callback_data="back_my_collab"))
 
@@ -0,0 +1,91 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Hashable
+
+
+class QueueFull(Exception):
+    """Очередь ожидания по ключу переполнена"""
+
+
+class _Slot:
+    __slots__ = ('lock', 'users')
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        # Владелец блокировки и ожидающие
+        self.users = 0
+
+
+class KeyedLock:
+    """
+    Набор асинхронных блокировок по ключу.
+
+    Блокировка ключа существует, пока ее кто-то держит или ждет, и
+    удаляется, как только ключ простаивает, поэтому память зависит
+    только от числа ключей в работе. Очередь одного ключа (владелец
+    блокировки и ожидающие) ограничена max_queue; сверх нее acquire
+    сразу выбрасывает QueueFull.
+    asyncio.Lock пропускает ожидающих в порядке очереди.
+    """
+    def __init__(self, max_queue: int):
+        self.max_queue = max_queue
+        self._slots: dict[Hashable, _Slot] = {}
+        self.acquisitions = 0
+        self.contended = 0
+        self.rejected = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.depth_max = 0
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def depth(self, key: Hashable) -> int:
+        """Сколько обновлений ключа выполняется и ждет"""
+        slot = self._slots.get(key)
+        return slot.users if slot else 0
+
+    @asynccontextmanager
+    async def acquire(self, key: Hashable) -> AsyncIterator[None]:
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._slots[key] = _Slot()
+        elif slot.users >= self.max_queue:
+            self.rejected += 1
+            raise QueueFull(key)
+
+        slot.users += 1
+        self.depth_max = max(self.depth_max, slot.users)
+        try:
+            if slot.lock.locked():
+                self.contended += 1
+                started = time.monotonic()
+                await slot.lock.acquire()
+                waited = time.monotonic() - started
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+            else:
+                await slot.lock.acquire()
+            self.acquisitions += 1
+            try:
+                yield
+            finally:
+                slot.lock.release()
+        finally:
+            slot.users -= 1
+            if slot.users == 0:
+                del self._slots[key]
+
+    def stats(self) -> dict:
+        """Метрики ожидания и глубины очередей"""
+        return {
+            'active_keys': len(self._slots),
+            'queued': sum(max(slot.users - 1, 0) for slot in self._slots.values()),
+            'depth_max': self.depth_max,
+            'acquisitions': self.acquisitions,
+            'contended': self.contended,
+            'rejected': self.rejected,
+            'wait_avg': round(self.wait_total / self.contended, 4) if self.contended else 0.0,
+            'wait_max': round(self.wait_max, 4),
+        }
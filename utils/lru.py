@@ -0,0 +1,74 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Простой LRU-кэш в памяти процесса с необязательным TTL записей
+    и необязательным ограничением суммарного размера.
+
+    Размер записи считает функция sizeof (в байтах); запись крупнее
+    всего бюджета maxbytes не сохраняется.
+    Не потокобезопасен: рассчитан на использование из одного event loop.
+    """
+    def __init__(
+            self,
+            maxsize: int,
+            ttl: float | None = None,
+            maxbytes: int | None = None,
+            sizeof: Callable[[Any], int] | None = None
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof
+        self.nbytes = 0
+        self.evictions = 0
+        self._data: OrderedDict[Hashable, tuple[float | None, Any, int]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _delete(self, key: Hashable) -> None:
+        _, _, size = self._data.pop(key)
+        self.nbytes -= size
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Возвращает значение и помечает его как недавно использованное"""
+        item = self._data.get(key, _MISSING)
+        if item is _MISSING:
+            return default
+        expires_at, value, _ = item
+        if expires_at is not None and expires_at < time.monotonic():
+            self._delete(key)
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Сохраняет значение, вытесняя самые старые записи при переполнении"""
+        size = self.sizeof(value) if self.sizeof is not None else 0
+        if key in self._data:
+            self._delete(key)
+        if self.maxbytes is not None and size > self.maxbytes:
+            return
+
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        self._data[key] = (expires_at, value, size)
+        self.nbytes += size
+        while len(self._data) > self.maxsize or (self.maxbytes is not None and self.nbytes > self.maxbytes):
+            _, (_, _, evicted) = self._data.popitem(last=False)
+            self.nbytes -= evicted
+            self.evictions += 1
+
+    def pop(self, key: Hashable) -> None:
+        """Удаляет запись, если она есть"""
+        if key in self._data:
+            self._delete(key)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.nbytes = 0
@@ -0,0 +1,76 @@
+from typing import Callable, Hashable
+
+from aiogram.types import InlineKeyboardMarkup
+
+from utils.config import config
+from utils.lru import LRUCache
+
+# Приблизительные накладные расходы на объект кнопки и ряда
+_BUTTON_OVERHEAD = 200
+_ROW_OVERHEAD = 60
+
+
+def markup_size(markup: InlineKeyboardMarkup) -> int:
+    """Приблизительный размер разметки в памяти, байт"""
+    size = 0
+    for row in markup.inline_keyboard:
+        size += _ROW_OVERHEAD
+        for button in row:
+            size += _BUTTON_OVERHEAD + len(button.text.encode()) + len((button.callback_data or '').encode())
+    return size
+
+
+class MarkupCache:
+    """
+    Кэш построенных inline-клавиатур.
+
+    Ключ должен однозначно определять содержимое клавиатуры: версию
+    исходных данных, номер страницы и отмеченные элементы. Кэш ограничен
+    числом записей и суммарным размером разметки. Возвращаемую разметку
+    разделяют все обработчики, поэтому изменять ее нельзя.
+    """
+    def __init__(self, maxsize: int, maxbytes: int):
+        self.lru = LRUCache(maxsize, maxbytes=maxbytes, sizeof=markup_size)
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_build(
+            self,
+            key: Hashable,
+            build: Callable[[], InlineKeyboardMarkup]
+    ) -> InlineKeyboardMarkup:
+        """
+        Возвращает клавиатуру из кэша или строит и сохраняет ее
+        Args:
+            key: Ключ содержимого клавиатуры
+            build: Функция построения клавиатуры
+        Returns:
+            InlineKeyboardMarkup: Клавиатура
+        """
+        markup = self.lru.get(key)
+        if markup is not None:
+            self.hits += 1
+            return markup
+
+        self.misses += 1
+        markup = build()
+        self.lru.set(key, markup)
+        return markup
+
+    def clear(self) -> None:
+        self.lru.clear()
+
+    def stats(self) -> dict:
+        """Счетчики попаданий, промахов и занятой памяти"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.lru.evictions,
+            'size': len(self.lru),
+            'bytes': self.lru.nbytes,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+markup_cache = MarkupCache(config.MARKUP_CACHE_SIZE, config.MARKUP_CACHE_BYTES)
@@ -0,0 +1,333 @@
+import asyncio
+import itertools
+import json
+import logging
+import time
+import uuid
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Any, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramRetryAfter
+from aiogram.types import InlineKeyboardMarkup
+
+from utils.bot_obj import bot, redis
+from utils.config import config
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 9
+
+# Методы бота, которые можно ставить в очередь
+_METHODS = ('send_message', 'send_photo')
+
+# Переносит сообщения процесса без аренды в хэш текущего процесса.
+# Проверка аренды и перенос выполняются атомарно, поэтому сообщения
+# умершего процесса забирает ровно один живой процесс
+_CLAIM_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    return {}
+end
+local moved = redis.call('HGETALL', KEYS[1])
+for i = 1, #moved, 2 do
+    redis.call('HSET', KEYS[3], moved[i], moved[i + 1])
+end
+redis.call('DEL', KEYS[1])
+redis.call('SREM', KEYS[4], ARGV[1])
+return moved
+"""
+
+
+@dataclass(slots=True)
+class OutboxMessage:
+    """Исходящее сообщение в очереди"""
+    method: str
+    params: dict[str, Any]
+    priority: int = PRIORITY_NORMAL
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    enqueued_at: float = field(default_factory=time.time)
+    attempts: int = 0
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, raw: str | bytes) -> "OutboxMessage":
+        return cls(**json.loads(raw))
+
+
+class Outbox:
+    """
+    Очередь исходящих сообщений с приоритетами.
+
+    Сообщение сохраняется в хэш Redis процесса-владельца при постановке
+    в очередь и удаляется после доставки или окончательной ошибки.
+    Владелец продлевает аренду (ключ с TTL OUTBOX_LEASE_TTL), пока жив;
+    сообщения процесса, аренда которого истекла или снята при остановке,
+    забирает другой процесс (при старте и затем периодически), поэтому
+    недоставленные сообщения переживают перезапуск, а сообщения из очереди
+    живого процесса повторно не отправляются. Частоту отправки ограничивает
+    ThrottlingRequestMiddleware сессии бота; очередь повторяет отправку
+    при RetryAfter и сетевых ошибках и не повторяет, если бот заблокирован
+    или запрос некорректен.
+    """
+    def __init__(self, bot: Bot, workers: int, max_attempts: int, lease_ttl: int):
+        self.bot = bot
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.lease_ttl = lease_ttl
+        self.owner = uuid.uuid4().hex
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._seq = itertools.count()
+        self._tasks: list[asyncio.Task] = []
+        self._lease_task: Optional[asyncio.Task] = None
+        self._claim_script = None
+        # ID сообщений этого процесса, еще не доставленных: в очереди
+        # или в ожидании повтора (их нет в _queue до истечения паузы)
+        self._queued: set[str] = set()
+        self._latencies: deque[float] = deque(maxlen=1000)
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    @staticmethod
+    def _key(owner: str) -> str:
+        return f"{config.REDIS_PREFIX}:outbox:{owner}"
+
+    @staticmethod
+    def _lease_key(owner: str) -> str:
+        return f"{config.REDIS_PREFIX}:outbox:lease:{owner}"
+
+    @staticmethod
+    def _owners_key() -> str:
+        return f"{config.REDIS_PREFIX}:outbox:owners"
+
+    def _put(self, message: OutboxMessage) -> None:
+        self._queued.add(message.id)
+        self._queue.put_nowait((message.priority, next(self._seq), message))
+
+    async def _enqueue(self, message: OutboxMessage) -> str:
+        try:
+            await redis.hset(self._key(self.owner), message.id, message.to_json())
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить исходящее сообщение в Redis: {e}")
+        self._put(message)
+        return message.id
+
+    async def send_message(
+            self,
+            chat_id: int,
+            text: str,
+            reply_markup: Optional[InlineKeyboardMarkup] = None,
+            parse_mode: Optional[str] = None,
+            priority: int = PRIORITY_NORMAL
+    ) -> str:
+        """
+        Ставит текстовое сообщение в очередь
+        Args:
+            chat_id: ID чата получателя
+            text: Текст сообщения
+            reply_markup: Inline-клавиатура
+            parse_mode: Режим разметки
+            priority: Приоритет (меньше - раньше)
+        Returns:
+            str: ID сообщения в очереди
+        """
+        params = {'chat_id': chat_id, 'text': text}
+        if reply_markup is not None:
+            params['reply_markup'] = reply_markup.model_dump(exclude_none=True)
+        if parse_mode is not None:
+            params['parse_mode'] = parse_mode
+        return await self._enqueue(OutboxMessage('send_message', params, priority))
+
+    async def send_photo(
+            self,
+            chat_id: int,
+            photo: str,
+            caption: Optional[str] = None,
+            reply_markup: Optional[InlineKeyboardMarkup] = None,
+            priority: int = PRIORITY_NORMAL
+    ) -> str:
+        """
+        Ставит фото в очередь. Фото передается как file_id или URL,
+        чтобы сообщение можно было сохранить в Redis
+        """
+        params = {'chat_id': chat_id, 'photo': photo}
+        if caption is not None:
+            params['caption'] = caption
+        if reply_markup is not None:
+            params['reply_markup'] = reply_markup.model_dump(exclude_none=True)
+        return await self._enqueue(OutboxMessage('send_photo', params, priority))
+
+    async def _renew_lease(self) -> None:
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.set(self._lease_key(self.owner), 1, ex=self.lease_ttl)
+            pipe.sadd(self._owners_key(), self.owner)
+            await pipe.execute()
+
+    async def _restore(self) -> int:
+        """
+        Забирает в очередь сообщения процессов, аренда которых истекла
+        Returns:
+            int: Число восстановленных сообщений
+        """
+        if self._claim_script is None:
+            self._claim_script = redis.register_script(_CLAIM_SCRIPT)
+
+        restored = 0
+        for raw_owner in await redis.smembers(self._owners_key()):
+            owner = raw_owner.decode() if isinstance(raw_owner, bytes) else raw_owner
+            if owner == self.owner:
+                continue
+            moved = await self._claim_script(
+                keys=[self._key(owner), self._lease_key(owner), self._key(self.owner), self._owners_key()],
+                args=[owner]
+            )
+            messages = sorted(
+                (OutboxMessage.from_json(raw) for raw in moved[1::2]),
+                key=lambda m: m.enqueued_at
+            )
+            for message in messages:
+                # Сообщение уже в хэше этого процесса, сохранять повторно не нужно
+                self._put(message)
+            restored += len(messages)
+        return restored
+
+    async def _keep_lease(self) -> None:
+        """Продлевает аренду и забирает сообщения умерших процессов"""
+        while True:
+            await asyncio.sleep(self.lease_ttl / 3)
+            try:
+                await self._renew_lease()
+                restored = await self._restore()
+                if restored:
+                    logger.info(f"Восстановлено {restored} недоставленных сообщений")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Не удалось продлить аренду очереди исходящих сообщений: {e}")
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        try:
+            await self._renew_lease()
+            restored = await self._restore()
+            if restored:
+                logger.info(f"Восстановлено {restored} недоставленных сообщений")
+        except Exception as e:
+            logger.warning(f"Очередь исходящих сообщений в Redis недоступна: {e}")
+        self._lease_task = asyncio.create_task(self._keep_lease(), name="outbox-lease")
+        self._tasks = [
+            asyncio.create_task(self._run(), name=f"outbox-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def stop(self) -> None:
+        """
+        Останавливает отправку и снимает аренду: недоставленное остается
+        в Redis и сразу переходит к следующему запущенному процессу
+        """
+        for task in [*self._tasks, self._lease_task]:
+            if task is not None:
+                task.cancel()
+        await asyncio.gather(*self._tasks, *([self._lease_task] if self._lease_task else []),
+                             return_exceptions=True)
+        self._tasks = []
+        self._lease_task = None
+        try:
+            await redis.delete(self._lease_key(self.owner))
+        except Exception as e:
+            logger.warning(f"Не удалось снять аренду очереди исходящих сообщений: {e}")
+        logger.info(f"Outbox stats: {self.stats()}")
+
+    def _retry_later(self, message: OutboxMessage, delay: float) -> None:
+        self.retried += 1
+        asyncio.get_running_loop().call_later(
+            delay, self._queue.put_nowait, (message.priority, next(self._seq), message)
+        )
+
+    async def _give_up(self, message: OutboxMessage, error: Exception) -> None:
+        self.failed += 1
+        logger.error(f"Сообщение в чат {message.params['chat_id']} не доставлено "
+                     f"после {message.attempts} попыток: {error}")
+        await self._done(message)
+
+    async def _done(self, message: OutboxMessage) -> None:
+        self._queued.discard(message.id)
+        try:
+            await redis.hdel(self._key(self.owner), message.id)
+        except Exception as e:
+            logger.warning(f"Не удалось удалить доставленное сообщение из Redis: {e}")
+
+    async def _deliver(self, message: OutboxMessage) -> None:
+        message.attempts += 1
+        params = dict(message.params)
+        if 'reply_markup' in params:
+            params['reply_markup'] = InlineKeyboardMarkup.model_validate(params['reply_markup'])
+
+        try:
+            await getattr(self.bot, message.method)(**params)
+        except TelegramRetryAfter as e:
+            if message.attempts >= self.max_attempts:
+                await self._give_up(message, e)
+            else:
+                self._retry_later(message, e.retry_after)
+            return
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            self.failed += 1
+            logger.warning(f"Сообщение в чат {params['chat_id']} не доставлено: {e}")
+            await self._done(message)
+            return
+        except Exception as e:
+            if message.attempts >= self.max_attempts:
+                await self._give_up(message, e)
+            else:
+                self._retry_later(message, min(2 ** message.attempts, 60))
+            return
+
+        self.sent += 1
+        self._latencies.append(time.time() - message.enqueued_at)
+        await self._done(message)
+
+    async def _run(self) -> None:
+        while True:
+            _, _, message = await self._queue.get()
+            if message.method not in _METHODS:
+                logger.error(f"Неизвестный метод в очереди сообщений: {message.method}")
+                await self._done(message)
+                continue
+            try:
+                await self._deliver(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка очереди исходящих сообщений: {e}")
+
+    def stats(self) -> dict:
+        """Счетчики доставки и задержка от постановки в очередь до отправки, сек"""
+        latencies = sorted(self._latencies)
+
+        def percentile(p: float) -> float:
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 3) if latencies else 0.0
+
+        return {
+            'sent': self.sent,
+            'failed': self.failed,
+            'retried': self.retried,
+            'pending': len(self._queued),
+            'latency_p50': percentile(0.5),
+            'latency_p95': percentile(0.95),
+            'latency_max': round(latencies[-1], 3) if latencies else 0.0,
+        }
+
+
+outbox = Outbox(
+    bot,
+    workers=config.OUTBOX_WORKERS,
+    max_attempts=config.OUTBOX_MAX_ATTEMPTS,
+    lease_ttl=config.OUTBOX_LEASE_TTL,
+)
@@ -0,0 +1,61 @@
+from dataclasses import dataclass
+from typing import Generic, Hashable, Sequence, TypeVar
+
+from sqlalchemy import Select, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+T = TypeVar('T')
+
+
+@dataclass(frozen=True, slots=True)
+class Page(Generic[T]):
+    """Одна страница выборки и сведения для кнопок пагинации"""
+    items: Sequence[T]
+    page: int
+    per_page: int
+    total: int
+    # Версия снимка данных, из которого взята страница (например, справочника
+    # в кэше); позволяет кэшировать построенную по странице клавиатуру
+    source: Hashable | None = None
+
+    @property
+    def total_pages(self) -> int:
+        return max(1, (self.total + self.per_page - 1) // self.per_page)
+
+    @property
+    def has_prev(self) -> bool:
+        return self.page > 0
+
+    @property
+    def has_next(self) -> bool:
+        return self.page < self.total_pages - 1
+
+
+async def paginate(
+        session: AsyncSession,
+        stmt: Select,
+        page: int,
+        per_page: int,
+        scalars: bool = True
+) -> Page:
+    """
+    Выполняет запрос постранично: COUNT по подзапросу и LIMIT/OFFSET.
+    Номер страницы за пределами выборки приводится к ближайшей существующей
+    Args:
+        session: Сессия БД
+        stmt: Запрос с детерминированным ORDER BY
+        page: Номер страницы (с нуля)
+        per_page: Элементов на странице
+        scalars: Возвращать первые колонки строк (объекты) или строки целиком
+    Returns:
+        Page: Страница выборки
+    """
+    count_stmt = select(func.count()).select_from(stmt.order_by(None).subquery())
+    total = await session.scalar(count_stmt) or 0
+
+    total_pages = max(1, (total + per_page - 1) // per_page)
+    page = max(0, min(page or 0, total_pages - 1))
+
+    result = await session.execute(stmt.limit(per_page).offset(page * per_page))
+    items = result.scalars().unique().all() if scalars else result.all()
+    return Page(items=items, page=page, per_page=per_page, total=total)
@@ -0,0 +1,72 @@
+"""
+Отрисовка QR-кодов в PNG.
+
+Модуль не зависит от бота и БД: функции выполняются в дочерних
+процессах пула QRService. Кроме него такой процесс импортирует только
+main.py (как __mp_main__), где на уровне модуля нет настройки приложения
+"""
+from io import BytesIO
+
+import qrcode
+from PIL import Image, ImageDraw, ImageFont
+
+ERROR_CORRECT_L = qrcode.constants.ERROR_CORRECT_L
+ERROR_CORRECT_M = qrcode.constants.ERROR_CORRECT_M
+
+# Печатный лист: колонки x ряды QR-кодов
+SHEET_COLUMNS = 3
+SHEET_ROWS = 4
+_SHEET_CELL = 400
+_SHEET_LABEL_HEIGHT = 40
+
+
+def render_qr_png(data: str, error_correction: int = ERROR_CORRECT_M, box_size: int = 10, border: int = 4) -> bytes:
+    """
+    Рисует QR-код в PNG. Выполняется в пуле, не в event loop
+    Args:
+        data: Содержимое QR-кода
+        error_correction: Уровень коррекции ошибок
+        box_size: Размер модуля, пикселей
+        border: Ширина рамки, модулей
+    Returns:
+        bytes: PNG-изображение
+    """
+    qr = qrcode.QRCode(error_correction=error_correction, box_size=box_size, border=border)
+    qr.add_data(data)
+    qr.make(fit=True)
+    img = qr.make_image(fill_color="black", back_color="white")
+    bio = BytesIO()
+    img.save(bio, 'PNG')
+    return bio.getvalue()
+
+
+def render_sheet_png(entries: list[tuple[str, str]]) -> bytes:
+    """
+    Рисует печатный лист с несколькими QR-кодами и подписями под ними
+    Args:
+        entries: Пары (содержимое, подпись), не больше колонок x рядов листа
+    Returns:
+        bytes: PNG-изображение листа
+    """
+    cell_height = _SHEET_CELL + _SHEET_LABEL_HEIGHT
+    rows = (len(entries) + SHEET_COLUMNS - 1) // SHEET_COLUMNS
+    sheet = Image.new('RGB', (SHEET_COLUMNS * _SHEET_CELL, max(rows, 1) * cell_height), 'white')
+    draw = ImageDraw.Draw(sheet)
+    font = ImageFont.load_default(size=24)
+
+    for index, (data, label) in enumerate(entries):
+        qr = qrcode.QRCode(error_correction=ERROR_CORRECT_M, box_size=10, border=4)
+        qr.add_data(data)
+        qr.make(fit=True)
+        img = qr.make_image(fill_color="black", back_color="white").get_image().convert('RGB')
+        img = img.resize((_SHEET_CELL, _SHEET_CELL), Image.NEAREST)
+
+        x = (index % SHEET_COLUMNS) * _SHEET_CELL
+        y = (index // SHEET_COLUMNS) * cell_height
+        sheet.paste(img, (x, y))
+        draw.text((x + _SHEET_CELL // 2, y + _SHEET_CELL + _SHEET_LABEL_HEIGHT // 2),
+                  label, fill='black', font=font, anchor='mm')
+
+    bio = BytesIO()
+    sheet.save(bio, 'PNG', optimize=True)
+    return bio.getvalue()
@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import time
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+from utils.config import config
+from utils.lru import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Асинхронный ограничитель частоты запросов (token bucket).
+
+    Пополняется со скоростью rate токенов в секунду, вмещает не более
+    capacity токенов. acquire() ждет, пока токен не станет доступен.
+    """
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1) -> bool:
+        """Забирает токены без ожидания, если они есть"""
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+    def delay(self, tokens: float = 1) -> float:
+        """Через сколько секунд будет доступно tokens токенов"""
+        self._refill()
+        missing = tokens - self._tokens
+        return max(0.0, missing / self.rate)
+
+    async def acquire(self, tokens: float = 1) -> None:
+        """
+        Ожидает и забирает токены; ожидающие обслуживаются по очереди
+        Raises:
+            ValueError: Запрошено больше токенов, чем вмещает ограничитель
+        """
+        if tokens > self.capacity:
+            raise ValueError(f"Запрошено {tokens} токенов при емкости {self.capacity}")
+        async with self._lock:
+            while not self.try_acquire(tokens):
+                await asyncio.sleep(self.delay(tokens))
+
+    def pause(self, seconds: float) -> None:
+        """Не выдает токены ближайшие seconds секунд (после RetryAfter)"""
+        self._refill()
+        self._tokens = min(self._tokens, 0) - seconds * self.rate
+
+
+def _api_processes() -> int:
+    """Число процессов, одновременно отправляющих запросы от имени бота"""
+    return config.WORKER_COUNT if config.PROCESS_ROLE == 'worker' else 1
+
+
+# Лимит запросов бота к Telegram Bot API. Лимит Telegram общий на бота,
+# поэтому каждый из WORKER_COUNT воркеров получает свою долю
+telegram_api_limiter = TokenBucket(
+    config.TG_API_RATE / _api_processes(),
+    max(1.0, config.TG_API_BURST / _api_processes())
+)
+
+# Методы, на которые распространяются лимиты Telegram
+_SENDING_PREFIXES = ('Send', 'Copy', 'Forward')
+_LIMITED_METHODS = {'GetChatMember'}
+
+
+class ThrottlingRequestMiddleware(BaseRequestMiddleware):
+    """
+    Middleware сессии бота: ограничивает частоту исходящих запросов.
+
+    Отправка сообщений и getChatMember проходят через общий
+    ограничитель, отправка - еще и через ограничитель чата (лимит
+    в группах ниже, чем в личных чатах). При RetryAfter ограничитель
+    чата (или общий) приостанавливается, и запрос повторяется, если
+    ждать не дольше max_retry_after; иначе ошибка передается вызывающему
+    """
+    def __init__(
+            self,
+            limiter: TokenBucket,
+            chat_rate: float,
+            group_rate: float,
+            chat_burst: float,
+            max_retry_after: float,
+            max_retries: int,
+            max_chats: int
+    ):
+        self.limiter = limiter
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.chat_burst = chat_burst
+        self.max_retry_after = max_retry_after
+        self.max_retries = max_retries
+        self._chats = LRUCache(max_chats)
+        self.retry_after_count = 0
+
+    def _chat_bucket(self, chat_id: int | str) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # Группы и каналы имеют отрицательный ID или @username
+            is_group = not isinstance(chat_id, int) or chat_id < 0
+            bucket = TokenBucket(self.group_rate if is_group else self.chat_rate, max(1.0, self.chat_burst))
+            self._chats.set(chat_id, bucket)
+        return bucket
+
+    async def __call__(
+            self,
+            make_request: NextRequestMiddlewareType[TelegramType],
+            bot: Bot,
+            method: TelegramMethod[TelegramType]
+    ) -> Response[TelegramType]:
+        name = type(method).__name__
+        sending = name.startswith(_SENDING_PREFIXES)
+        if not sending and name not in _LIMITED_METHODS:
+            return await make_request(bot, method)
+
+        chat_id = getattr(method, 'chat_id', None)
+        chat_bucket = self._chat_bucket(chat_id) if sending and chat_id is not None else None
+        attempt = 0
+        while True:
+            if chat_bucket is not None:
+                await chat_bucket.acquire()
+            await self.limiter.acquire()
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                self.retry_after_count += 1
+                (chat_bucket or self.limiter).pause(e.retry_after)
+                attempt += 1
+                if attempt > self.max_retries or e.retry_after > self.max_retry_after:
+                    raise
+                logger.warning(f"RetryAfter {e.retry_after}s для {name} в чате {chat_id}, повтор {attempt}")
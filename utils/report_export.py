@@ -0,0 +1,73 @@
+"""
+Запись отчетов в файл по частям.
+
+Строки приходят пачками из потокового запроса и сразу пишутся в файл,
+поэтому объем памяти не зависит от числа строк. XLSX пишется в режиме
+write_only (openpyxl не держит лист в памяти); если openpyxl не
+установлен, отчет выгружается в CSV.
+"""
+import csv
+import gzip
+import logging
+from typing import Any, Iterable, Sequence
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+logger = logging.getLogger(__name__)
+
+
+class CsvReportWriter:
+    """CSV с BOM и разделителем ';' (открывается в Excel без настройки), при необходимости в gzip"""
+    def __init__(self, path: str, header: Sequence[str], compress: bool = False):
+        self.extension = 'csv.gz' if compress else 'csv'
+        if compress:
+            self.file = gzip.open(path, 'wt', encoding='utf-8-sig', newline='', compresslevel=6)
+        else:
+            self.file = open(path, 'w', encoding='utf-8-sig', newline='')
+        self.writer = csv.writer(self.file, delimiter=';')
+        self.writer.writerow(header)
+
+    def write_rows(self, rows: Iterable[Sequence[Any]]) -> None:
+        self.writer.writerows(rows)
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class XlsxReportWriter:
+    """XLSX в режиме write_only; файл xlsx уже сжат, поэтому gzip не применяется"""
+    extension = 'xlsx'
+
+    def __init__(self, path: str, header: Sequence[str], title: str = 'Отчет'):
+        self.path = path
+        self.workbook = openpyxl.Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet(title)
+        self.sheet.append(list(header))
+
+    def write_rows(self, rows: Iterable[Sequence[Any]]) -> None:
+        for row in rows:
+            self.sheet.append(list(row))
+
+    def close(self) -> None:
+        self.workbook.save(self.path)
+
+
+def open_report_writer(path: str, header: Sequence[str], fmt: str, compress: bool):
+    """
+    Создает запись отчета нужного формата
+    Args:
+        path: Путь к файлу
+        header: Заголовки колонок
+        fmt: Формат: csv или xlsx
+        compress: Сжимать CSV в gzip
+    Returns:
+        CsvReportWriter | XlsxReportWriter: Объект записи
+    """
+    if fmt == 'xlsx':
+        if openpyxl is not None:
+            return XlsxReportWriter(path, header)
+        logger.warning("openpyxl не установлен, отчет будет выгружен в CSV")
+    return CsvReportWriter(path, header, compress)
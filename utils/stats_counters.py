@@ -0,0 +1,88 @@
+import logging
+import time
+from typing import Optional
+
+from utils.bot_obj import redis
+from utils.config import config
+
+logger = logging.getLogger(__name__)
+
+USERS = 'users'
+COMPANIES = 'companies'
+COUPONS = 'coupons'
+USED_COUPONS = 'used_coupons'
+ACTIVE_COLLABORATIONS = 'active_collaborations'
+
+FIELDS = (USERS, COMPANIES, COUPONS, USED_COUPONS, ACTIVE_COLLABORATIONS)
+
+
+class StatsCounters:
+    """
+    Счетчики системной статистики в одном хэше Redis.
+
+    Сервисы увеличивают счетчик после успешного commit; расхождения
+    (пропущенные инкременты, истечение коллабораций по дате, удаления)
+    исправляет периодическая сверка с БД. Чтение - один HGETALL
+    независимо от объема таблиц
+    """
+    @staticmethod
+    def _key() -> str:
+        return f"{config.REDIS_PREFIX}:stats"
+
+    async def incr(self, field: str, amount: int = 1) -> None:
+        """
+        Изменяет счетчик. Ошибка Redis не прерывает операцию, которую
+        считаем: счетчик поправит сверка
+        Args:
+            field: Имя счетчика
+            amount: Приращение (может быть отрицательным)
+        """
+        try:
+            await redis.hincrby(self._key(), field, amount)
+        except Exception as e:
+            logger.warning(f"Не удалось обновить счетчик статистики {field}: {e}")
+
+    async def get(self) -> Optional[dict[str, int]]:
+        """
+        Текущие значения счетчиков
+        Returns:
+            Optional[dict[str, int]]: Счетчики и время последней сверки
+                или None, если сверки еще не было
+        """
+        raw = await redis.hgetall(self._key())
+        values = {
+            (k.decode() if isinstance(k, bytes) else k): int(v)
+            for k, v in raw.items()
+        }
+        if 'reconciled_at' not in values:
+            return None
+        return values
+
+    async def snapshot(self) -> dict[str, int]:
+        """Текущие значения счетчиков для сверки (отсутствующие считаются нулем)"""
+        values = await redis.hmget(self._key(), *FIELDS)
+        return {field: int(value or 0) for field, value in zip(FIELDS, values)}
+
+    async def correct(self, before: dict[str, int], actual: dict[str, int]) -> dict[str, int]:
+        """
+        Приводит счетчики к значениям из БД инкрементом на (actual - before).
+        before должен быть снят после подсчета actual: тогда расходятся
+        только изменения, попавшие между commit в БД и инкрементом
+        счетчика (доли миллисекунды, а не все время подсчета); такие
+        расхождения исправляет следующая сверка
+        Args:
+            before: Значения счетчиков, снятые после подсчета в БД
+            actual: Значения, подсчитанные в БД
+        Returns:
+            dict[str, int]: Примененные поправки (только ненулевые)
+        """
+        drift = {field: actual[field] - before[field] for field in FIELDS if actual[field] != before[field]}
+        async with redis.pipeline(transaction=True) as pipe:
+            for field, delta in drift.items():
+                pipe.hincrby(self._key(), field, delta)
+            pipe.hset(self._key(), 'reconciled_at', int(time.time()))
+            await pipe.execute()
+        return drift
+
+
+stats_counters = StatsCounters()
@@ -0,0 +1,246 @@
+"""
+Распределение обновлений Telegram между процессами через Redis Streams.
+
+Процесс-приемник (ingress) кладет каждое обновление в один из
+UPDATE_STREAM_PARTITIONS потоков по chat_id (или ID пользователя, если
+чата нет). Воркер с номером WORKER_INDEX из WORKER_COUNT обрабатывает
+партиции, у которых номер по модулю WORKER_COUNT равен его номеру.
+Партиция читается строго последовательно, поэтому обновления одного
+чата обрабатываются по порядку, а разные партиции - параллельно.
+Состояние FSM общее для всех процессов (RedisStorage из utils/bot_obj.py).
+"""
+import asyncio
+import logging
+from typing import Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from redis.asyncio.client import Redis
+from redis.exceptions import ResponseError
+
+from utils.config import config
+from utils.webhook import stop_event
+
+logger = logging.getLogger(__name__)
+
+GROUP_NAME = "workers"
+PAYLOAD_FIELD = "u"
+
+
+def partition_for(key: int, partitions: int) -> int:
+    """Номер партиции для chat_id / ID пользователя"""
+    return key % partitions
+
+
+class UpdateStream:
+    """Набор партиций-потоков обновлений в Redis"""
+    def __init__(self, redis: Redis, partitions: int, maxlen: int):
+        self.redis = redis
+        self.partitions = partitions
+        self.maxlen = maxlen
+
+    @staticmethod
+    def stream_key(partition: int) -> str:
+        return f"{config.REDIS_PREFIX}:updates:{partition}"
+
+    @staticmethod
+    def dead_letter_key() -> str:
+        return f"{config.REDIS_PREFIX}:updates:dead"
+
+    async def ensure_group(self, partition: int) -> None:
+        """Создает группу потребителей партиции, если ее еще нет"""
+        try:
+            await self.redis.xgroup_create(self.stream_key(partition), GROUP_NAME, id='0', mkstream=True)
+        except ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    async def publish(self, update: Update, key: int) -> None:
+        """
+        Кладет обновление в партицию
+        Args:
+            update: Обновление Telegram
+            key: chat_id или ID пользователя, определяющий партицию
+        """
+        await self.redis.xadd(
+            self.stream_key(partition_for(key, self.partitions)),
+            {PAYLOAD_FIELD: update.model_dump_json(exclude_none=True, by_alias=True)},
+            maxlen=self.maxlen,
+            approximate=True
+        )
+
+
+class UpdateStreamWorker:
+    """
+    Обработчик своих партиций потока обновлений.
+
+    Каждая партиция читается отдельной задачей через группу потребителей.
+    При старте воркер забирает зависшие записи других потребителей
+    (XAUTOCLAIM) и дообрабатывает собственные неподтвержденные записи.
+    Упавшее обновление сразу перекладывается в поток недоставленных
+    и подтверждается: обработчики не идемпотентны (повтор мог бы еще раз
+    выдать купон или отправить сообщение), а пауза перед повтором
+    задержала бы все чаты партиции.
+    """
+    def __init__(
+            self,
+            bot: Bot,
+            dp: Dispatcher,
+            stream: UpdateStream,
+            worker_index: int,
+            worker_count: int,
+            batch: int,
+            block_ms: int,
+            claim_idle_ms: int
+    ):
+        self.bot = bot
+        self.dp = dp
+        self.stream = stream
+        self.consumer = f"worker-{worker_index}"
+        self.partitions = [
+            partition for partition in range(stream.partitions)
+            if partition % worker_count == worker_index
+        ]
+        self.batch = batch
+        self.block_ms = block_ms
+        self.claim_idle_ms = claim_idle_ms
+        self._stopping = False
+        self._tasks: list[asyncio.Task] = []
+        self.processed = 0
+        self.dead_lettered = 0
+
+    async def start(self) -> None:
+        for partition in self.partitions:
+            await self.stream.ensure_group(partition)
+        self._tasks = [
+            asyncio.create_task(self._consume(partition), name=f"update-stream-{partition}")
+            for partition in self.partitions
+        ]
+        logger.info(f"{self.consumer} consumes partitions {self.partitions}")
+
+    async def stop(self, timeout: float) -> None:
+        """Дожидается завершения текущих пачек и останавливает чтение"""
+        self._stopping = True
+        if not self._tasks:
+            return
+        _, pending = await asyncio.wait(self._tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict:
+        return {
+            'processed': self.processed,
+            'dead_lettered': self.dead_lettered,
+        }
+
+    async def _claim_stale(self, key: str) -> None:
+        """Забирает записи потребителей, которые упали или больше не владеют партицией"""
+        start_id = '0-0'
+        while True:
+            # Redis 7 возвращает еще и список удаленных записей, Redis 6.2 - только два элемента
+            start_id = (await self.stream.redis.xautoclaim(
+                key, GROUP_NAME, self.consumer, self.claim_idle_ms, start_id=start_id, count=self.batch
+            ))[0]
+            if start_id in (b'0-0', '0-0'):
+                break
+
+    async def _consume(self, partition: int) -> None:
+        key = self.stream.stream_key(partition)
+        redis = self.stream.redis
+        claimed = False
+
+        # Сначала чужие зависшие и свои неподтвержденные записи, затем новые
+        last_id = '0'
+        while not self._stopping:
+            try:
+                if not claimed:
+                    await self._claim_stale(key)
+                    claimed = True
+                response = await redis.xreadgroup(
+                    GROUP_NAME, self.consumer, {key: last_id},
+                    count=self.batch,
+                    block=None if last_id == '0' else self.block_ms
+                )
+                entries = response[0][1] if response else []
+                if not entries:
+                    last_id = '>'
+                    continue
+                for entry_id, fields in entries:
+                    await self._handle(key, entry_id, fields)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка обработки партиции {partition}: {e}")
+                # Неподтвержденные записи перечитываются из списка ожидающих
+                last_id = '0'
+                await asyncio.sleep(1)
+
+    async def _handle(self, key: str, entry_id, fields: dict) -> None:
+        redis = self.stream.redis
+        payload = fields.get(PAYLOAD_FIELD.encode(), fields.get(PAYLOAD_FIELD)) if fields else None
+        if payload is None:
+            # Запись удалена из потока обрезкой по MAXLEN
+            await redis.xack(key, GROUP_NAME, entry_id)
+            return
+
+        try:
+            update = Update.model_validate_json(payload, context={"bot": self.bot})
+            await self.dp.feed_update(self.bot, update)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Обновление {entry_id} не обработано: {e}")
+            # Перенос и подтверждение одной транзакцией: после падения процесса
+            # запись не вернется в партицию и не будет обработана повторно
+            async with redis.pipeline(transaction=True) as pipe:
+                pipe.xadd(
+                    self.stream.dead_letter_key(),
+                    {PAYLOAD_FIELD: payload, 'error': str(e)[:500]},
+                    maxlen=self.stream.maxlen,
+                    approximate=True
+                )
+                pipe.xack(key, GROUP_NAME, entry_id)
+                await pipe.execute()
+            self.dead_lettered += 1
+            return
+
+        self.processed += 1
+        await redis.xack(key, GROUP_NAME, entry_id)
+
+
+def update_stream_from_config(redis: Redis) -> UpdateStream:
+    return UpdateStream(redis, config.UPDATE_STREAM_PARTITIONS, config.UPDATE_STREAM_MAXLEN)
+
+
+async def run_stream_worker(bot: Bot, dp: Dispatcher, redis: Redis, stop: Optional[asyncio.Event] = None) -> None:
+    """
+    Запускает процесс-воркер: обрабатывает свои партиции до сигнала остановки
+    Args:
+        bot: Экземпляр бота
+        dp: Диспетчер с зарегистрированными роутерами
+        redis: Клиент Redis
+        stop: Событие остановки (по умолчанию SIGINT/SIGTERM)
+    """
+    worker = UpdateStreamWorker(
+        bot=bot,
+        dp=dp,
+        stream=update_stream_from_config(redis),
+        worker_index=config.WORKER_INDEX,
+        worker_count=config.WORKER_COUNT,
+        batch=config.UPDATE_STREAM_BATCH,
+        block_ms=config.UPDATE_STREAM_BLOCK_MS,
+        claim_idle_ms=config.UPDATE_STREAM_CLAIM_IDLE_MS,
+    )
+    stop = stop or stop_event()
+
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    try:
+        await worker.start()
+        await stop.wait()
+        logger.info(f"Stopping {worker.consumer}")
+    finally:
+        await worker.stop(config.WEBHOOK_DRAIN_TIMEOUT)
+        logger.info(f"Worker stats: {worker.stats()}")
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)
@@ -0,0 +1,176 @@
+import asyncio
+import hmac
+import logging
+import signal
+from typing import Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp import web
+
+from utils.config import config
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookServer:
+    """
+    Прием обновлений Telegram через webhook на aiohttp.
+
+    Обновление подтверждается сразу после разбора, а обрабатывается
+    в фоне: одновременно не больше concurrency обновлений. Если в работе
+    уже max_pending обновлений, сервер отвечает 429 и Telegram повторит
+    доставку позже. При остановке новые обновления отклоняются (503),
+    а принятые дорабатываются в течение drain_timeout.
+    """
+    def __init__(
+            self,
+            bot: Bot,
+            dp: Dispatcher,
+            secret: str,
+            concurrency: int,
+            max_pending: int,
+            drain_timeout: float
+    ):
+        if not secret:
+            # Без секрета любой может присылать обновления от имени Telegram и читать /stats
+            raise ValueError("WEBHOOK_SECRET обязателен в режиме webhook")
+        self.bot = bot
+        self.dp = dp
+        self.secret = secret
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.max_pending = max_pending
+        self.drain_timeout = drain_timeout
+        self._tasks: set[asyncio.Task] = set()
+        self._draining = False
+        self._runner: Optional[web.AppRunner] = None
+        self.received = 0
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def _authorized(self, request: web.Request) -> bool:
+        token = request.headers.get(SECRET_HEADER, '')
+        return hmac.compare_digest(token.encode(), self.secret.encode())
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """Обработчик POST-запроса от Telegram"""
+        if not self._authorized(request):
+            return web.Response(status=401)
+        if self._draining:
+            return web.Response(status=503)
+        if len(self._tasks) >= self.max_pending:
+            self.rejected += 1
+            return web.Response(status=429)
+
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except Exception as e:
+            logger.warning(f"Некорректное обновление в webhook: {e}")
+            return web.Response(status=400)
+
+        self.received += 1
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response()
+
+    async def _process(self, update: Update) -> None:
+        async with self.semaphore:
+            try:
+                await self.dp.feed_update(self.bot, update)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Ошибка обработки обновления {update.update_id}: {e}")
+
+    def stats(self) -> dict:
+        """Счетчики принятых, обработанных и отклоненных обновлений"""
+        return {
+            'received': self.received,
+            'processed': self.processed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'pending': len(self._tasks),
+        }
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        if not self._authorized(request):
+            return web.Response(status=401)
+        return web.json_response(self.stats())
+
+    async def start(self, host: str, port: int, path: str) -> None:
+        app = web.Application()
+        app.router.add_post(path, self.handle)
+        app.router.add_get(f"{path.rstrip('/')}/stats", self.handle_stats)
+        self._runner = web.AppRunner(app, handle_signals=False)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        logger.info(f"Webhook server listening on {host}:{port}{path}")
+
+    async def drain(self) -> None:
+        """Перестает принимать обновления и дожидается принятых"""
+        self._draining = True
+        if self._tasks:
+            logger.info(f"Дожидаемся обработки {len(self._tasks)} обновлений")
+            _, pending = await asyncio.wait(set(self._tasks), timeout=self.drain_timeout)
+            for task in pending:
+                task.cancel()
+            if pending:
+                logger.warning(f"Прервана обработка {len(pending)} обновлений")
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def stop(self) -> None:
+        await self.drain()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def stop_event() -> asyncio.Event:
+    """Событие, которое устанавливается по SIGINT/SIGTERM"""
+    event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, event.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+    return event
+
+
+async def run_webhook(bot: Bot, dp: Dispatcher) -> None:
+    """
+    Запускает бота в режиме webhook до получения сигнала остановки
+    Args:
+        bot: Экземпляр бота
+        dp: Диспетчер с зарегистрированными роутерами
+    """
+    server = WebhookServer(
+        bot=bot,
+        dp=dp,
+        secret=config.WEBHOOK_SECRET,
+        concurrency=config.WEBHOOK_CONCURRENCY,
+        max_pending=config.WEBHOOK_MAX_PENDING,
+        drain_timeout=config.WEBHOOK_DRAIN_TIMEOUT,
+    )
+    stop = stop_event()
+
+    await dp.emit_startup(bot=bot, dispatcher=dp)
+    try:
+        await server.start(config.WEBHOOK_HOST, config.WEBHOOK_PORT, config.WEBHOOK_PATH)
+        await bot.set_webhook(
+            url=f"{config.WEBHOOK_BASE_URL.rstrip('/')}{config.WEBHOOK_PATH}",
+            secret_token=config.WEBHOOK_SECRET,
+            allowed_updates=dp.resolve_used_update_types(),
+            max_connections=config.WEBHOOK_MAX_CONNECTIONS,
+            drop_pending_updates=config.DROP_PENDING_UPDATES,
+        )
+        await stop.wait()
+        logger.info("Stopping webhook server")
+    finally:
+        await server.stop()
+        logger.info(f"Webhook stats: {server.stats()}")
+        await dp.emit_shutdown(bot=bot, dispatcher=dp)